@@ -0,0 +1,66 @@
+"""
+Measures how quickly the command line interface starts.
+
+Runs `python main.py status --json` against a temporary database several times and reports the median and slowest
+wall time against the 200 ms target, next to the cost of importing every heavy dependency the pipeline stages need.
+It also lists any heavy module that `status` loaded, which should be none.
+
+Usage:
+    python -m benchmarks.cli_startup [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGET_SECONDS = 0.2
+
+# Modules that only the stages that download, edit or upload videos should load.
+HEAVY_MODULES = ["moviepy", "numpy", "selenium", "googleapiclient", "tiktok_uploader", "requests"]
+HEAVY_IMPORTS = ("import downloader.tiktok_downloader, editor.video_editor, uploader.tiktok_upload, "
+                 "uploader.youtube_uploader, pipeline.video_stages")
+
+
+def time_command(command, env, runs) -> list[float]:
+    """
+    Runs a command several times and returns the wall time of each run in seconds.
+    """
+    seconds = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run(command, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        seconds.append(time.perf_counter() - start_time)
+    return seconds
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = dict(os.environ, VIDEO_INFO_DB=os.path.join(work_dir, "video_info.db"))
+        # Create the database first, so every timed run finds an existing one.
+        subprocess.run([sys.executable, "main.py", "status"], cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, check=True)
+
+        loaded = subprocess.run(
+            [sys.executable, "-c", "import sys, json, main; main.run_cli(['status']); "
+                                   f"print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]), file=sys.stderr)"],
+            cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+        heavy_loaded = json.loads(loaded.stderr.decode().strip().splitlines()[-1])
+
+        results = {
+            "python -c pass": time_command([sys.executable, "-c", "pass"], env, runs),
+            "main.py status --json": time_command([sys.executable, "main.py", "status", "--json"], env, runs),
+            "main.py --help": time_command([sys.executable, "main.py", "--help"], env, runs),
+            "heavy stage imports": time_command([sys.executable, "-c", HEAVY_IMPORTS], env, max(1, runs // 3)),
+        }
+
+    for name, seconds in results.items():
+        print(f"{name:22}: median {statistics.median(seconds) * 1000:6.0f} ms, max {max(seconds) * 1000:6.0f} ms")
+    status_median = statistics.median(results["main.py status --json"])
+    print(f"status target {TARGET_SECONDS * 1000:.0f} ms: {'met' if status_median < TARGET_SECONDS else 'MISSED'}")
+    print(f"heavy modules loaded by status: {', '.join(heavy_loaded) or 'none'}")
+    sys.exit(0 if status_median < TARGET_SECONDS and not heavy_loaded else 1)
@@ -0,0 +1,179 @@
+"""
+Runs the pipeline daemon end to end with stubbed stages.
+
+The stubs sleep instead of downloading, encoding and uploading, and the TikTok stub fails the first attempt of every
+fifth job. The script starts the daemon, submits half of the jobs over its Unix socket and drops the other half into
+its drop folder, sends SIGTERM while jobs are in flight, restarts it and waits until every job is done. It then checks
+that every stage of every job succeeded exactly once (the drain never lost or repeated finished work), and reports the
+drain time and how many encoding processes served the edits.
+
+Usage:
+    python -m benchmarks.daemon_end_to_end [jobs]
+"""
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from main import send_to_daemon
+from pipeline.batch_pipeline import VideoJob
+from pipeline.daemon import PipelineDaemon
+from pipeline.job_store import JobStore
+from pipeline.retry_scheduler import ScheduledStage
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGE_SECONDS = {"download": 0.1, "fingerprint": 0.05, "edit": 0.4, "tiktok": 0.1, "youtube": 0.2}
+
+
+def log_run(stage, job, outcome):
+    """
+    Appends a stage run to the log file shared by the daemon's threads and processes.
+    """
+    with open(os.environ["DAEMON_LOG"], "a", encoding="utf-8") as f:
+        f.write(json.dumps({"stage": stage, "job_id": job.job_id, "pid": os.getpid(), "outcome": outcome}) + "\n")
+
+
+def previous_runs(stage, job_id) -> int:
+    with open(os.environ["DAEMON_LOG"], encoding="utf-8") as f:
+        return sum(1 for line in f if json.loads(line)["stage"] == stage and json.loads(line)["job_id"] == job_id)
+
+
+def stub_download(job):
+    time.sleep(STAGE_SECONDS["download"])
+    job.downloaded_tiktok = f"downloads/{job.job_id}.mp4"
+    log_run("download", job, "done")
+    return job
+
+
+def stub_fingerprint(job):
+    time.sleep(STAGE_SECONDS["fingerprint"])
+    job.fingerprint_id = job.job_id
+    log_run("fingerprint", job, "done")
+    return job
+
+
+def stub_edit(job):
+    time.sleep(STAGE_SECONDS["edit"])
+    job.edited_video = f"edited/{job.job_id}.mp4"
+    log_run("edit", job, "done")
+    return job
+
+
+def stub_tiktok(job):
+    time.sleep(STAGE_SECONDS["tiktok"])
+    if job.job_id % 5 == 0 and previous_runs("tiktok", job.job_id) == 0:
+        log_run("tiktok", job, "failed")
+        raise RuntimeError("stubbed TikTok failure")
+    job.tiktok_is_uploaded = True
+    log_run("tiktok", job, "done")
+    return job
+
+
+def stub_youtube(job):
+    time.sleep(STAGE_SECONDS["youtube"])
+    job.youtube_video_id = f"video-{job.job_id}"
+    log_run("youtube", job, "done")
+    return job
+
+
+def serve(work_dir):
+    """
+    Runs a daemon with the stubbed stages until SIGTERM.
+    """
+    stages = [ScheduledStage("download", stub_download), ScheduledStage("fingerprint", stub_fingerprint),
+              ScheduledStage("edit", stub_edit), ScheduledStage("tiktok", stub_tiktok), ScheduledStage("youtube", stub_youtube)]
+    daemon = PipelineDaemon(JobStore(os.path.join(work_dir, "jobs.db")), stages,
+                            socket_path=os.path.join(work_dir, "daemon.sock"), drop_dir=os.path.join(work_dir, "drop"),
+                            workers=4, encode_workers=2, max_in_flight=6, base_delay=0.1, poll_interval=0.2)
+    daemon.run()
+
+
+def start_daemon(work_dir, env) -> tuple[subprocess.Popen, list[str]]:
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.daemon_end_to_end", "serve", work_dir], cwd=BASE_DIR,
+                               env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    output = []
+    threading.Thread(target=lambda: output.extend(process.stdout), daemon=True).start()
+    socket_path = os.path.join(work_dir, "daemon.sock")
+    deadline = time.monotonic() + 30
+    while not os.path.exists(socket_path):
+        if time.monotonic() > deadline or process.poll() is not None:
+            raise RuntimeError("the daemon did not start: " + "".join(output))
+        time.sleep(0.05)
+    return process, output
+
+
+def stop_daemon(process) -> float:
+    start_time = time.perf_counter()
+    process.send_signal(signal.SIGTERM)
+    process.wait(timeout=60)
+    return time.perf_counter() - start_time
+
+
+def job_counts(db_path) -> tuple[int, int]:
+    store = JobStore(db_path)
+    try:
+        total = len(store.all_jobs())
+        return total - len(store.pending_jobs()), total
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "serve":
+        serve(sys.argv[2])
+        sys.exit(0)
+
+    job_count = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = dict(os.environ, DAEMON_LOG=os.path.join(work_dir, "runs.log"), PIPELINE_METRICS="0")
+        os.environ["DAEMON_LOG"] = env["DAEMON_LOG"]
+        open(env["DAEMON_LOG"], "w").close()
+        db_path = os.path.join(work_dir, "jobs.db")
+        jobs = [VideoJob(f"https://www.tiktok.com/@stub/video/{1000 + index}", f"Stub video {index}")
+                for index in range(job_count)]
+
+        start_time = time.perf_counter()
+        process, _ = start_daemon(work_dir, env)
+        replies = send_to_daemon(os.path.join(work_dir, "daemon.sock"), jobs[:job_count // 2])
+        drop_file = os.path.join(work_dir, "drop", "batch.jobs")
+        with open(drop_file + ".part", "w", encoding="utf-8") as f:
+            f.writelines(f"{job.tiktok_url}\t{job.video_description}\tbottom\n" for job in jobs[job_count // 2:])
+        os.replace(drop_file + ".part", drop_file)
+
+        time.sleep(1.5)
+        drain_seconds = stop_daemon(process)
+        done_after_stop, total = job_counts(db_path)
+
+        process, output = start_daemon(work_dir, env)
+        deadline = time.monotonic() + 120
+        while job_counts(db_path)[0] < job_count and time.monotonic() < deadline:
+            time.sleep(0.2)
+        stop_daemon(process)
+        elapsed = time.perf_counter() - start_time
+        done, total = job_counts(db_path)
+
+        with open(env["DAEMON_LOG"], encoding="utf-8") as f:
+            runs = [json.loads(line) for line in f]
+
+    successes = {}
+    for run in runs:
+        if run["outcome"] == "done":
+            key = (run["job_id"], run["stage"])
+            successes[key] = successes.get(key, 0) + 1
+    repeated = [key for key, count in successes.items() if count > 1]
+    missing = job_count * len(STAGE_SECONDS) - len(successes)
+    restored = next((line.strip() for line in output if "restored" in line), "")
+
+    print(f"socket replies: {sum('job_id' in reply for reply in replies)} accepted, "
+          f"{sum('error' in reply for reply in replies)} rejected")
+    print(f"first run: {done_after_stop}/{total} jobs done before SIGTERM, drain took {drain_seconds:.2f} s")
+    print(f"second run: {restored}")
+    print(f"all runs: {done}/{job_count} jobs done in {elapsed:.1f} s, {len(runs)} stage runs, "
+          f"{sum(run['outcome'] == 'failed' for run in runs)} failed and retried")
+    print(f"edits served by {len({run['pid'] for run in runs if run['stage'] == 'edit'})} encoding processes over two daemon runs")
+    print(f"stages that succeeded more than once: {len(repeated)}, stages that never succeeded: {missing}")
+    sys.exit(0 if done == job_count and not repeated and missing == 0 else 1)
@@ -0,0 +1,46 @@
+"""
+Compares the encoder profiles of add_watermark_to_video on generated clips.
+
+For each clip and profile the script renders the edit for TikTok and YouTube and reports the encode time, the output
+size and bitrate, the output dimensions and whether the audio was copied. "fast-draft" should be the fastest and
+smallest, "archive" the slowest and largest.
+
+Usage:
+    python -m benchmarks.encoder_profiles [work_dir] [engine]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.media import generate_video, prime_watermark
+from editor.encoder_profiles import PROFILES, probe_source
+from editor.video_editor import add_watermark_to_video
+
+CLIPS = [
+    ("portrait-1080p", (1080, 1920), 5),
+    ("landscape-1080p", (1920, 1080), 5),
+]
+PLATFORMS = ["tiktok", "youtube"]
+WATERMARK_TEXT = "Benchmark"
+
+
+if __name__ == "__main__":
+    work_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(tempfile.gettempdir(), "encoder-profiles")
+    engine = sys.argv[2] if len(sys.argv) > 2 else "ffmpeg"
+
+    for name, size, duration in CLIPS:
+        source = generate_video(os.path.join(work_dir, f"{name}.mp4"), size, duration)
+        prime_watermark(WATERMARK_TEXT, size)
+        print(f"{name} ({engine}):")
+
+        for profile in PROFILES:
+            output = os.path.join(work_dir, f"{name}-{profile}-{engine}.mp4")
+            start_time = time.perf_counter()
+            add_watermark_to_video(source, output, WATERMARK_TEXT, position="bottom", margin=20, engine=engine,
+                                   profile=profile, platforms=PLATFORMS)
+            seconds = time.perf_counter() - start_time
+
+            info = probe_source(output)
+            print(f"    {profile:10}: {seconds:6.2f} s, {os.path.getsize(output) / 1024:8.1f} KiB, "
+                  f"{info.bitrate} kb/s, {info.size[0]}x{info.size[1]}, audio {info.audio_codec}")
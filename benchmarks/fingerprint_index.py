@@ -0,0 +1,226 @@
+"""
+Measures how well video fingerprints find duplicate videos, and how fast the fingerprint index answers as it grows.
+
+Detection: the script generates a few clips and the copies of them the pipeline meets as re-uploads: re-encoded at a
+lower resolution and quality with other keyframe spacing, cropped, brightened and watermarked by
+`add_watermark_to_video`. The originals are fingerprinted into a job store, then every copy is looked up (each should
+find its original) together with clips that were never stored (which should find nothing).
+
+Index: job stores are filled with random fingerprints of realistic durations. The script then times `find_duplicate`
+for near-duplicates of stored fingerprints, whose video hash differs in a few bits, and for new videos, next to a full
+scan that loads every stored hash and computes all Hamming distances with NumPy. It reports how many near-duplicates
+were found for each number of differing bits; up to MAX_VIDEO_DISTANCE bits every one of them must be.
+
+Usage:
+    python -m benchmarks.fingerprint_index [work_dir]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from moviepy.config import get_setting
+
+from benchmarks.media import generate_scene_video, prime_watermark
+from editor.video_editor import add_watermark_to_video
+from editor.video_fingerprint import MAX_VIDEO_DISTANCE, SEGMENTS, VideoFingerprint, compute_fingerprint, hamming_distances
+from pipeline.job_store import FINGERPRINT_BANDS, JobStore
+
+CLIP_SEEDS = [1, 2, 3]
+UNSTORED_SEEDS = [4, 5]
+SIZE = (540, 960)
+# The ffmpeg arguments of each copy.
+COPIES = {
+    "re-encoded": ["-vf", "scale=360:640", "-crf", "32", "-g", "45"],
+    "cropped": ["-vf", "crop=iw*0.92:ih*0.92,scale=540:960", "-crf", "24", "-g", "90"],
+    "brightened": ["-vf", "eq=brightness=0.06:contrast=1.1", "-crf", "24", "-g", "48"],
+}
+WATERMARK_TEXT = "Benchmark"
+
+INDEX_SIZES = [1_000, 10_000, 50_000]
+QUERIES = 400
+FLIPPED_BITS = [0, 4, 8, 10, 12, 14]
+TARGET_SECONDS = 0.010
+
+
+def make_copies(work_dir, original, name) -> dict[str, str]:
+    """
+    Creates the copies of a clip, reusing existing files.
+    """
+    copies = {}
+    for copy_name, arguments in COPIES.items():
+        path = os.path.join(work_dir, f"{name}-{copy_name}.mp4")
+        if not os.path.exists(path):
+            subprocess.run([get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error", "-i", original, *arguments,
+                            "-c:v", "libx264", "-preset", "veryfast", "-c:a", "aac", "-b:a", "96k", path], check=True)
+        copies[copy_name] = path
+    path = os.path.join(work_dir, f"{name}-watermarked.mp4")
+    if not os.path.exists(path):
+        prime_watermark(WATERMARK_TEXT, SIZE)
+        add_watermark_to_video(original, path, WATERMARK_TEXT, position="bottom", margin=20, engine="ffmpeg",
+                               platforms=["tiktok", "youtube"])
+    copies["watermarked"] = path
+    return copies
+
+
+def measure_detection(work_dir) -> tuple[int, int, int]:
+    """
+    Looks up the copies and unstored clips in a job store holding the originals.
+
+    Returns:
+        tuple[int, int, int]: The number of copies found, the number of copies, and the number of wrong matches.
+    """
+    store = JobStore(os.path.join(work_dir, "detection.db"))
+    fingerprint_seconds = []
+
+    def fingerprint(path):
+        start_time = time.perf_counter()
+        result = compute_fingerprint(path)
+        fingerprint_seconds.append(time.perf_counter() - start_time)
+        return result
+
+    originals = {}
+    copies = {}
+    for seed in CLIP_SEEDS:
+        path = generate_scene_video(os.path.join(work_dir, f"clip-{seed}.mp4"), seed, SIZE)
+        job_id = store.add_job(f"https://www.tiktok.com/@bench/video/{seed}", f"Clip {seed}", "top")
+        store.add_fingerprint(job_id, fingerprint(path))
+        finish_jobs(store)
+        originals[job_id] = f"clip-{seed}"
+        copies[job_id] = make_copies(work_dir, path, f"clip-{seed}")
+
+    found = total = wrong = 0
+    for job_id, paths in copies.items():
+        for copy_name, path in paths.items():
+            match = store.find_duplicate(fingerprint(path))
+            total += 1
+            found += match is not None and match["job_id"] == job_id
+            wrong += match is not None and match["job_id"] != job_id
+            print(f"    {originals[job_id]} {copy_name:11}: "
+                  f"{'found' if match is not None and match['job_id'] == job_id else 'MISSED'}")
+    for seed in UNSTORED_SEEDS:
+        path = generate_scene_video(os.path.join(work_dir, f"clip-{seed}.mp4"), seed, SIZE)
+        match = store.find_duplicate(fingerprint(path))
+        wrong += match is not None
+        print(f"    clip-{seed} (not stored): {'no match' if match is None else 'WRONG MATCH'}")
+    store.close()
+
+    print(f"    fingerprinting: median {statistics.median(fingerprint_seconds) * 1000:.0f} ms, "
+          f"max {max(fingerprint_seconds) * 1000:.0f} ms per video")
+    return found, total, wrong
+
+
+def finish_jobs(store):
+    """
+    Marks every job of a job store as done, since only the fingerprints of finished jobs count as duplicates.
+    """
+    with store.batch():
+        store.connection.execute("UPDATE jobs SET status='done'")
+
+
+def random_fingerprint(rng) -> VideoFingerprint:
+    # Most clips are short, fewer run for minutes.
+    duration = rng.choice([rng.uniform(7, 20), rng.uniform(20, 60), rng.uniform(60, 180)], p=[0.5, 0.3, 0.2])
+    audio_energy = rng.random(16).astype(np.float32)
+    return VideoFingerprint(int(rng.integers(0, 2 ** 64, dtype=np.uint64)),
+                            rng.integers(0, 2 ** 64, size=SEGMENTS, dtype=np.uint64), float(round(duration, 2)),
+                            audio_energy / np.linalg.norm(audio_energy))
+
+
+def near_duplicate(rng, fingerprint, flipped_bits) -> VideoFingerprint:
+    """
+    Returns a copy of a fingerprint as a re-encoded copy of its video would have it.
+    """
+    video_hash = fingerprint.video_hash
+    for bit in rng.choice(64, flipped_bits, replace=False):
+        video_hash ^= 1 << int(bit)
+    segment_noise = np.array([sum(1 << int(bit) for bit in rng.choice(64, 4, replace=False)) for _ in range(SEGMENTS)],
+                             dtype=np.uint64)
+    audio_energy = fingerprint.audio_energy + rng.normal(0, 0.01, len(fingerprint.audio_energy)).astype(np.float32)
+    return VideoFingerprint(video_hash, fingerprint.segment_hashes ^ segment_noise,
+                            fingerprint.duration + rng.uniform(-0.1, 0.1), audio_energy / np.linalg.norm(audio_energy))
+
+
+def full_scan(store, fingerprint):
+    """
+    Finds the closest stored video hash by computing the distance to every stored fingerprint.
+    """
+    rows = store.connection.execute("SELECT fingerprint_id, video_hash FROM fingerprints").fetchall()
+    hashes = np.array([row[1] for row in rows], dtype=np.int64).view(np.uint64)
+    return rows[int(np.argmin(hamming_distances([fingerprint.video_hash], hashes)[0]))]
+
+
+def measure_index(work_dir, size, rng) -> tuple[float, float, float, dict[int, float], int]:
+    """
+    Fills a job store with random fingerprints and times lookups.
+
+    Returns:
+        tuple: The median and 95th percentile lookup time, the median full scan time, the share of near-duplicates found for each number of flipped bits, and the number of wrong matches for new videos.
+    """
+    store = JobStore(os.path.join(work_dir, f"index-{size}.db"))
+    stored = [random_fingerprint(rng) for _ in range(size)]
+    with store.batch():
+        fingerprint_ids = [store.add_fingerprint(store.add_job(f"https://www.tiktok.com/@bench/video/{index}", "", "top"),
+                                                 fingerprint)
+                           for index, fingerprint in enumerate(stored)]
+    finish_jobs(store)
+
+    seconds = []
+    found = {bits: [] for bits in FLIPPED_BITS}
+    wrong = 0
+    for query in range(QUERIES):
+        if query % 2 == 0:
+            index = int(rng.integers(size))
+            bits = FLIPPED_BITS[query // 2 % len(FLIPPED_BITS)]
+            fingerprint = near_duplicate(rng, stored[index], bits)
+        else:
+            fingerprint = random_fingerprint(rng)
+        start_time = time.perf_counter()
+        match = store.find_duplicate(fingerprint)
+        seconds.append(time.perf_counter() - start_time)
+        if query % 2 == 0:
+            found[bits].append(match is not None and match["fingerprint_id"] == fingerprint_ids[index])
+        else:
+            wrong += match is not None
+
+    scan_seconds = []
+    for _ in range(10):
+        start_time = time.perf_counter()
+        full_scan(store, stored[0])
+        scan_seconds.append(time.perf_counter() - start_time)
+    store.close()
+
+    seconds.sort()
+    return (statistics.median(seconds), seconds[int(len(seconds) * 0.95)], statistics.median(scan_seconds),
+            {bits: sum(results) / len(results) for bits, results in found.items()}, wrong)
+
+
+if __name__ == "__main__":
+    work_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(tempfile.gettempdir(), "fingerprint-index")
+    os.makedirs(work_dir, exist_ok=True)
+    for name in os.listdir(work_dir):
+        if name.endswith((".db", ".db-wal", ".db-shm")):
+            os.remove(os.path.join(work_dir, name))
+
+    print("Duplicate detection:")
+    found, total, wrong_detections = measure_detection(work_dir)
+    print(f"    {found}/{total} copies found, {wrong_detections} wrong matches")
+
+    print(f"Index lookups ({FINGERPRINT_BANDS} bands, {QUERIES} queries, half of them near-duplicates):")
+    rng = np.random.default_rng(0)
+    target_met = recall_met = True
+    wrong_lookups = 0
+    for size in INDEX_SIZES:
+        p50, p95, scan, recall, wrong = measure_index(work_dir, size, rng)
+        wrong_lookups += wrong
+        target_met &= p95 < TARGET_SECONDS
+        recall_met &= all(share == 1 for bits, share in recall.items() if bits <= MAX_VIDEO_DISTANCE)
+        print(f"    {size:6} fingerprints: p50 {p50 * 1000:5.2f} ms, p95 {p95 * 1000:5.2f} ms, "
+              f"full scan {scan * 1000:6.1f} ms, wrong matches {wrong}")
+        print("        found by flipped bits: " + ", ".join(f"{bits}: {share:.0%}" for bits, share in recall.items()))
+
+    print(f"lookup target p95 < {TARGET_SECONDS * 1000:.0f} ms: {'met' if target_met else 'MISSED'}")
+    sys.exit(0 if found == total and wrong_detections == 0 and wrong_lookups == 0 and target_met and recall_met else 1)
@@ -0,0 +1,58 @@
+"""
+Downloads a generated file from a local range-request server with the HTTP download backend.
+
+Reports the throughput of single- and multi-connection downloads, and checks that a download cut off half way is
+resumed from the partial file and produces an intact copy.
+
+Usage:
+    python -m benchmarks.http_download [size_in_mib]
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+import requests
+
+from benchmarks.standins import RangeFileServer
+from downloader.http_downloader import PART_SUFFIX, HttpDownloader
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) * 1024 * 1024 if len(sys.argv) > 1 else 64 * 1024 * 1024
+    data = os.urandom(size)
+    work_dir = tempfile.mkdtemp(prefix="http-download-")
+
+    with RangeFileServer(data) as server:
+        for connections in (1, 4):
+            destination = os.path.join(work_dir, f"video-{connections}.mp4")
+            downloader = HttpDownloader(connections=connections, parallel_threshold=1)
+            start_time = time.perf_counter()
+            downloader.download(server.url + "/video.mp4", destination)
+            seconds = time.perf_counter() - start_time
+            with open(destination, "rb") as f:
+                assert sha256(f.read()) == sha256(data)
+            print(f"{connections} connection(s): {size / seconds / 1024 ** 2:8.1f} MiB/s")
+
+    for connections in (1, 4):
+        with RangeFileServer(data, drop_after=size // 8, drops=connections) as server:
+            destination = os.path.join(work_dir, f"resumed-{connections}.mp4")
+            downloader = HttpDownloader(connections=connections, parallel_threshold=1)
+            try:
+                downloader.download(server.url + "/video.mp4", destination)
+                raise AssertionError("The first attempt should have been cut off.")
+            except requests.RequestException:
+                pass
+            assert not os.path.exists(destination), "A partial download must not reach the final path."
+            partial_bytes = os.path.getsize(destination + PART_SUFFIX)
+
+            downloader.download(server.url + "/video.mp4", destination)
+            with open(destination, "rb") as f:
+                assert sha256(f.read()) == sha256(data)
+            print(f"{connections} connection(s): resumed after a failure, {server.range_requests} range request(s), "
+                  f"partial file of {partial_bytes / 1024 ** 2:.1f} MiB")
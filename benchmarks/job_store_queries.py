@@ -0,0 +1,68 @@
+"""
+Measures how long finding unfinished jobs takes as the job store grows, compared with the old flat video_info table.
+
+Each database holds the given number of jobs, of which a fixed number still have unfinished stages, which is the
+usual shape of the table: almost everything is done and a handful of videos need retrying.
+
+Usage:
+    python -m benchmarks.job_store_queries
+"""
+import os
+import sqlite3
+import tempfile
+import time
+
+from pipeline.job_store import DONE, STAGES, JobStore
+
+ROW_COUNTS = [1_000, 10_000, 100_000]
+UNFINISHED_JOBS = 50
+REPEATS = 20
+
+
+def fill_job_store(store, rows):
+    with store.batch():
+        for i in range(rows):
+            job_id = store.add_job(f"https://www.tiktok.com/@bench/video/{i}", f"Video {i}", "top")
+            if i % (rows // UNFINISHED_JOBS) != 0:
+                for stage, column in STAGES.items():
+                    store.update_stage(job_id, stage, DONE, f"{column}-{i}")
+
+
+def fill_video_info(conn, rows):
+    conn.execute('''CREATE TABLE video_info
+                    (tiktok_url TEXT, video_description TEXT, watermark_position TEXT,
+                    downloaded_tiktok TEXT, edited_video TEXT, tiktok_is_uploaded TEXT, youtube_video_id TEXT)''')
+    conn.executemany("INSERT INTO video_info VALUES (?, ?, ?, ?, ?, ?, ?)", (
+        (f"https://www.tiktok.com/@bench/video/{i}", f"Video {i}", "top", *(
+            [None] * 4 if i % (rows // UNFINISHED_JOBS) == 0 else ["a", "b", "1", "c"]))
+        for i in range(rows)))
+    conn.commit()
+
+
+def average_seconds(query):
+    start_time = time.perf_counter()
+    for _ in range(REPEATS):
+        result = query()
+    assert len(result) == UNFINISHED_JOBS, len(result)
+    return (time.perf_counter() - start_time) / REPEATS
+
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp(prefix="job-store-")
+    for rows in ROW_COUNTS:
+        store = JobStore(os.path.join(work_dir, f"jobs-{rows}.db"))
+        fill_job_store(store, rows)
+
+        conn = sqlite3.connect(os.path.join(work_dir, f"video-info-{rows}.db"))
+        fill_video_info(conn, rows)
+
+        job_store_seconds = average_seconds(store.pending_jobs)
+        stage_seconds = average_seconds(lambda: store.pending_jobs("youtube"))
+        flat_seconds = average_seconds(lambda: conn.execute(
+            "SELECT * FROM video_info WHERE downloaded_tiktok IS NULL OR edited_video IS NULL "
+            "OR tiktok_is_uploaded IS NULL OR youtube_video_id IS NULL").fetchall())
+
+        print(f"{rows:>7} rows: job store {job_store_seconds * 1000:7.3f} ms, "
+              f"single stage {stage_seconds * 1000:7.3f} ms, flat table {flat_seconds * 1000:7.3f} ms")
+        store.close()
+        conn.close()
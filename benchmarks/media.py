@@ -0,0 +1,131 @@
+"""
+Helpers for generating synthetic media for the benchmarks.
+"""
+import os
+import subprocess
+
+import numpy as np
+from moviepy.config import get_setting
+
+from editor.watermark_cache import watermark_cache
+
+FONT = "Kalam"
+FONT_COLOR = "blue2"
+
+
+def generate_video(path, size=(720, 1280), duration=5, fps=30, audio=True) -> str:
+    """
+    Generates a test pattern video with ffmpeg, with an optional sine tone audio track.
+
+    Existing files are reused.
+
+    Args:
+        path (str): The path of the video file to create.
+        size (tuple[int, int], optional): The (width, height) of the video. Defaults to (720, 1280).
+        duration (float, optional): The duration in seconds. Defaults to 5.
+        fps (int, optional): The frame rate. Defaults to 30.
+        audio (bool, optional): Whether to add an AAC audio track. Defaults to True.
+
+    Returns:
+        str: The path of the video file.
+    """
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    width, height = size
+    command = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+               "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={fps}:duration={duration}"]
+    if audio:
+        command += ["-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}", "-c:a", "aac"]
+    command += ["-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-g", str(fps * 2), "-shortest", path]
+    subprocess.run(command, check=True)
+    return path
+
+
+def generate_scene_video(path, seed, size=(540, 960), duration=15, fps=30, scene_seconds=5) -> str:
+    """
+    Generates a video that looks more like camera footage than a test pattern: smooth random images, cut every few seconds and slowly panned, with a tone whose loudness rises and falls at a rate depending on the seed.
+
+    Videos with different seeds are different clips. Existing files are reused.
+
+    Args:
+        path (str): The path of the video file to create.
+        seed (int): The seed of the random images and the audio.
+        size (tuple[int, int], optional): The (width, height) of the video. Defaults to (540, 960).
+        duration (int, optional): The duration in seconds. Defaults to 15.
+        fps (int, optional): The frame rate. Defaults to 30.
+        scene_seconds (int, optional): The length of each scene in seconds. Defaults to 5.
+
+    Returns:
+        str: The path of the video file.
+    """
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    width, height = size
+    rng = np.random.default_rng(seed)
+    command = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+               "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+               "-f", "lavfi", "-i", f"aevalsrc=0.5*sin(2*PI*440*t)*(1+sin(2*PI*t/{2 + seed % 5})):s=44100:d={duration}",
+               "-c:v", "libx264", "-preset", "ultrafast", "-g", str(fps * 2), "-pix_fmt", "yuv420p", "-c:a", "aac",
+               "-shortest", path]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    # Each scene is larger than the frame, so it can pan.
+    pan = (width // 4, height // 4)
+    for index in range(duration * fps):
+        if index % (scene_seconds * fps) == 0:
+            scene = _smooth_image(rng.random((6, 4, 3)), (height + pan[1], width + pan[0]))
+        progress = (index % (scene_seconds * fps)) / (scene_seconds * fps)
+        x, y = int(progress * pan[0]), int(progress * pan[1])
+        process.stdin.write(scene[y:y + height, x:x + width].tobytes())
+    process.stdin.close()
+    process.wait()
+    return path
+
+
+def _smooth_image(grid, shape) -> np.ndarray:
+    """
+    Stretches a small grid of random colours into an RGB image of the given (height, width) with bilinear interpolation.
+    """
+    rows = np.linspace(0, grid.shape[0] - 1, shape[0])
+    columns = np.linspace(0, grid.shape[1] - 1, shape[1])
+    top_rows = np.minimum(rows.astype(int), grid.shape[0] - 2)
+    left_columns = np.minimum(columns.astype(int), grid.shape[1] - 2)
+    row_fractions = (rows - top_rows)[:, np.newaxis, np.newaxis]
+    column_fractions = (columns - left_columns)[np.newaxis, :, np.newaxis]
+    top = grid[top_rows][:, left_columns] * (1 - column_fractions) + grid[top_rows][:, left_columns + 1] * column_fractions
+    bottom = (grid[top_rows + 1][:, left_columns] * (1 - column_fractions)
+              + grid[top_rows + 1][:, left_columns + 1] * column_fractions)
+    return np.rint((top * (1 - row_fractions) + bottom * row_fractions) * 255).astype(np.uint8)
+
+
+def synthetic_watermark(font_size) -> np.ndarray:
+    """
+    Creates a text-sized RGBA patch with a soft elliptical alpha mask.
+    """
+    height, width = int(font_size * 1.4), int(font_size * 5)
+    rows, columns = np.mgrid[0:height, 0:width]
+    distance = ((rows - height / 2) / (height / 2)) ** 2 + ((columns - width / 2) / (width / 2)) ** 2
+    rgba = np.zeros((height, width, 4), dtype=np.uint8)
+    rgba[..., 1] = (columns * 255 // width).astype(np.uint8)
+    rgba[..., 2] = 238
+    rgba[..., 3] = np.rint(np.clip(1.2 - distance, 0, 1) * 255).astype(np.uint8)
+    return rgba
+
+
+def prime_watermark(text, frame_size):
+    """
+    Stores a synthetic watermark in the watermark cache for a frame size, so the editor does not need ImageMagick.
+    """
+    font_size = min(frame_size) / 10
+    watermark_cache.put(text, FONT, font_size, FONT_COLOR, synthetic_watermark(font_size))
+
+
+def psnr(reference, candidate) -> float:
+    """
+    Returns the peak signal-to-noise ratio between two frames in dB.
+    """
+    mse = np.mean((reference.astype(np.float64) - candidate.astype(np.float64)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255 ** 2 / mse)
@@ -0,0 +1,59 @@
+"""
+Compares rendering watermark variants of a clip one call at a time with rendering them in one decode-once pass.
+
+For 1, 2 and 4 variants the script times separate add_watermark_to_video calls (one decode per variant) and a single
+render_variants pass, and prints the per-variant timings of the pass. The cost of the pass should grow sub-linearly
+with the number of variants, since decoding and trimming happen once.
+
+Usage:
+    python -m benchmarks.multi_variant [work_dir] [preset]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.media import generate_video, prime_watermark
+from editor.multi_variant import Variant, render_variants
+from editor.video_editor import add_watermark_to_video
+
+VARIANT_COUNTS = [1, 2, 4]
+VARIANTS = [
+    ("Channel A", "top", "1:1"),
+    ("Channel B", "bottom", "1:1"),
+    ("Channel C", "top", "9:16"),
+    ("Channel D", "bottom", "9:16"),
+]
+PROFILE = "fast-draft"
+
+
+if __name__ == "__main__":
+    work_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(tempfile.gettempdir(), "multi-variant")
+    preset = sys.argv[2] if len(sys.argv) > 2 else None
+
+    size = (1280, 720)
+    source = generate_video(os.path.join(work_dir, "source.mp4"), size, 10)
+    for text, _, _ in VARIANTS:
+        prime_watermark(text, size)
+
+    single_pass = {}
+    for count in VARIANT_COUNTS:
+        variants = [Variant(os.path.join(work_dir, f"pass-{count}-{index}.mp4"), text, position, 20, aspect_ratio)
+                    for index, (text, position, aspect_ratio) in enumerate(VARIANTS[:count])]
+
+        start_time = time.perf_counter()
+        for variant in variants:
+            add_watermark_to_video(source, variant.output_video.replace("pass-", "separate-"), variant.watermark_text,
+                                   variant.position, variant.margin, aspect_ratio=variant.aspect_ratio, preset=preset,
+                                   profile=PROFILE)
+        separate_seconds = time.perf_counter() - start_time
+
+        report = render_variants(source, variants, profile=PROFILE, preset=preset)
+        single_pass[count] = report.wall_seconds
+
+        print(f"{count} variant(s): separate calls {separate_seconds:6.2f} s, one pass {report.wall_seconds:6.2f} s "
+              f"(decode {report.decode_seconds:.2f} s, {report.wall_seconds / single_pass[1]:.2f}x the cost of one variant)")
+        for timing in report.variants:
+            print(f"    {os.path.basename(timing.output_video):14}: {timing.frames} frames, done after {timing.wall_seconds:6.2f} s, "
+                  f"blend {timing.blend_seconds:5.2f} s, encoder wait {timing.write_seconds:5.2f} s, mux {timing.mux_seconds:4.2f} s"
+                  + (f", error: {timing.error}" if timing.error else ""))
@@ -0,0 +1,80 @@
+"""
+Measures the throughput of the batch pipeline against stub stages.
+
+The stubs sleep to imitate network-bound downloads and uploads and spin the CPU to imitate encoding, so the
+numbers show how much the staged pipeline overlaps the stages compared to processing one video at a time.
+
+Usage:
+    python -m benchmarks.pipeline_throughput [number_of_videos]
+"""
+import sys
+import time
+
+from pipeline.batch_pipeline import BatchPipeline, Stage, VideoJob
+
+DOWNLOAD_SECONDS = 0.4
+ENCODE_SECONDS = 0.4
+UPLOAD_SECONDS = 0.2
+
+
+def stub_download(job):
+    time.sleep(DOWNLOAD_SECONDS)
+    job.downloaded_tiktok = job.tiktok_url + ".mp4"
+    return job
+
+
+def stub_encode(job):
+    deadline = time.process_time() + ENCODE_SECONDS
+    while time.process_time() < deadline:
+        pass
+    job.edited_video = job.downloaded_tiktok
+    return job
+
+
+def stub_tiktok_upload(job):
+    time.sleep(UPLOAD_SECONDS)
+    job.tiktok_is_uploaded = True
+    return job
+
+
+def stub_youtube_upload(job):
+    time.sleep(UPLOAD_SECONDS)
+    job.youtube_video_id = "stub"
+    return job
+
+
+def make_jobs(count):
+    return [VideoJob(f"https://www.tiktok.com/@stub/video/{i}", f"Video {i}") for i in range(count)]
+
+
+def run_serial(jobs):
+    start_time = time.perf_counter()
+    for job in jobs:
+        for func in (stub_download, stub_encode, stub_tiktok_upload, stub_youtube_upload):
+            job = func(job)
+    return time.perf_counter() - start_time
+
+
+def run_pipeline(jobs):
+    pipeline = BatchPipeline([
+        Stage("download", stub_download, workers=2),
+        Stage("edit", stub_encode, cpu_bound=True),
+        Stage("tiktok upload", stub_tiktok_upload, workers=1),
+        Stage("youtube upload", stub_youtube_upload, workers=1),
+    ])
+    start_time = time.perf_counter()
+    finished = list(pipeline.run(jobs))
+    elapsed = time.perf_counter() - start_time
+    assert len(finished) == len(jobs) and all(job.error is None for job in finished)
+    return elapsed
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+
+    serial_seconds = run_serial(make_jobs(count))
+    pipeline_seconds = run_pipeline(make_jobs(count))
+
+    print(f"Serial:   {count * 3600 / serial_seconds:8.0f} videos/hour ({serial_seconds:.2f} s)")
+    print(f"Pipeline: {count * 3600 / pipeline_seconds:8.0f} videos/hour ({pipeline_seconds:.2f} s)")
+    print(f"Speedup:  {serial_seconds / pipeline_seconds:.2f}x")
@@ -0,0 +1,117 @@
+"""
+Uploads a generated file to a local stand-in of the YouTube resumable upload endpoint.
+
+Checks that failed chunks are retried, and that an upload interrupted by a crash resumes from the last byte the
+server acknowledged, using the session persisted in a job store, instead of sending the whole file again, unless the
+video has changed in the meantime.
+
+Usage:
+    python -m benchmarks.resumable_upload [size_in_mib]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+import googleapiclient.discovery
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import build_http
+
+from benchmarks.standins import ResumableUploadStandin
+from pipeline.job_store import JobStore, UploadSession
+from uploader.youtube_uploader import YouTubeUploader
+
+CHUNK_SIZE = 4 * 256 * 1024
+
+
+class SimulatedCrash(Exception):
+    pass
+
+
+def standin_uploader(standin) -> YouTubeUploader:
+    # The bundled discovery document, pointed at the plain HTTP stand-in.
+    document = json.loads(get_static_doc("youtube", "v3"))
+    document["rootUrl"] = standin.url + "/"
+    document["baseUrl"] = standin.url + "/" + document["servicePath"]
+    http = build_http()
+    # A retried request whose body was lost only fails after the socket timeout.
+    http.timeout = 5
+    youtube = googleapiclient.discovery.build_from_document(document, http=http)
+    return YouTubeUploader(youtube=youtube)
+
+
+def quiet_progress(uploaded_bytes, total_bytes):
+    pass
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) * 1024 * 1024 if len(sys.argv) > 1 else 16 * 1024 * 1024
+    work_dir = tempfile.mkdtemp(prefix="resumable-upload-")
+    video_path = os.path.join(work_dir, "video.mp4")
+    with open(video_path, "wb") as f:
+        f.write(os.urandom(size))
+
+    with ResumableUploadStandin() as standin:
+        start_time = time.perf_counter()
+        video_id = standin_uploader(standin).upload_video(video_path, "title", "description", chunk_size=CHUNK_SIZE,
+                                                          progress_callback=quiet_progress)
+        seconds = time.perf_counter() - start_time
+        assert video_id is not None and standin.bytes_received == size
+        print(f"Uninterrupted upload: {size / seconds / 1024 ** 2:.1f} MiB/s in {CHUNK_SIZE // 1024} KiB chunks")
+
+    with ResumableUploadStandin(failures={2: "error", 5: "drop"}) as standin:
+        video_id = standin_uploader(standin).upload_video(video_path, "title", "description", chunk_size=CHUNK_SIZE,
+                                                          progress_callback=quiet_progress)
+        assert video_id is not None and standin.bytes_received == size
+        print(f"Upload with a failed and a dropped chunk: finished, {standin.bytes_received} of {size} bytes received")
+
+    job_store = JobStore(os.path.join(work_dir, "jobs.db"))
+    job_id = job_store.add_job("https://www.tiktok.com/@user/video/1", "description", "top")
+    crash_after = size // 2
+
+    def crash_half_way(uploaded_bytes, total_bytes):
+        if uploaded_bytes >= crash_after:
+            raise SimulatedCrash()
+
+    with ResumableUploadStandin() as standin:
+        try:
+            standin_uploader(standin).upload_video(video_path, "title", "description", chunk_size=CHUNK_SIZE,
+                                                   progress_callback=crash_half_way,
+                                                   upload_session=UploadSession(job_store, job_id))
+            raise AssertionError("The first attempt should have crashed.")
+        except SimulatedCrash:
+            pass
+        session_uri, offset, _, _ = job_store.upload_session(job_id)
+        sent_before_crash = standin.bytes_received
+
+        # A new uploader, as in a restarted process, continues the persisted session.
+        video_id = standin_uploader(standin).upload_video(video_path, "title", "description", chunk_size=CHUNK_SIZE,
+                                                          progress_callback=quiet_progress,
+                                                          upload_session=UploadSession(job_store, job_id))
+        assert video_id is not None
+        assert len(standin.sessions) == 1, "The restarted upload must reuse the persisted session."
+        assert standin.bytes_received == size, "No acknowledged byte may be sent twice."
+        assert job_store.upload_session(job_id) is None
+        print(f"Upload resumed after a crash at byte {offset}: {size - sent_before_crash} bytes sent after the "
+              f"restart instead of {size}")
+
+    with ResumableUploadStandin() as standin:
+        try:
+            standin_uploader(standin).upload_video(video_path, "title", "description", chunk_size=CHUNK_SIZE,
+                                                   progress_callback=crash_half_way,
+                                                   upload_session=UploadSession(job_store, job_id))
+            raise AssertionError("The first attempt should have crashed.")
+        except SimulatedCrash:
+            pass
+
+        # The video is encoded again before the restart, so the saved session must not be resumed.
+        with open(video_path, "ab") as f:
+            f.write(os.urandom(CHUNK_SIZE))
+        video_id = standin_uploader(standin).upload_video(video_path, "title", "description", chunk_size=CHUNK_SIZE,
+                                                          progress_callback=quiet_progress,
+                                                          upload_session=UploadSession(job_store, job_id))
+        assert video_id is not None
+        assert len(standin.sessions) == 2, "A changed video must be uploaded in a new session."
+        print("Upload of a changed video after a crash: started a new session")
+    job_store.close()
@@ -0,0 +1,80 @@
+"""
+Compares the retry scheduler with a serial retry loop on stub stages that fail at random.
+
+Both runs use the same failure rate and backoff, so the difference comes from running the stages of different videos
+concurrently and from not blocking while a failed stage waits for its retry.
+
+Usage:
+    python -m benchmarks.retry_scheduler [number_of_videos]
+"""
+import random
+import sys
+import time
+
+from pipeline.batch_pipeline import VideoJob
+from pipeline.retry_scheduler import RetryScheduler, ScheduledStage, TokenBucket
+
+FAILURE_RATE = 0.3
+STAGE_SECONDS = {"download": 0.15, "edit": 0.2, "tiktok": 0.1, "youtube": 0.1}
+RESULT_FIELDS = {"download": "downloaded_tiktok", "edit": "edited_video", "tiktok": "tiktok_is_uploaded", "youtube": "youtube_video_id"}
+MAX_ATTEMPTS = 6
+BASE_DELAY = 0.2
+
+
+def make_stub(stage, rng):
+    def stub(job):
+        time.sleep(STAGE_SECONDS[stage])
+        if rng.random() < FAILURE_RATE:
+            raise RuntimeError(f"random {stage} failure")
+        setattr(job, RESULT_FIELDS[stage], f"{stage}-result")
+        return job
+    return stub
+
+
+def make_jobs(count):
+    return [VideoJob(f"https://www.tiktok.com/@stub/video/{i}", f"Video {i}") for i in range(count)]
+
+
+def run_serial(jobs, stubs, scheduler):
+    """
+    Retries each stage in place before moving on, one video at a time.
+    """
+    for job in jobs:
+        for stage, stub in stubs.items():
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                try:
+                    stub(job)
+                    break
+                except RuntimeError as e:
+                    if attempt == MAX_ATTEMPTS:
+                        job.error = str(e)
+                    else:
+                        time.sleep(scheduler.backoff(attempt))
+            if job.error is not None:
+                break
+    return jobs
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    stubs = {stage: make_stub(stage, random.Random(stage)) for stage in STAGE_SECONDS}
+    stages = [
+        ScheduledStage("download", stubs["download"], TokenBucket(rate=20, capacity=4)),
+        ScheduledStage("edit", stubs["edit"]),
+        ScheduledStage("tiktok", stubs["tiktok"], TokenBucket(rate=10, capacity=2)),
+        ScheduledStage("youtube", stubs["youtube"], TokenBucket(rate=10, capacity=2)),
+    ]
+    scheduler = RetryScheduler(stages, workers=6, max_attempts=MAX_ATTEMPTS, base_delay=BASE_DELAY, max_delay=2)
+
+    start_time = time.perf_counter()
+    serial_jobs = run_serial(make_jobs(count), stubs, scheduler)
+    serial_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    scheduled_jobs = scheduler.run(make_jobs(count))
+    scheduled_seconds = time.perf_counter() - start_time
+
+    print(f"Serial loop: {serial_seconds:6.2f} s, {sum(job.error is not None for job in serial_jobs)} video(s) given up on")
+    print(f"Scheduler:   {scheduled_seconds:6.2f} s, {sum(job.error is not None for job in scheduled_jobs)} video(s) given up on")
+    assert scheduled_seconds < serial_seconds, "The scheduler should finish faster than the serial loop."
+    print(f"Speedup:     {serial_seconds / scheduled_seconds:.2f}x")
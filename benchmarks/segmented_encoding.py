@@ -0,0 +1,65 @@
+"""
+Measures the speedup of segmented encoding over a single ffmpeg encode by number of worker processes.
+
+The script also checks that the segmented output has the same duration as the serial output and that its audio and
+video streams still end together.
+
+Usage:
+    python -m benchmarks.segmented_encoding [work_dir]
+"""
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from moviepy.config import get_setting
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+from benchmarks.media import generate_video, prime_watermark
+from editor.edit_plan import FFmpegBackend, build_edit_plan
+from editor.segmented_encoder import render_segmented
+
+SOURCE_SIZE = (720, 1280)
+SOURCE_DURATION = 30
+WATERMARK_TEXT = "Benchmark"
+
+
+def stream_duration(path, stream):
+    """
+    Returns the duration of one stream ("v" or "a") of a file by remuxing it to the null muxer.
+    """
+    result = subprocess.run([get_setting("FFMPEG_BINARY"), "-i", path, "-map", f"0:{stream}:0", "-c", "copy", "-f", "null", "-"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    hours, minutes, seconds = re.findall(r"time=(\d+):(\d+):([\d.]+)", result.stderr.decode())[-1]
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def av_offset(path):
+    return stream_duration(path, "a") - stream_duration(path, "v")
+
+
+if __name__ == "__main__":
+    work_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(tempfile.gettempdir(), "segmented-encoding")
+    source = generate_video(os.path.join(work_dir, "source.mp4"), SOURCE_SIZE, SOURCE_DURATION)
+    prime_watermark(WATERMARK_TEXT, SOURCE_SIZE)
+
+    serial_output = os.path.join(work_dir, "serial.mp4")
+    start_time = time.perf_counter()
+    FFmpegBackend().render(build_edit_plan(source, serial_output, WATERMARK_TEXT, "bottom"))
+    serial_seconds = time.perf_counter() - start_time
+    serial_duration = ffmpeg_parse_infos(serial_output)["duration"]
+    print(f"serial        : {serial_seconds:6.2f} s, duration {serial_duration:.3f} s, "
+          f"audio ends {av_offset(serial_output):+.3f} s after video")
+
+    core_counts = sorted({1, 2, 4, 8, os.cpu_count() or 1})
+    for workers in core_counts:
+        output = os.path.join(work_dir, f"segmented-{workers}.mp4")
+        start_time = time.perf_counter()
+        render_segmented(build_edit_plan(source, output, WATERMARK_TEXT, "bottom"), workers=workers)
+        seconds = time.perf_counter() - start_time
+        infos = ffmpeg_parse_infos(output)
+        print(f"{workers:2} worker(s)  : {seconds:6.2f} s ({serial_seconds / seconds:.2f}x), "
+              f"duration {infos['duration']:.3f} s ({infos['duration'] - serial_duration:+.3f} s), "
+              f"audio ends {av_offset(output):+.3f} s after video")
@@ -0,0 +1,87 @@
+"""
+Measures the overhead of stage instrumentation and checks the metrics it records and exports.
+
+Stub stages download a generated video, encode it with ffmpeg in a process pool and imitate the uploads, so the
+edit stage's CPU time and encode fps come from a real ffmpeg run.
+
+Usage:
+    python -m benchmarks.stage_metrics [number_of_videos]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from moviepy.config import get_setting
+
+from benchmarks.media import generate_video
+from pipeline.batch_pipeline import BatchPipeline, Stage, VideoJob
+from pipeline.job_store import JobStore
+from pipeline.metrics import export_metrics, instrument
+
+WORK_DIR = os.path.join(tempfile.gettempdir(), "stage-metrics")
+SOURCE_VIDEO = os.path.join(WORK_DIR, "source.mp4")
+
+
+def stub_download(job):
+    job.downloaded_tiktok = os.path.join(WORK_DIR, f"{job.tiktok_url.rsplit('/', 1)[-1]}.mp4")
+    shutil.copyfile(SOURCE_VIDEO, job.downloaded_tiktok)
+    return job
+
+
+def stub_encode(job):
+    job.edited_video = job.downloaded_tiktok.replace(".mp4", "-edited.mp4")
+    subprocess.run([get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error", "-i", job.downloaded_tiktok,
+                    "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "copy", job.edited_video], check=True)
+    return job
+
+
+def stub_upload(job):
+    if job.tiktok_url.endswith("/3"):
+        raise RuntimeError("the upload failed")
+    time.sleep(0.05)
+    return job
+
+
+def call_overhead(enabled, calls=20000) -> float:
+    stage = instrument("tiktok", lambda job: job, enabled=enabled)
+    job = VideoJob("https://www.tiktok.com/@user/video/1", "description")
+    start_time = time.perf_counter()
+    for _ in range(calls):
+        stage(job)
+    return (time.perf_counter() - start_time) / calls
+
+
+if __name__ == "__main__":
+    videos = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    generate_video(SOURCE_VIDEO, size=(540, 960), duration=3)
+
+    disabled, enabled = call_overhead(False), call_overhead(True)
+    print(f"Per-call overhead: disabled {disabled * 1e6:.2f} us, enabled {(enabled - disabled) * 1e6:.2f} us")
+
+    stages = [Stage("download", instrument("download", stub_download, enabled=True)),
+              Stage("edit", instrument("edit", stub_encode, enabled=True), workers=2, cpu_bound=True),
+              Stage("tiktok upload", instrument("tiktok", stub_upload, enabled=True))]
+    jobs = [VideoJob(f"https://www.tiktok.com/@user/video/{index}", "description") for index in range(videos)]
+    job_store = JobStore(os.path.join(WORK_DIR, f"jobs-{os.getpid()}.db"))
+    for job in BatchPipeline(stages).run(jobs):
+        job_store.save_job(job)
+
+    records = job_store.stage_metrics()
+    assert len(records) == 3 * videos, "Every stage run of every job must be recorded."
+    summary = export_metrics(records, WORK_DIR)
+    assert summary["tiktok"]["failures"] == 1 and summary["edit"]["fps_p50"] > 0
+    with open(os.path.join(WORK_DIR, "pipeline.prom"), encoding="utf-8") as f:
+        prometheus = f.read()
+    assert 'tiktok_automator_stage_wall_seconds{stage="edit",quantile="0.95"}' in prometheus
+    job_store.close()
+
+    for stage, stage_summary in summary.items():
+        print(f"{stage:>8}: p50 {stage_summary['wall_seconds_p50'] * 1000:7.1f} ms, "
+              f"p95 {stage_summary['wall_seconds_p95'] * 1000:7.1f} ms, "
+              f"CPU p50 {stage_summary['cpu_seconds_p50'] * 1000:7.1f} ms, "
+              f"{stage_summary['bytes_out'] / 1024:8.0f} KiB out, fps {stage_summary['fps_p50'] or 0:6.1f}, "
+              f"{stage_summary['failures']} failed")
+    print(f"Exported {os.path.join(WORK_DIR, 'pipeline.prom')} and {os.path.join(WORK_DIR, 'pipeline.json')}")
@@ -0,0 +1,268 @@
+"""
+Local HTTP stand-ins for the external services used by the downloader and uploaders.
+"""
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TIKDOWNLOADER_PAGE = """<!DOCTYPE html>
+<html>
+<head><title>tikdownloader stand-in</title></head>
+<body style="margin:0">
+<input id="s_input" type="text">
+<script>
+function ksearchvideo() {
+    var url = document.getElementById("s_input").value;
+    var id = (url.match(/video\\/(\\d+)/) || [null, "unknown"])[1];
+    setTimeout(function () {
+        var result = document.createElement("div");
+        result.id = "search-result";
+        // The link covers the whole page, so the coordinate click in download_tiktok always hits it.
+        result.innerHTML = '<a href="/media/' + id + '.mp4" download="' + id + '.mp4" ' +
+            'style="position:absolute;left:0;top:0;width:100%;height:100%;display:block">Download HD</a>';
+        document.body.appendChild(result);
+    }, DELAY_MS);
+}
+</script>
+</body>
+</html>
+"""
+
+
+class StandinServer:
+    def __init__(self, handler_class):
+        """
+        Runs an HTTP request handler on a free local port in a background thread.
+        """
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+        self.server.standin = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TikDownloaderStandin(StandinServer):
+    def __init__(self, video_bytes=b"\0" * 256 * 1024, result_delay_ms=200):
+        """
+        Mimics the tikdownloader.io flow: an "s_input" field, a `ksearchvideo()` function that shows a "search-result" element, and a download link serving `video_bytes`.
+
+        The page is served at /en, so TIKDOWNLOADER_URL should be set to `standin.url + "/en"`.
+        """
+        self.video_bytes = video_bytes
+        self.result_delay_ms = result_delay_ms
+        self.requests = []
+        super().__init__(_TikDownloaderHandler)
+
+
+class _TikDownloaderHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        standin = self.server.standin
+        standin.requests.append(self.path)
+        if self.path.startswith("/en"):
+            body = TIKDOWNLOADER_PAGE.replace("DELAY_MS", str(standin.result_delay_ms)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+        elif self.path.startswith("/media/"):
+            body = standin.video_bytes
+            self.send_response(200)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(self.path)}"')
+        else:
+            body = b"Not found"
+            self.send_response(404)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class RangeFileServer(StandinServer):
+    def __init__(self, data, drop_after=None, drops=1):
+        """
+        Serves `data` at every path, with HEAD and Range request support.
+
+        Parameters:
+            data (bytes): The file contents.
+            drop_after (int, optional): If set, the first `drops` responses close the connection after sending this many bytes, to simulate a network failure.
+            drops (int): The number of responses that are cut off.
+        """
+        self.data = data
+        self.drop_after = drop_after
+        self.drops_left = drops
+        self.range_requests = 0
+        self.lock = threading.Lock()
+        super().__init__(_RangeFileHandler)
+
+
+class _RangeFileHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.server.standin.data)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Type", "video/mp4")
+        self.end_headers()
+
+    def do_GET(self):
+        standin = self.server.standin
+        data = standin.data
+        start, end = 0, len(data) - 1
+        range_header = self.headers.get("Range")
+        if range_header:
+            first, _, last = range_header.removeprefix("bytes=").partition("-")
+            start = int(first)
+            end = int(last) if last else end
+            with standin.lock:
+                standin.range_requests += 1
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Type", "video/mp4")
+        self.end_headers()
+
+        body = data[start:end + 1]
+        with standin.lock:
+            drop = standin.drop_after is not None and standin.drops_left > 0
+            if drop:
+                standin.drops_left -= 1
+        if drop:
+            self.wfile.write(body[:standin.drop_after])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+class ResumableUploadStandin(StandinServer):
+    def __init__(self, failures=None):
+        """
+        Mimics the YouTube resumable upload protocol: a POST starts a session and returns its URI in the Location header, chunk PUTs are acknowledged with 308 and a Range header, and a PUT with "Content-Range: bytes */size" reports how much was received.
+
+        Build the YouTube service from a discovery document whose rootUrl is `standin.url + "/"` to send uploads here.
+
+        Parameters:
+            failures (dict, optional): Maps the index of a chunk PUT, counted over all sessions, to "error" to answer it with a 503, or "drop" to keep only half of its bytes and close the connection without answering.
+        """
+        self.failures = dict(failures or {})
+        self.sessions = {}
+        self.chunk_puts = 0
+        self.bytes_received = 0
+        self.lock = threading.Lock()
+        super().__init__(_ResumableUploadHandler)
+
+
+class _ResumableUploadHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        standin = self.server.standin
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with standin.lock:
+            session_id = str(len(standin.sessions) + 1)
+            standin.sessions[session_id] = bytearray()
+        self.send_response(200)
+        self.send_header("Location", f"{standin.url}/upload-session/{session_id}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_PUT(self):
+        standin = self.server.standin
+        session = standin.sessions.get(self.path.rsplit("/", 1)[-1])
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if session is None:
+            self._respond(404)
+            return
+
+        content_range = self.headers.get("Content-Range", "").removeprefix("bytes ")
+        byte_range, _, total = content_range.partition("/")
+        if byte_range != "*":
+            with standin.lock:
+                failure = standin.failures.pop(standin.chunk_puts, None)
+                standin.chunk_puts += 1
+            if failure == "error":
+                self._respond(503)
+                return
+            start = int(byte_range.partition("-")[0])
+            if start != len(session):
+                self._respond(400)
+                return
+            if failure == "drop":
+                session += body[:len(body) // 2]
+                standin.bytes_received += len(body) // 2
+                self.close_connection = True
+                return
+            session += body
+            standin.bytes_received += len(body)
+
+        if total != "*" and len(session) == int(total):
+            self._respond(200, json.dumps({"id": f"standin-{self.path.rsplit('/', 1)[-1]}"}).encode())
+        elif session:
+            self._respond(308, headers={"Range": f"bytes=0-{len(session) - 1}"})
+        else:
+            self._respond(308)
+
+    def _respond(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class TokenEndpointStandin(StandinServer):
+    def __init__(self, expires_in=3600):
+        """
+        Mimics the OAuth token endpoint: every POST to /token returns a new access token valid for `expires_in` seconds.
+
+        Use `standin.url + "/token"` as the credentials' token_uri.
+        """
+        self.expires_in = expires_in
+        self.refreshes = 0
+        super().__init__(_TokenEndpointHandler)
+
+
+class _TokenEndpointHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        standin = self.server.standin
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        standin.refreshes += 1
+        body = json.dumps({"access_token": f"standin-token-{standin.refreshes}", "expires_in": standin.expires_in,
+                           "token_type": "Bearer"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
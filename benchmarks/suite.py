@@ -0,0 +1,293 @@
+"""
+Runs the benchmark suite for the editor and the pipeline stages on generated media and compares it with a baseline.
+
+Input videos are generated locally with ffmpeg for every combination of orientation, duration, resolution and
+audio track in the chosen profile, and cached between runs. Each case runs in a fresh process, so its peak memory
+is its own:
+- "edit" cases run `add_watermark_to_video` with every engine, thread count and x264 preset of the profile.
+- "pad" cases read a landscape video through `ensure_video_is_portrait`.
+- "download", "youtube" and "tiktok" cases run the HTTP downloader, the resumable YouTube upload and the batched
+  TikTok upload against the local stand-ins.
+
+Every case reports its throughput, wall and CPU time, peak RSS and output size. The results are written as JSON. When
+a baseline exists, cases whose throughput dropped, or whose memory or output size grew, by more than the threshold
+are flagged and the exit code is 1.
+
+Usage:
+    python -m benchmarks.suite [--profile quick|full] [--repeat N] [--threshold 0.1] [--baseline PATH]
+                               [--save-baseline] [--output PATH] [--filter TEXT]
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+from moviepy.config import get_setting
+from moviepy.editor import VideoFileClip
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+from benchmarks.media import generate_video, prime_watermark
+from benchmarks.resumable_upload import standin_uploader
+from benchmarks.standins import RangeFileServer, ResumableUploadStandin
+from benchmarks.tiktok_batch_upload import StandinAuthBackend, standin_upload_videos
+from downloader.http_downloader import HttpDownloader
+from editor.video_editor import add_watermark_to_video, ensure_video_is_portrait
+from pipeline.metrics import cpu_time, peak_rss
+from uploader.tiktok_upload import upload_tiktok_batch
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_DIR = os.path.join(BASE_DIR, "baselines")
+MEDIA_DIR = os.path.join(tempfile.gettempdir(), "benchmark-media")
+WATERMARK_TEXT = "Benchmark"
+FPS = 30
+
+# (width, height) of each orientation at 720p; 1080p is 1.5 times larger.
+ORIENTATIONS = {"portrait": (720, 1280), "square": (720, 720), "landscape": (1280, 720)}
+
+PROFILES = {
+    "quick": {
+        "orientations": ["portrait", "square", "landscape"],
+        "durations": [15],
+        "resolutions": [720],
+        "audio": [True],
+        "engines": ["numpy", "compositor", "ffmpeg"],
+        "threads": [None],
+        "presets": ["ultrafast"],
+        "transfer_mib": 32,
+    },
+    "full": {
+        "orientations": ["portrait", "square", "landscape"],
+        "durations": [15, 60, 180],
+        "resolutions": [720, 1080],
+        "audio": [True, False],
+        "engines": ["numpy", "compositor", "ffmpeg", "ffmpeg-segmented"],
+        "threads": [1, None],
+        "presets": ["ultrafast", "medium"],
+        "transfer_mib": 256,
+    },
+}
+
+# Metrics where a larger value is a regression, and those where a smaller value is.
+HIGHER_IS_WORSE = ["peak_rss_bytes", "output_bytes"]
+LOWER_IS_WORSE = ["throughput"]
+
+
+def source_video(orientation, duration, resolution, audio) -> str:
+    """
+    Returns the path of a generated input video, creating it if needed.
+    """
+    width, height = (round(side * resolution / 720 / 2) * 2 for side in ORIENTATIONS[orientation])
+    name = f"{orientation}-{resolution}p-{duration}s-{'audio' if audio else 'silent'}.mp4"
+    return generate_video(os.path.join(MEDIA_DIR, name), size=(width, height), duration=duration, fps=FPS, audio=audio)
+
+
+def build_cases(profile) -> list[dict]:
+    """
+    Lists the cases of a profile in a fixed order. Each case is a dict of its parameters with a unique "name".
+    """
+    settings = PROFILES[profile]
+    cases = []
+    media = list(itertools.product(settings["orientations"], settings["durations"], settings["resolutions"], settings["audio"]))
+    for (orientation, duration, resolution, audio), engine, threads, preset in itertools.product(
+            media, settings["engines"], settings["threads"], settings["presets"]):
+        cases.append({
+            "kind": "edit", "orientation": orientation, "duration": duration, "resolution": resolution, "audio": audio,
+            "engine": engine, "threads": threads, "preset": preset,
+            "name": f"edit/{engine}/{orientation}-{resolution}p-{duration}s-{'audio' if audio else 'silent'}"
+                    f"/threads-{threads or 'auto'}/{preset}",
+        })
+    for orientation, duration, resolution, audio in media:
+        if orientation == "landscape":
+            cases.append({"kind": "pad", "orientation": orientation, "duration": duration, "resolution": resolution,
+                          "audio": audio, "name": f"pad/{orientation}-{resolution}p-{duration}s"})
+    transfer_bytes = settings["transfer_mib"] * 1024 * 1024
+    cases += [
+        {"kind": "download", "bytes": transfer_bytes, "connections": 1, "name": "download/http/1-connection"},
+        {"kind": "download", "bytes": transfer_bytes, "connections": 4, "name": "download/http/4-connections"},
+        {"kind": "youtube", "bytes": transfer_bytes, "name": "upload/youtube/resumable"},
+        {"kind": "tiktok", "videos": 8, "batch_size": 4, "name": "upload/tiktok/batches-of-4"},
+    ]
+    return cases
+
+
+def run_case(case) -> dict:
+    """
+    Runs one case and returns its measurements. Meant to run in a fresh process.
+    """
+    work_dir = tempfile.mkdtemp(prefix="benchmark-case-")
+    try:
+        return measure_case(case, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def measure_case(case, work_dir) -> dict:
+    """
+    Runs one case in a working directory and returns its measurements.
+    """
+    output_bytes = None
+    start_cpu = cpu_time()
+    if case["kind"] in ["edit", "pad"]:
+        input_video = source_video(case["orientation"], case["duration"], case["resolution"], case["audio"])
+        infos = ffmpeg_parse_infos(input_video)
+        prime_watermark(WATERMARK_TEXT, infos["video_size"])
+        start_time = time.perf_counter()
+        if case["kind"] == "edit":
+            output_video = add_watermark_to_video(input_video, os.path.join(work_dir, "output.mp4"),
+                                                  watermark_text=WATERMARK_TEXT, engine=case["engine"].split("-")[0],
+                                                  segmented=case["engine"].endswith("segmented"),
+                                                  threads=case["threads"], preset=case["preset"])
+            if output_video is None:
+                raise RuntimeError(f"{case['name']} failed")
+            output_bytes = os.path.getsize(output_video)
+            units = ffmpeg_parse_infos(output_video)["video_nframes"]
+        else:
+            with VideoFileClip(input_video, audio=False) as clip:
+                units = sum(1 for _ in ensure_video_is_portrait(clip).iter_frames())
+        unit = "fps"
+    elif case["kind"] == "download":
+        with RangeFileServer(os.urandom(case["bytes"])) as server:
+            start_time = time.perf_counter()
+            HttpDownloader(connections=case["connections"], parallel_threshold=1).download(
+                server.url + "/video.mp4", os.path.join(work_dir, "video.mp4"))
+        units, unit = case["bytes"] / 1024 ** 2, "MiB/s"
+    elif case["kind"] == "youtube":
+        video_path = os.path.join(work_dir, "video.mp4")
+        with open(video_path, "wb") as f:
+            f.write(os.urandom(case["bytes"]))
+        with ResumableUploadStandin() as standin:
+            uploader = standin_uploader(standin)
+            start_time = time.perf_counter()
+            if uploader.upload_video(video_path, "title", "description", progress_callback=lambda *args: None) is None:
+                raise RuntimeError(f"{case['name']} failed")
+        units, unit = case["bytes"] / 1024 ** 2, "MiB/s"
+    else:
+        videos = []
+        for index in range(case["videos"]):
+            videos.append((os.path.join(work_dir, f"video-{index}.mp4"), "description"))
+            open(videos[-1][0], "wb").close()
+        with mock.patch("uploader.tiktok_upload.upload_videos", standin_upload_videos), \
+                mock.patch("uploader.tiktok_upload.AuthBackend", StandinAuthBackend):
+            start_time = time.perf_counter()
+            for index in range(0, len(videos), case["batch_size"]):
+                upload_tiktok_batch(videos[index:index + case["batch_size"]])
+        units, unit = len(videos), "videos/s"
+
+    seconds = time.perf_counter() - start_time
+    return {
+        "seconds": seconds,
+        "cpu_seconds": cpu_time() - start_cpu,
+        "throughput": units / seconds,
+        "unit": unit,
+        "peak_rss_bytes": peak_rss(),
+        "output_bytes": output_bytes,
+    }
+
+
+def run_isolated(case) -> dict:
+    """
+    Runs a case in a new process and returns its measurements.
+    """
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+        return executor.submit(run_case, case).result()
+
+
+def environment() -> dict:
+    """
+    Describes the machine the benchmarks ran on, so results from different machines are not compared blindly.
+    """
+    ffmpeg_version = subprocess.run([get_setting("FFMPEG_BINARY"), "-version"], capture_output=True, text=True).stdout
+    return {
+        "cpu_count": os.cpu_count(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "python": platform.python_version(),
+        "ffmpeg": ffmpeg_version.split("\n", 1)[0],
+    }
+
+
+def compare(baseline, results, threshold) -> list[str]:
+    """
+    Returns a description of every metric that regressed by more than `threshold` (a fraction) against the baseline.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for metric in HIGHER_IS_WORSE + LOWER_IS_WORSE:
+            old, new = reference.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (metric in HIGHER_IS_WORSE and change > threshold) or (metric in LOWER_IS_WORSE and change < -threshold):
+                regressions.append(f"{name}: {metric} {old:.4g} -> {new:.4g} ({change:+.1%})")
+    return regressions
+
+
+def write_json(path, content):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(content, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the benchmark suite and compares it with a baseline.")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case; the median run is reported")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change flagged as a regression")
+    parser.add_argument("--baseline", help="baseline JSON file (default: benchmarks/baselines/<profile>.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--output", help="where to write the results JSON")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this text")
+    args = parser.parse_args()
+
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f"{args.profile}.json")
+    cases = [case for case in build_cases(args.profile) if args.filter in case["name"]]
+    print(f"Running {len(cases)} cases of the {args.profile} profile.")
+
+    results = {}
+    for case in cases:
+        runs = [run_isolated(case) for _ in range(max(1, args.repeat))]
+        result = dict(sorted(runs, key=lambda run: run["seconds"])[len(runs) // 2])
+        result["seconds_stdev"] = statistics.stdev(run["seconds"] for run in runs) if len(runs) > 1 else 0.0
+        results[case["name"]] = result
+        print(f"{case['name']:<70} {result['throughput']:9.1f} {result['unit']:<8} "
+              f"{result['seconds']:7.2f} s  {(result['peak_rss_bytes'] or 0) / 1024 ** 2:7.1f} MiB"
+              + (f"  {result['output_bytes'] / 1024 ** 2:7.2f} MiB out" if result["output_bytes"] else ""))
+
+    report = {"profile": args.profile, "created_at": time.time(), "environment": environment(), "results": results}
+    if args.output:
+        write_json(args.output, report)
+
+    exit_code = 0
+    baseline = None
+    if os.path.exists(baseline_path):
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["environment"] != report["environment"]:
+            print("Warning: the baseline was recorded in a different environment.")
+        regressions = compare(baseline["results"], results, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%} against {baseline_path}.")
+        exit_code = 1 if regressions else 0
+    else:
+        print(f"No baseline at {baseline_path}.")
+
+    if args.save_baseline:
+        if baseline is not None:
+            # Keep the baseline of the cases that were filtered out.
+            report["results"] = {**baseline["results"], **results}
+        write_json(baseline_path, report)
+        print(f"Saved the baseline to {baseline_path}.")
+    sys.exit(exit_code)
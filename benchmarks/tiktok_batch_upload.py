@@ -0,0 +1,78 @@
+"""
+Compares uploading edited videos to TikTok one browser session per video with micro-batches that share a session.
+
+`tiktok_uploader`'s `upload_videos` and `AuthBackend` are replaced by stand-ins that sleep to imitate launching the
+browser, logging in and posting each video, and count the sessions. One video is made to fail, to check that the
+batch reports results per video.
+
+Usage:
+    python -m benchmarks.tiktok_batch_upload [number_of_videos]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from pipeline.batch_pipeline import BatchPipeline, Stage, VideoJob
+from pipeline.video_stages import tiktok_batch_upload_stage, tiktok_upload_stage
+
+SESSION_SECONDS = 0.5
+POST_SECONDS = 0.05
+EDIT_SECONDS = 0.05
+
+
+class StandinAuthBackend:
+    sessions = 0
+    lock = threading.Lock()
+
+    def __init__(self, cookies=None):
+        with StandinAuthBackend.lock:
+            StandinAuthBackend.sessions += 1
+
+
+def standin_upload_videos(videos, auth):
+    time.sleep(SESSION_SECONDS)
+    failed = []
+    for video in videos:
+        time.sleep(POST_SECONDS)
+        if "fail" in os.path.basename(video["path"]):
+            failed.append(video)
+    return failed
+
+
+def stub_edit(job):
+    time.sleep(EDIT_SECONDS)
+    job.edited_video = job.downloaded_tiktok
+    return job
+
+
+def run(stage, video_paths) -> tuple[float, list[VideoJob]]:
+    StandinAuthBackend.sessions = 0
+    jobs = [VideoJob(f"https://www.tiktok.com/@user/video/{index}", "description", downloaded_tiktok=path)
+            for index, path in enumerate(video_paths)]
+    start_time = time.perf_counter()
+    finished = list(BatchPipeline([Stage("edit", stub_edit, workers=2), stage]).run(jobs))
+    return time.perf_counter() - start_time, finished
+
+
+if __name__ == "__main__":
+    videos = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    work_dir = tempfile.mkdtemp(prefix="tiktok-batch-")
+    video_paths = []
+    for index in range(videos):
+        video_paths.append(os.path.join(work_dir, f"{'fail' if index == 3 else 'video'}-{index}.mp4"))
+        open(video_paths[-1], "wb").close()
+
+    with mock.patch("uploader.tiktok_upload.upload_videos", standin_upload_videos), \
+            mock.patch("uploader.tiktok_upload.AuthBackend", StandinAuthBackend):
+        for name, stage in [("One session per video", Stage("tiktok upload", tiktok_upload_stage, workers=1)),
+                            ("Micro-batches of 4", Stage("tiktok upload", tiktok_batch_upload_stage, workers=1,
+                                                         batch_size=4, batch_wait=1.0))]:
+            seconds, finished = run(stage, video_paths)
+            failed = [job.downloaded_tiktok for job in finished if job.error is not None]
+            assert failed == [video_paths[3]], "Only the failing video may be reported as failed."
+            assert all(job.tiktok_is_uploaded for job in finished if job.error is None)
+            print(f"{name}: {seconds:6.2f} s, {StandinAuthBackend.sessions} browser session(s), "
+                  f"{len(finished) - len(failed)} of {len(finished)} videos uploaded")
@@ -0,0 +1,88 @@
+"""
+Compares the frame rate of the NumPy watermark engine with MoviePy's CompositeVideoClip on synthetic clips.
+
+A synthetic RGBA patch stands in for the rendered text so the benchmark does not need ImageMagick. Both engines
+render the same frames, and the largest per-pixel difference between them is reported alongside the frame rates.
+
+Usage:
+    python -m benchmarks.watermark_engines [number_of_frames]
+"""
+import sys
+import time
+
+import numpy as np
+from moviepy.editor import CompositeVideoClip, ImageClip, VideoClip
+
+from editor.watermark_renderer import WatermarkRenderer, watermark_position
+
+FRAME_SIZES = [(720, 1280), (1080, 1920), (1920, 1080)]
+
+
+def make_source_clip(frame_size, duration, fps=30):
+    """
+    Creates a clip of noise frames that are read-only, like the frames returned by the FFMPEG reader.
+    """
+    width, height = frame_size
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(4)]
+    for frame in frames:
+        frame.flags.writeable = False
+    clip = VideoClip(lambda t: frames[int(t * fps) % len(frames)], duration=duration)
+    clip.fps = fps
+    return clip
+
+
+def make_watermark(frame_size):
+    """
+    Creates a text-sized patch with a soft elliptical alpha mask.
+    """
+    font_size = min(frame_size) / 10
+    height, width = int(font_size * 1.4), int(font_size * 5)
+    rows, columns = np.mgrid[0:height, 0:width]
+    distance = ((rows - height / 2) / (height / 2)) ** 2 + ((columns - width / 2) / (width / 2)) ** 2
+    alpha = np.clip(1.2 - distance, 0, 1)
+    rgb = np.zeros((height, width, 3), dtype=np.uint8)
+    rgb[..., 2] = 238
+    rgb[..., 1] = (columns * 255 // width).astype(np.uint8)
+    return rgb, alpha, font_size
+
+
+def compositor_clip(source, rgb, alpha, font_size, margin):
+    watermark = (ImageClip(rgb).set_mask(ImageClip(alpha, ismask=True))
+                 .set_position(("center", source.size[1] - margin - font_size))
+                 .set_duration(source.duration))
+    return CompositeVideoClip([source, watermark])
+
+
+def numpy_clip(source, rgb, alpha, font_size, margin):
+    position = watermark_position(source.size, alpha.shape, "bottom", margin, font_size)
+    renderer = WatermarkRenderer(rgb, alpha, source.size, position)
+    return source.fl_image(renderer.apply)
+
+
+if __name__ == "__main__":
+    frame_count = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    margin = 20
+
+    for frame_size in FRAME_SIZES:
+        rgb, alpha, font_size = make_watermark(frame_size)
+        source = make_source_clip(frame_size, duration=frame_count / 30)
+
+        results = {}
+        for name, build in (("compositor", compositor_clip), ("numpy", numpy_clip)):
+            clip = build(source, rgb, alpha, font_size, margin)
+            clip.fps = 30
+            start_time = time.perf_counter()
+            for _ in clip.iter_frames(fps=30):
+                pass
+            results[name] = frame_count / (time.perf_counter() - start_time)
+
+        reference = compositor_clip(source, rgb, alpha, font_size, margin)
+        candidate = numpy_clip(source, rgb, alpha, font_size, margin)
+        max_difference = max(
+            int(np.abs(reference.get_frame(t).astype(np.int16) - candidate.get_frame(t).astype(np.int16)).max())
+            for t in (0, 1 / 30, 2 / 30))
+
+        print(f"{frame_size[0]}x{frame_size[1]}: compositor {results['compositor']:7.1f} fps, "
+              f"numpy {results['numpy']:7.1f} fps ({results['numpy'] / results['compositor']:.1f}x), "
+              f"max pixel difference {max_difference}")
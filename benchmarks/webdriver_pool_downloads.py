@@ -0,0 +1,58 @@
+"""
+Downloads videos from a local tikdownloader stand-in, once with a new browser per download and once through a
+WebDriverPool, and reports the time per download. Requires Chrome and ChromeDriver.
+
+Usage:
+    python -m benchmarks.webdriver_pool_downloads [number_of_videos]
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.standins import TikDownloaderStandin
+from downloader import tiktok_downloader
+from downloader.webdriver_pool import WebDriverPool, create_chrome_driver
+
+
+def fresh_browser_download(video_url, download_dir):
+    with create_chrome_driver(download_dir, headless=True, extension_path=None) as driver:
+        return tiktok_downloader.download_with_driver(driver, video_url, download_dir, timeout=60)
+
+
+def headless_without_extension(download_dir, headless):
+    return create_chrome_driver(download_dir, headless=True, extension_path=None)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    work_dir = tempfile.mkdtemp(prefix="webdriver-pool-")
+
+    with TikDownloaderStandin() as standin:
+        tiktok_downloader.TIKDOWNLOADER_URL = standin.url + "/en"
+        urls = [f"https://www.tiktok.com/@standin/video/{1000 + i}" for i in range(count)]
+
+        start_time = time.perf_counter()
+        for url in urls:
+            assert fresh_browser_download(url, os.path.join(work_dir, "fresh")) is not None
+        fresh_seconds = time.perf_counter() - start_time
+
+        pool = WebDriverPool(size=2, max_uses=4, download_dir=os.path.join(work_dir, "pool"),
+                             driver_factory=headless_without_extension)
+        pool.warm_up()
+
+        def pooled_download(url):
+            with pool.session() as session:
+                return tiktok_downloader.download_with_driver(session.driver, url, session.download_dir, timeout=60)
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            paths = list(executor.map(pooled_download, urls))
+        pooled_seconds = time.perf_counter() - start_time
+        pool.close()
+
+        assert all(paths) and len(set(paths)) == count, paths
+
+    print(f"New browser per download: {fresh_seconds / count:.2f} s per video")
+    print(f"Pooled sessions (2):      {pooled_seconds / count:.2f} s per video")
@@ -0,0 +1,77 @@
+"""
+Measures how long constructing a YouTubeUploader takes with the shared client factory, fully offline.
+
+Also checks that credentials about to expire are refreshed once, against a local token endpoint stand-in, and saved,
+and that every thread gets its own client.
+
+Usage:
+    python -m benchmarks.youtube_client [uploaders]
+"""
+import datetime
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+
+import googleapiclient.discovery
+from google.oauth2.credentials import Credentials
+
+from benchmarks.standins import TokenEndpointStandin
+from uploader.youtube_client import YouTubeClientFactory
+from uploader.youtube_uploader import YouTubeUploader
+
+
+def expiring_credentials(token_uri, seconds) -> Credentials:
+    expiry = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) + datetime.timedelta(seconds=seconds)
+    return Credentials("standin-token-0", refresh_token="refresh", token_uri=token_uri, client_id="client",
+                       client_secret="secret", expiry=expiry)
+
+
+if __name__ == "__main__":
+    uploaders = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    work_dir = tempfile.mkdtemp(prefix="youtube-client-")
+    credentials_file = os.path.join(work_dir, "youtube_credentials.pkl")
+
+    with TokenEndpointStandin() as standin:
+        with open(credentials_file, "wb") as f:
+            pickle.dump(expiring_credentials(standin.url + "/token", 60), f)
+        clients = YouTubeClientFactory(credentials_file=credentials_file, discovery_cache_dir=os.path.join(work_dir, "cache"))
+
+        start_time = time.perf_counter()
+        first = YouTubeUploader(clients=clients)
+        first_seconds = time.perf_counter() - start_time
+        assert standin.refreshes == 1, "Credentials expiring within the margin must be refreshed."
+        with open(credentials_file, "rb") as f:
+            assert pickle.load(f).token == "standin-token-1", "The refreshed credentials must be saved."
+
+        start_time = time.perf_counter()
+        for _ in range(uploaders):
+            uploader = YouTubeUploader(clients=clients)
+        seconds = (time.perf_counter() - start_time) / uploaders
+        assert uploader.youtube is first.youtube and standin.refreshes == 1
+
+        thread_clients = []
+        threads = [threading.Thread(target=lambda: thread_clients.append(YouTubeUploader(clients=clients).youtube))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len({id(youtube) for youtube in thread_clients + [first.youtube]}) == 5, "Every thread needs its own client."
+
+        # The credentials expire while the first uploader is still in use.
+        clients.credentials().expiry = expiring_credentials(standin.url + "/token", 60).expiry
+        first.youtube
+        assert standin.refreshes == 2, "A long-lived uploader must get refreshed credentials."
+
+    # What every uploader did before: unpickle the credentials and build a new service.
+    start_time = time.perf_counter()
+    with open(credentials_file, "rb") as f:
+        googleapiclient.discovery.build("youtube", "v3", credentials=pickle.load(f))
+    uncached_seconds = time.perf_counter() - start_time
+
+    print(f"First uploader (refresh and discovery document): {first_seconds * 1000:8.2f} ms")
+    print(f"Later uploaders:                                  {seconds * 1000:8.3f} ms")
+    print(f"Building the service for every uploader:          {uncached_seconds * 1000:8.2f} ms")
@@ -0,0 +1,222 @@
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Matches the video ID in full TikTok video URLs, e.g. https://www.tiktok.com/@user/video/7234567890123456789?is_from_webapp=1
+VIDEO_ID_PATTERNS = [
+    re.compile(r"^/@[^/]+/video/(\d+)"),
+    re.compile(r"^/v/(\d+)"),
+    re.compile(r"^/embed(?:/v2)?/(\d+)"),
+]
+# Hosts that serve short links redirecting to the full video URL.
+SHORT_LINK_HOSTS = {"vm.tiktok.com", "vt.tiktok.com"}
+
+
+def validate_tiktok_url(url) -> bool:
+    """
+    Validates a TikTok video URL.
+
+    Args:
+        url (str): The URL to be validated.
+
+    Returns:
+        bool: True if the URL matches the pattern for a TikTok video URL, False otherwise.
+    """
+    # Regular expression pattern for TikTok video URL
+    pattern = r'^https?://(?:(?:www|m|vm|vt)\.)?tiktok\.com/.+'
+    return re.match(pattern, url) is not None
+
+
+def canonicalize_tiktok_url(url) -> str | None:
+    """
+    Extracts the video ID from a full TikTok video URL, ignoring query parameters and fragments.
+
+    Args:
+        url (str): The TikTok video URL.
+
+    Returns:
+        str | None: The video ID, or None if the URL is not a full video URL (e.g. a short link).
+    """
+    parts = urlsplit(url.strip())
+    host = parts.hostname or ""
+    if host != "tiktok.com" and not host.endswith(".tiktok.com"):
+        return None
+    for pattern in VIDEO_ID_PATTERNS:
+        match = pattern.match(parts.path)
+        if match:
+            return match.group(1)
+    return None
+
+
+def is_short_link(url) -> bool:
+    """
+    Checks whether a URL is a TikTok short link such as https://vm.tiktok.com/ZMabc123/.
+    """
+    parts = urlsplit(url.strip())
+    return parts.hostname in SHORT_LINK_HOSTS or (parts.hostname in {"tiktok.com", "www.tiktok.com"} and parts.path.startswith("/t/"))
+
+
+def resolve_short_link(url, timeout=10) -> str:
+    """
+    Follows the redirects of a short link and returns the final URL.
+    """
+    # Imported here because it is slow to import and most callers never resolve a short link.
+    import urllib.request
+
+    request = urllib.request.Request(url, method="HEAD", headers={"User-Agent": "Mozilla/5.0"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.geturl()
+
+
+class DownloadCache:
+    def __init__(self, db_path=os.path.join(BASE_DIR, "download_cache.db"), max_age=30 * 24 * 3600, max_bytes=5 * 1024 ** 3,
+                 keep_paths=None):
+        """
+        Remembers downloaded TikToks by video ID, so the same video is never downloaded twice.
+
+        Each entry records the file's size and SHA-256 hash. Entries whose file has changed or disappeared are dropped on lookup. Entries are evicted, together with their files, once they are older than `max_age` or the cached files take up more than `max_bytes`. Files that are still needed, such as the downloads of unfinished jobs, are never evicted.
+
+        Parameters:
+            db_path (str): The path to the SQLite database holding the cache index.
+            max_age (float): The maximum age of an entry in seconds.
+            max_bytes (int): The maximum total size of the cached files.
+            keep_paths (callable, optional): Returns the paths of the files that must not be deleted yet. Their entries are evicted once it no longer returns them.
+        """
+        self.db_path = db_path
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.keep_paths = keep_paths
+        self._schema_created = False
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per call keeps the cache safe to use from several threads and processes.
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                if not self._schema_created:
+                    self._create_schema(conn)
+                    self._schema_created = True
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _create_schema(conn):
+        conn.execute('''CREATE TABLE IF NOT EXISTS downloads
+                        (video_id TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL,
+                         sha256 TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)''')
+        conn.execute('''CREATE TABLE IF NOT EXISTS short_links
+                        (url TEXT PRIMARY KEY, video_id TEXT NOT NULL)''')
+        conn.execute("CREATE INDEX IF NOT EXISTS downloads_last_used ON downloads (last_used)")
+
+    def resolve_video_id(self, url) -> str | None:
+        """
+        Returns the video ID of a TikTok URL, resolving short links over the network only the first time they are seen.
+
+        Args:
+            url (str): The TikTok video URL or short link.
+
+        Returns:
+            str | None: The video ID, or None if it cannot be determined.
+        """
+        video_id = canonicalize_tiktok_url(url)
+        if video_id is not None or not is_short_link(url):
+            return video_id
+
+        short_link = url.strip().split("?")[0].rstrip("/")
+        with self._connect() as conn:
+            row = conn.execute("SELECT video_id FROM short_links WHERE url=?", (short_link,)).fetchone()
+        if row is not None:
+            return row[0]
+
+        try:
+            video_id = canonicalize_tiktok_url(resolve_short_link(url))
+        except OSError as e:
+            print(f"Could not resolve the short link {url}: {e}")
+            return None
+
+        if video_id is not None:
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO short_links VALUES (?, ?)", (short_link, video_id))
+        return video_id
+
+    def lookup(self, video_id, verify_hash=False) -> str | None:
+        """
+        Returns the cached file of a video, if it is still intact.
+
+        Args:
+            video_id (str): The video ID.
+            verify_hash (bool, optional): Whether to check the SHA-256 hash of the file in addition to its size. Defaults to False.
+
+        Returns:
+            str | None: The path to the cached file, or None if the video is not cached.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT path, size, sha256 FROM downloads WHERE video_id=?", (video_id,)).fetchone()
+            if row is None:
+                return None
+
+            path, size, sha256 = row
+            try:
+                intact = os.path.getsize(path) == size and (not verify_hash or file_sha256(path) == sha256)
+            except OSError:
+                intact = False
+
+            if not intact:
+                conn.execute("DELETE FROM downloads WHERE video_id=?", (video_id,))
+                return None
+
+            conn.execute("UPDATE downloads SET last_used=? WHERE video_id=?", (time.time(), video_id))
+        return path
+
+    def store(self, video_id, path):
+        """
+        Adds a downloaded file to the cache and evicts old entries.
+
+        Args:
+            video_id (str): The video ID.
+            path (str): The path to the downloaded file.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?)",
+                         (video_id, path, os.path.getsize(path), file_sha256(path), now, now))
+        self.evict()
+
+    def evict(self):
+        """
+        Removes entries, and their files, that are too old or exceed the size limit, least recently used first. Files returned by `keep_paths` are kept, and still count towards the size limit.
+        """
+        kept = {os.path.abspath(path) for path in self.keep_paths()} if self.keep_paths is not None else set()
+        with self._connect() as conn:
+            rows = conn.execute("SELECT video_id, path, size, created_at FROM downloads ORDER BY last_used DESC").fetchall()
+            now = time.time()
+            total_bytes = 0
+            for video_id, path, size, created_at in rows:
+                total_bytes += size
+                if (now - created_at <= self.max_age and total_bytes <= self.max_bytes) or os.path.abspath(path) in kept:
+                    continue
+                conn.execute("DELETE FROM downloads WHERE video_id=?", (video_id,))
+                total_bytes -= size
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def file_sha256(path) -> str:
+    """
+    Returns the SHA-256 hash of a file, reading it in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,245 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+PARTIAL_SUFFIX = ".crdownload"
+
+# inotify flags from <sys/inotify.h>.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Files claimed by any watcher in this process, so concurrent downloads into the same directory each get their own file.
+_claimed_paths = set()
+# Finished downloads, with the watchers that were already running when they were released. Those watchers may have seen
+# the file appear, so they never take it; watchers started later may, e.g. for a new download with the same name.
+_released_paths = {}
+_active_watchers = set()
+_claims_lock = threading.Lock()
+
+
+class _InotifyEvents:
+    def __init__(self, directory):
+        """
+        Reports the names of files created in or moved into a directory, using Linux inotify.
+
+        Raises:
+            OSError: If inotify is not available.
+        """
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+    def read(self, timeout) -> list[str]:
+        """
+        Waits up to `timeout` seconds for events and returns the names they refer to.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        names = []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name:
+                names.append(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _DirectoryPoller:
+    def __init__(self, directory):
+        """
+        Reports new files in a directory by polling it, rescanning only when the directory's modification time changes.
+        """
+        self.directory = directory
+        self.mtime = os.stat(directory).st_mtime_ns
+        self.names = {entry.name for entry in os.scandir(directory)}
+
+    def read(self, timeout) -> list[str]:
+        time.sleep(timeout)
+        mtime = os.stat(self.directory).st_mtime_ns
+        if mtime == self.mtime:
+            return []
+        self.mtime = mtime
+        names = {entry.name for entry in os.scandir(self.directory)}
+        new_names = names - self.names
+        self.names = names
+        return list(new_names)
+
+    def close(self):
+        pass
+
+
+class DownloadWatcher:
+    def __init__(self, download_dir, extension=".mp4", stable_seconds=1.0, poll_interval=0.25):
+        """
+        Waits for a browser download into a directory to finish.
+
+        The watcher must be started before the download is triggered. It follows the download's ".crdownload" file until Chrome renames it to the final file, then waits until the file size stops changing. File events come from inotify where available, with a directory poller as the fallback.
+
+        Parameters:
+            download_dir (str): The directory the browser downloads into.
+            extension (str): The extension of the finished file.
+            stable_seconds (float): How long the file size must stay the same before the download counts as complete.
+            poll_interval (float): How often the file size is checked, and how often the directory is polled without inotify.
+        """
+        self.download_dir = download_dir
+        self.extension = extension
+        self.stable_seconds = stable_seconds
+        self.poll_interval = poll_interval
+        self._events = None
+        self._new_names = []
+        self._partial = None
+        self._target = None
+        self._size = None
+        self._size_since = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """
+        Starts watching the download directory.
+        """
+        os.makedirs(self.download_dir, exist_ok=True)
+        with _claims_lock:
+            _active_watchers.add(self)
+        if sys.platform.startswith("linux"):
+            try:
+                self._events = _InotifyEvents(self.download_dir)
+                return
+            except OSError:
+                pass
+        self._events = _DirectoryPoller(self.download_dir)
+
+    def close(self):
+        """
+        Stops watching and releases the claims on the download, so the set of claimed files does not grow in a long-running process.
+        """
+        if self._events is not None:
+            self._events.close()
+            self._events = None
+        with _claims_lock:
+            _active_watchers.discard(self)
+            for path in list(_released_paths):
+                _released_paths[path].discard(self)
+                if len(_released_paths[path]) == 0:
+                    del _released_paths[path]
+            if self._partial is not None:
+                _claimed_paths.discard(self._partial)
+                self._partial = None
+            if self._target is not None:
+                _claimed_paths.discard(self._target)
+                running = {watcher for watcher in _active_watchers if watcher.download_dir == self.download_dir}
+                if running:
+                    _released_paths[self._target] = running
+
+    def wait(self, timeout=300) -> str | None:
+        """
+        Waits for the download to complete.
+
+        Args:
+            timeout (float, optional): The maximum number of seconds to wait. Defaults to 300.
+
+        Returns:
+            str | None: The path to the downloaded file, or None if the download did not complete in time.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for name in self._events.read(min(self.poll_interval, max(0, deadline - time.monotonic()))):
+                if name not in self._new_names:
+                    self._new_names.append(name)
+
+            self._claim()
+            if self._target is not None and self._is_complete():
+                return self._target
+        return None
+
+    def _claim(self):
+        if self._target is not None:
+            return
+
+        with _claims_lock:
+            if self._partial is None:
+                for name in self._new_names:
+                    path = os.path.join(self.download_dir, name)
+                    if name.endswith(PARTIAL_SUFFIX) and not self._is_taken(path) and os.path.exists(path):
+                        _claimed_paths.add(path)
+                        self._partial = path
+                        break
+
+            candidates = []
+            if self._partial is not None:
+                final_path = self._partial[:-len(PARTIAL_SUFFIX)]
+                if not os.path.exists(self._partial) and self._is_taken(final_path):
+                    # Another watcher's download was renamed before this watcher saw it finish, so follow the next one.
+                    _claimed_paths.discard(self._partial)
+                    self._partial = None
+                elif final_path.endswith(self.extension):
+                    candidates = [final_path]
+                elif not os.path.exists(self._partial):
+                    # Chrome used a temporary name ("Unconfirmed 123.crdownload"), so take the next new file.
+                    candidates = [os.path.join(self.download_dir, name) for name in self._new_names]
+            else:
+                # The download may have been renamed before the partial file was seen.
+                candidates = [os.path.join(self.download_dir, name) for name in self._new_names]
+
+            for path in candidates:
+                # Skip files claimed by other watchers, including the final names of their partial downloads.
+                if (path.endswith(self.extension) and not self._is_taken(path)
+                        and (path + PARTIAL_SUFFIX == self._partial or path + PARTIAL_SUFFIX not in _claimed_paths)
+                        and os.path.exists(path)):
+                    _claimed_paths.add(path)
+                    _claimed_paths.discard(self._partial)
+                    self._partial = None
+                    self._target = path
+                    return
+
+    def _is_taken(self, path) -> bool:
+        """
+        Whether another watcher has claimed the file, or it is a finished download this watcher may have seen appear.
+        """
+        return path in _claimed_paths or self in _released_paths.get(path, ())
+
+    def _is_complete(self) -> bool:
+        if os.path.exists(self._target + PARTIAL_SUFFIX):
+            return False
+        try:
+            size = os.path.getsize(self._target)
+        except OSError:
+            return False
+
+        now = time.monotonic()
+        if size != self._size:
+            self._size = size
+            self._size_since = now
+            return False
+        return size > 0 and now - self._size_since >= self.stable_seconds
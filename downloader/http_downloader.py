@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+PART_SUFFIX = ".part"
+PROGRESS_SUFFIX = ".part.json"
+
+
+class HttpDownloader:
+    def __init__(self, chunk_size=1024 * 1024, connections=4, parallel_threshold=16 * 1024 * 1024, timeout=30,
+                 checkpoint_size=8 * 1024 * 1024):
+        """
+        Downloads files over HTTP without a browser.
+
+        Files are streamed to a ".part" file in fixed-size chunks and renamed to their final name only once they are complete, so half-written videos are never picked up. Interrupted downloads are resumed with Range requests. Files larger than `parallel_threshold` are fetched over several connections at once when the server supports ranges.
+
+        Parameters:
+            chunk_size (int): The number of bytes read and written at a time.
+            connections (int): The number of parallel connections for large files.
+            parallel_threshold (int): The file size from which parallel connections are used.
+            timeout (float): The connect and read timeout in seconds.
+            checkpoint_size (int): The number of bytes a parallel connection writes between syncing the file to disk and recording its progress.
+        """
+        self.chunk_size = chunk_size
+        self.connections = max(1, connections)
+        self.parallel_threshold = parallel_threshold
+        self.timeout = timeout
+        self.checkpoint_size = checkpoint_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = "Mozilla/5.0"
+
+    def download(self, url, destination) -> str:
+        """
+        Downloads a file, resuming a previous partial download of the same destination if there is one.
+
+        Args:
+            url (str): The URL of the file.
+            destination (str): The path the file is saved to.
+
+        Returns:
+            str: The path to the downloaded file.
+
+        Raises:
+            requests.RequestException: If the download fails. The partial file is kept so the next attempt can resume it.
+            OSError: If the file cannot be written.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+        part_path = destination + PART_SUFFIX
+
+        size, accepts_ranges = self._probe(url)
+        if (size is not None and accepts_ranges and size >= self.parallel_threshold and self.connections > 1
+                and (not os.path.exists(part_path) or os.path.exists(destination + PROGRESS_SUFFIX))):
+            self._download_parallel(url, part_path, destination + PROGRESS_SUFFIX, size)
+        else:
+            self._download_single(url, part_path, size, accepts_ranges)
+
+        os.replace(part_path, destination)
+        return destination
+
+    def _probe(self, url):
+        response = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+        if response.status_code >= 400:
+            return None, False
+        length = response.headers.get("Content-Length")
+        return (int(length) if length else None), response.headers.get("Accept-Ranges") == "bytes"
+
+    def _download_single(self, url, part_path, size, accepts_ranges):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if size is not None and offset == size:
+            return
+        if size is not None and offset > size:
+            # The part file is from another version of the file, so it is downloaded again.
+            offset = 0
+
+        headers = {"Range": f"bytes={offset}-"} if offset and accepts_ranges else {}
+        response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+        if response.status_code == 416 and headers:
+            # The part file is longer than the remote file, which has changed since, so start over.
+            response.close()
+            response = self.session.get(url, stream=True, timeout=self.timeout)
+        with response:
+            response.raise_for_status()
+            # Start over if the server ignored the range.
+            mode = "ab" if response.status_code == 206 else "wb"
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(self.chunk_size):
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+
+        if size is not None and os.path.getsize(part_path) != size:
+            raise requests.RequestException(f"Incomplete download: expected {size} bytes, got {os.path.getsize(part_path)}")
+
+    def _download_parallel(self, url, part_path, progress_path, size):
+        range_size = -(-size // self.connections)
+        ranges = {start: start for start in range(0, size, range_size)}
+
+        # The progress file records how far each range got, so an interrupted parallel download can be resumed.
+        try:
+            with open(progress_path, encoding="utf-8") as f:
+                saved = json.load(f)
+            saved_ranges = {int(start): offset for start, offset in saved["ranges"].items()}
+            # Progress of another file size or another number of connections does not match the part file.
+            if saved["size"] == size and os.path.getsize(part_path) == size and saved_ranges.keys() == ranges.keys():
+                ranges = saved_ranges
+            else:
+                saved = None
+        except (OSError, ValueError, KeyError, AttributeError):
+            saved = None
+
+        def save_progress():
+            temp_path = progress_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"size": size, "ranges": ranges}, f)
+            os.replace(temp_path, progress_path)
+
+        if saved is None:
+            with open(part_path, "wb") as f:
+                f.truncate(size)
+            save_progress()
+
+        lock = threading.Lock()
+
+        def checkpoint(f, start, written):
+            # The part file was preallocated with zeros, so progress is only recorded for bytes that reached the disk.
+            f.flush()
+            os.fsync(f.fileno())
+            with lock:
+                ranges[start] = written
+                save_progress()
+            return written
+
+        def fetch(start):
+            end = min(start + range_size, size) - 1
+            offset = ranges[start]
+            if offset > end:
+                return
+            headers = {"Range": f"bytes={offset}-{end}"}
+            with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise requests.RequestException("The server ignored the range request.")
+                with open(part_path, "r+b") as f:
+                    f.seek(offset)
+                    written = offset
+                    for chunk in response.iter_content(self.chunk_size):
+                        f.write(chunk)
+                        written += len(chunk)
+                        if written - offset >= self.checkpoint_size:
+                            offset = checkpoint(f, start, written)
+                    offset = checkpoint(f, start, written)
+            if offset != end + 1:
+                raise requests.RequestException(f"Incomplete range {start}-{end}.")
+
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            for future in [executor.submit(fetch, start) for start in ranges]:
+                future.result()
+
+        os.remove(progress_path)
@@ -1,34 +1,36 @@
 import os
-import re
-import time
-from selenium import webdriver
+from urllib.parse import urlsplit
+
+import requests
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+from downloader.download_cache import DownloadCache, validate_tiktok_url
+from downloader.download_watcher import DownloadWatcher
+from downloader.http_downloader import HttpDownloader
+from downloader.webdriver_pool import DOWNLOAD_DIR, create_chrome_driver
 
-def validate_tiktok_url(url) -> bool:
-    """
-    Validates a TikTok video URL.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-    Args:
-        url (str): The URL to be validated.
+# The page used to resolve TikTok URLs to downloads. Can be pointed at a local stand-in for testing.
+TIKDOWNLOADER_URL = os.getenv("TIKDOWNLOADER_URL", "https://tikdownloader.io/en")
 
-    Returns:
-        bool: True if the URL matches the pattern for a TikTok video URL, False otherwise.
-    """
-    # Regular expression pattern for TikTok video URL
-    pattern = r'^https?://(?:www\.)?tiktok\.com/.+'
-    return re.match(pattern, url) is not None
+# Shared by every download in this process.
+download_cache = DownloadCache()
 
-def download_tiktok(video_url) -> str | None:
+def download_tiktok(video_url, pool=None, backend="browser", cache=None) -> str | None:
     """
     Validates a TikTok video URL and downloads the video using a Chrome WebDriver session.
 
+    Downloads are cached by video ID, so URL variants and short links of a video that was already downloaded return the existing file without touching the network.
+
     Args:
         video_url (str): The URL of the TikTok video to be downloaded.
+        pool (WebDriverPool, optional): A pool of warm browser sessions to download with. If not provided, a new Chrome window is launched for this download.
+        backend (str, optional): "browser" to let Chrome save the file, or "http" to only look up the video's media URL in the browser and stream it to disk over HTTP, resuming partial downloads. Defaults to "browser".
+        cache (DownloadCache, optional): The download cache to look the video up in and add it to, e.g. one that keeps the downloads of unfinished jobs. Defaults to a cache without such files.
 
     Returns:
         str | None: The URL of the downloaded video if successful, None otherwise.
@@ -38,76 +40,123 @@ def download_tiktok(video_url) -> str | None:
         print("Invalid TikTok video URL.")
         return
 
-    path_to_extension = BASE_DIR + r"\3.25_0"
-
-    chrome_options = Options()
-    chrome_options.add_argument("load-extension=" + path_to_extension)
-
-    # Set the default download directory.
-    download_dir = BASE_DIR + r"\Downloaded-TikToks"
-    prefs = {"download.default_directory": download_dir}
-    chrome_options.add_experimental_option("prefs", prefs)
-
-    # Launch a browser session.
-    with webdriver.Chrome(options=chrome_options) as driver: # You need to have Chrome WebDriver installed.
-        # Ensure that window size is correct (needed to click the HD download button).
-        driver.set_window_size(1705, 1372)
-        # Open the target URL.
-        driver.get("https://tikdownloader.io/en")
-
-        time.sleep(5)
-
-        driver.get("https://tikdownloader.io/en")
-
-        # Find the input field by ID "s_input" and paste the video URL.
-        input_element = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.ID, "s_input"))
-        )
-        input_element.clear()
-        input_element.send_keys(video_url)
-
-        time.sleep(3)
-
-        # Execute JavaScript to click the download button.
-        driver.execute_script("ksearchvideo();")
+    if cache is None:
+        cache = download_cache
+    video_id = cache.resolve_video_id(video_url)
+    if video_id is not None:
+        cached_tiktok = cache.lookup(video_id)
+        if cached_tiktok is not None:
+            print("Video found in the download cache.")
+            return cached_tiktok
+
+    if backend not in ["browser", "http"]:
+        print(f"Unknown download backend: {backend}")
+        return None
+
+    try:
+        if pool is not None:
+            with pool.session() as session:
+                if backend == "http":
+                    media_url = find_media_url(session.driver, video_url)
+                else:
+                    downloaded_path = download_with_driver(session.driver, video_url, session.download_dir)
+        else:
+            # Launch a browser session.
+            with create_chrome_driver(DOWNLOAD_DIR, headless=backend == "http") as driver:
+                if backend == "http":
+                    media_url = find_media_url(driver, video_url)
+                else:
+                    downloaded_path = download_with_driver(driver, video_url, DOWNLOAD_DIR)
+    except TimeoutException:
+        print("The video was not found on the download page in time.")
+        return None
+
+    if backend == "http":
+        # The browser is released before the file itself is transferred.
+        file_name = f"{video_id}.mp4" if video_id is not None else os.path.basename(urlsplit(media_url).path) or "video.mp4"
+        try:
+            downloaded_path = HttpDownloader().download(media_url, os.path.join(DOWNLOAD_DIR, file_name))
+        except (requests.RequestException, OSError) as e:
+            print(f"An error occurred: {e}")
+            downloaded_path = None
+
+    if downloaded_path is not None:
+        print("Download completed successfully.")
+        if video_id is not None:
+            cache.store(video_id, downloaded_path)
+        return downloaded_path
+    else:
+        print("Download did not complete within the specified timeout period.")
+        return None
+
+
+def download_with_driver(driver, video_url, download_dir, timeout=300) -> str | None:
+    """
+    Downloads a TikTok video through tikdownloader.io in an existing browser session.
 
-        time.sleep(3)
+    Args:
+        driver (webdriver.Chrome): The browser session. Its downloads must be saved to `download_dir`.
+        video_url (str): The URL of the TikTok video.
+        download_dir (str): The directory the browser saves downloads to.
+        timeout (float, optional): The maximum number of seconds to wait for the download. Defaults to 300.
 
-        # Wait for the new page to load after the button click.
-        WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.ID, "search-result"))
-        )
+    Returns:
+        str | None: The path to the downloaded video, or None if the download did not complete in time.
+    """
+    open_search_result(driver, video_url)
 
+    # Watch the download directory before starting the download, so the new file is not missed.
+    with DownloadWatcher(download_dir) as watcher:
         # Execute JavaScript to simulate a click at specific coordinates (e.g., x=1200, y=225).
         driver.execute_script("document.elementFromPoint(1200, 225).click();")
 
         # Wait for the download to complete.
-        download_complete = False
-        timeout = 300  # Timeout in seconds.
-        start_time = time.time()
+        return watcher.wait(timeout=timeout)
 
-        # Get the initial list of files in the download directory.
-        initial_files = os.listdir(download_dir)
 
-        while not download_complete and time.time() - start_time < timeout:
-            # Wait for a short duration before checking again.
-            time.sleep(5)
+def find_media_url(driver, video_url) -> str:
+    """
+    Looks up the direct media URL of a TikTok video on tikdownloader.io without downloading it.
 
-            # Get the current list of files in the download directory.
-            current_files = os.listdir(download_dir)
+    Args:
+        driver (webdriver.Chrome): The browser session.
+        video_url (str): The URL of the TikTok video.
 
-            # Check if any new MP4 file has been added since the start of the download.
-            new_files = [file for file in current_files if file not in initial_files]
-            if any(file.endswith(".mp4") for file in new_files):
-                download_complete = True
+    Returns:
+        str: The URL of the video file.
+    """
+    open_search_result(driver, video_url)
+    # The coordinates of the HD download button used by download_with_driver.
+    return driver.execute_script(
+        "var link = document.elementFromPoint(1200, 225);"
+        "link = link && link.closest('a');"
+        "return link ? link.href : document.querySelector('#search-result a').href;")
+
+
+def open_search_result(driver, video_url):
+    """
+    Searches for a TikTok video on tikdownloader.io and waits until its download links are shown.
+    """
+    # Open the target URL. The first load can be interrupted by the extension, so reload once if the page is not usable.
+    driver.get(TIKDOWNLOADER_URL)
+    try:
+        input_element = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, "s_input")))
+    except TimeoutException:
+        driver.get(TIKDOWNLOADER_URL)
+        input_element = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, "s_input")))
+
+    # Paste the video URL into the input field with ID "s_input".
+    input_element.clear()
+    input_element.send_keys(video_url)
+    WebDriverWait(driver, 10).until(lambda d: input_element.get_attribute("value") == video_url)
+
+    # Execute JavaScript to click the download button.
+    driver.execute_script("ksearchvideo();")
+
+    # Wait for the search result, including its download links, to be shown.
+    WebDriverWait(driver, 20).until(EC.visibility_of_element_located((By.ID, "search-result")))
+    WebDriverWait(driver, 20).until(EC.visibility_of_element_located((By.CSS_SELECTOR, "#search-result a")))
 
-        if download_complete:
-            downloaded_tiktok = [file for file in new_files if file.endswith(".mp4")]
-            print("Download completed successfully.")
-            return os.path.join(download_dir, downloaded_tiktok[0])
-        else:
-            print("Download did not complete within the specified timeout period.")
-            return None
 
 if __name__ == "__main__":
     video_url = input("TikTok Video URL: ")
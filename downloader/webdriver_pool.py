@@ -0,0 +1,193 @@
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import (ElementClickInterceptedException, ElementNotInteractableException, JavascriptException,
+                                        NoSuchElementException, StaleElementReferenceException, TimeoutException,
+                                        WebDriverException)
+from selenium.webdriver.chrome.options import Options
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXTENSION_PATH = os.path.join(BASE_DIR, "3.25_0")
+DOWNLOAD_DIR = os.path.join(BASE_DIR, "Downloaded-TikToks")
+
+# The window size the download button coordinates in download_tiktok are based on.
+WINDOW_SIZE = (1705, 1372)
+
+# Errors caused by the page rather than the browser, e.g. a slow page. The session is still usable after them.
+PAGE_ERRORS = (TimeoutException, NoSuchElementException, StaleElementReferenceException, ElementNotInteractableException,
+               ElementClickInterceptedException, JavascriptException)
+
+
+def create_chrome_driver(download_dir, headless=False, extension_path=EXTENSION_PATH):
+    """
+    Launches Chrome with the downloader extension, saving downloads to the given directory.
+
+    Args:
+        download_dir (str): The directory downloads are saved to.
+        headless (bool, optional): Whether to run Chrome without a window. Defaults to False.
+        extension_path (str, optional): The unpacked extension to load, or None for no extension.
+
+    Returns:
+        webdriver.Chrome: The browser session.
+    """
+    chrome_options = Options()
+    if extension_path:
+        chrome_options.add_argument("load-extension=" + extension_path)
+    if headless:
+        chrome_options.add_argument("--headless=new")
+    chrome_options.add_argument(f"--window-size={WINDOW_SIZE[0]},{WINDOW_SIZE[1]}")
+
+    # Set the default download directory.
+    os.makedirs(download_dir, exist_ok=True)
+    prefs = {"download.default_directory": download_dir, "download.prompt_for_download": False}
+    chrome_options.add_experimental_option("prefs", prefs)
+
+    driver = webdriver.Chrome(options=chrome_options) # You need to have Chrome WebDriver installed.
+    # Ensure that window size is correct (needed to click the HD download button).
+    driver.set_window_size(*WINDOW_SIZE)
+    if headless:
+        # Headless Chrome ignores the download preferences unless downloads are allowed explicitly.
+        driver.execute_cdp_cmd("Page.setDownloadBehavior", {"behavior": "allow", "downloadPath": download_dir})
+    return driver
+
+
+class PooledSession:
+    def __init__(self, driver, download_dir):
+        """
+        A browser session handed out by a WebDriverPool, with its own download directory.
+        """
+        self.driver = driver
+        self.download_dir = download_dir
+        self.uses = 0
+
+
+class WebDriverPool:
+    def __init__(self, size=2, max_uses=25, headless=True, download_dir=DOWNLOAD_DIR, driver_factory=create_chrome_driver):
+        """
+        Keeps warm Chrome sessions and hands them out to concurrent downloads.
+
+        Each session downloads into its own subdirectory, so concurrent downloads never see each other's files. A session is health-checked before it is handed out, and it is replaced after `max_uses` downloads or when it crashes. Page errors such as timeouts leave the session in the pool.
+
+        Parameters:
+            size (int): The maximum number of sessions.
+            max_uses (int): The number of downloads after which a session is restarted.
+            headless (bool): Whether the sessions run without a window.
+            download_dir (str): The directory holding the per-session download directories.
+            driver_factory (callable): A function taking (download_dir, headless) that launches a browser session.
+        """
+        self.size = size
+        self.max_uses = max_uses
+        self.headless = headless
+        self.download_dir = download_dir
+        self.driver_factory = driver_factory
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._free_dirs = queue.Queue()
+        for index in range(size):
+            self._free_dirs.put(os.path.join(download_dir, f"session-{index}"))
+        self._closed = False
+
+    def warm_up(self):
+        """
+        Starts every session ahead of the first download.
+        """
+        sessions = []
+        for _ in range(self.size):
+            self._slots.acquire()
+            sessions.append(self._start_session())
+        for session in sessions:
+            self._release(session)
+
+    @contextmanager
+    def session(self, timeout=None):
+        """
+        Borrows a healthy session for the duration of a `with` block.
+
+        Args:
+            timeout (float, optional): The maximum number of seconds to wait for a free session. Defaults to waiting forever.
+
+        Yields:
+            PooledSession: The session.
+
+        Raises:
+            TimeoutError: If no session becomes free in time.
+            RuntimeError: If the pool has been closed.
+        """
+        if self._closed:
+            raise RuntimeError("The WebDriver pool is closed.")
+        if not self._slots.acquire(timeout=timeout if timeout is not None else -1):
+            raise TimeoutError("No browser session became available.")
+
+        session = None
+        try:
+            session = self._checkout()
+            yield session
+        except WebDriverException as e:
+            if not isinstance(e, PAGE_ERRORS):
+                # The browser may have crashed, so do not reuse it.
+                self._discard(session)
+                session = None
+            raise
+        finally:
+            if session is not None:
+                session.uses += 1
+                if session.uses >= self.max_uses or self._closed:
+                    self._discard(session)
+                else:
+                    self._idle.put(session)
+            self._slots.release()
+
+    def close(self):
+        """
+        Quits every idle session. Sessions in use are quit when they are returned.
+        """
+        self._closed = True
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(session)
+
+    def _checkout(self) -> PooledSession:
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                return self._start_session()
+            if self._is_healthy(session):
+                return session
+            self._discard(session)
+
+    def _start_session(self) -> PooledSession:
+        download_dir = self._free_dirs.get_nowait()
+        try:
+            driver = self.driver_factory(download_dir, self.headless)
+        except Exception:
+            self._free_dirs.put(download_dir)
+            raise
+        return PooledSession(driver, download_dir)
+
+    def _release(self, session):
+        self._idle.put(session)
+        self._slots.release()
+
+    def _discard(self, session):
+        if session is None:
+            return
+        try:
+            session.driver.quit()
+        except WebDriverException:
+            pass
+        self._free_dirs.put(session.download_dir)
+
+    @staticmethod
+    def _is_healthy(session) -> bool:
+        try:
+            session.driver.execute_script("return 1;")
+            return True
+        except WebDriverException:
+            return False
@@ -0,0 +1,244 @@
+import os
+import subprocess
+from dataclasses import dataclass
+
+from moviepy.config import get_setting
+
+from editor.encoder_profiles import DEFAULT_PROFILE, probe_source, resolve_encoder_settings
+from editor.frame_padder import frame_offset, padded_size
+from editor.watermark_cache import watermark_cache
+from editor.watermark_renderer import watermark_position
+
+# Videos longer than this are trimmed to MAX_DURATION seconds, like in add_watermark_to_video.
+DURATION_LIMIT = 60
+MAX_DURATION = 59.9
+
+
+@dataclass
+class EditPlan:
+    """
+    A declarative description of the edits applied to one video.
+
+    All positions and sizes are in pixels of the source video, so a backend only has to translate them.
+    """
+    input_video: str
+    output_video: str
+    source_size: tuple[int, int]
+    duration: float | None = None
+    source_duration: float | None = None
+    watermark_image: str | None = None
+    watermark_position: tuple[int, int] = (0, 0)
+    padded_size: tuple[int, int] | None = None
+    has_audio: bool = True
+    audio_codec: str = "copy"
+    audio_bitrate: int = 128
+    video_codec: str = "libx264"
+    preset: str = "medium"
+    crf: int | None = None
+    max_bitrate: int | None = None
+    threads: int = 0
+    scaled_size: tuple[int, int] | None = None
+    encoder_profile: str | None = None
+
+    @property
+    def output_size(self) -> tuple[int, int]:
+        """
+        The size of the edited frames, before they are scaled to `scaled_size`.
+        """
+        return self.padded_size or self.source_size
+
+    @property
+    def output_duration(self) -> float | None:
+        return self.duration if self.duration is not None else self.source_duration
+
+    @property
+    def frame_offset(self) -> tuple[int, int]:
+        """
+        The position of the source frame inside the padded frame.
+        """
+        return frame_offset(self.source_size, self.output_size)
+
+
+def build_edit_plan(input_video, output_video, watermark_text="Watermark", position="top", margin=20, aspect_ratio="1:1",
+                    font="Kalam", font_color="blue2", profile=DEFAULT_PROFILE, platforms=None, concurrent_encodes=1) -> EditPlan:
+    """
+    Probes a video and describes how `add_watermark_to_video` edits and encodes it.
+
+    The watermark is taken from the shared watermark cache, so it is only rendered once per text and size. The encoder settings come from the encoder profile, adapted to the source, the target platforms and the CPU cores.
+
+    Args:
+        input_video (str): The path to the input video file.
+        output_video (str): The path to the output video file.
+        watermark_text (str, optional): The watermark text, or None for no watermark. Defaults to "Watermark".
+        position (str, optional): "top" or "bottom". Defaults to "top".
+        margin (int, optional): The margin between the watermark and the top or bottom edge. Defaults to 20.
+        aspect_ratio (str, optional): The aspect ratio landscape videos are letterboxed to. Defaults to "1:1".
+        font (str, optional): The watermark font. Defaults to "Kalam".
+        font_color (str, optional): The watermark color. Defaults to "blue2".
+        profile (str, optional): The encoder profile: "fast-draft", "balanced" or "archive". Defaults to "balanced".
+        platforms (list[str], optional): The platforms the video is uploaded to, whose size and bitrate limits apply.
+        concurrent_encodes (int, optional): How many videos are encoded at the same time, sharing the CPU cores. Defaults to 1.
+
+    Returns:
+        EditPlan: The plan for the video.
+    """
+    source = probe_source(input_video)
+    source_size = source.size
+    duration = MAX_DURATION if source.duration > DURATION_LIMIT else None
+
+    plan = EditPlan(input_video, output_video, source_size, duration=duration, source_duration=source.duration,
+                    has_audio=source.has_audio)
+
+    if watermark_text:
+        font_size = min(source_size) / 10
+        _, alpha = watermark_cache.get(watermark_text, font, font_size, font_color)
+        plan.watermark_image = watermark_cache.path(watermark_text, font, font_size, font_color)
+        plan.watermark_position = watermark_position(source_size, alpha.shape, position, margin, font_size)
+
+    size = padded_size(source_size, aspect_ratio)
+    if size != source_size:
+        plan.padded_size = size
+
+    settings = resolve_encoder_settings(profile, source, plan.output_size, platforms, concurrent_encodes=concurrent_encodes)
+    plan.encoder_profile = settings.profile
+    plan.preset = settings.preset
+    plan.crf = settings.crf
+    plan.max_bitrate = settings.max_bitrate
+    plan.threads = settings.threads
+    plan.scaled_size = settings.scaled_size
+    plan.audio_codec = settings.audio_codec
+    plan.audio_bitrate = settings.audio_bitrate
+
+    return plan
+
+
+class FFmpegBackend:
+    def __init__(self, ffmpeg_binary=None):
+        """
+        Renders edit plans with a single ffmpeg invocation, so the frames never pass through Python.
+
+        Parameters:
+            ffmpeg_binary (str, optional): The ffmpeg executable. Defaults to the one MoviePy uses.
+        """
+        self.ffmpeg_binary = ffmpeg_binary or get_setting("FFMPEG_BINARY")
+
+    def compile(self, plan: EditPlan) -> list[str]:
+        """
+        Translates an edit plan into ffmpeg command line arguments.
+
+        Parameters:
+            plan (EditPlan): The plan to translate.
+
+        Returns:
+            list[str]: The ffmpeg command.
+        """
+        command = [self.ffmpeg_binary, "-y", "-loglevel", "error"]
+        if plan.duration is not None:
+            # Trimming the input means the rest of the video is never decoded.
+            command += ["-t", f"{plan.duration:.3f}"]
+        command += ["-i", plan.input_video]
+        if plan.watermark_image is not None:
+            command += ["-i", plan.watermark_image]
+
+        filters = []
+        video_label = "0:v"
+        if plan.watermark_image is not None:
+            x, y = plan.watermark_position
+            filters.append(f"[{video_label}][1:v]overlay=x={x}:y={y}[watermarked]")
+            video_label = "watermarked"
+        if plan.padded_size is not None:
+            width, height = plan.padded_size
+            x, y = plan.frame_offset
+            filters.append(f"[{video_label}]pad={width}:{height}:{x}:{y}:black[padded]")
+            video_label = "padded"
+        if plan.scaled_size is not None:
+            width, height = plan.scaled_size
+            filters.append(f"[{video_label}]scale={width}:{height}[scaled]")
+            video_label = "scaled"
+
+        if filters:
+            command += ["-filter_complex", ";".join(filters), "-map", f"[{video_label}]"]
+        else:
+            command += ["-map", "0:v:0"]
+
+        command += ["-c:v", plan.video_codec, "-preset", plan.preset, "-pix_fmt", "yuv420p"]
+        if plan.crf is not None:
+            command += ["-crf", str(plan.crf)]
+        if plan.max_bitrate is not None:
+            command += ["-maxrate", f"{plan.max_bitrate}k", "-bufsize", f"{plan.max_bitrate * 2}k"]
+        if plan.threads:
+            command += ["-threads", str(plan.threads)]
+
+        if plan.has_audio:
+            command += ["-map", "0:a:0?"] + self.audio_arguments(plan)
+        else:
+            command += ["-an"]
+
+        command += ["-movflags", "+faststart", plan.output_video]
+        return command
+
+    def render(self, plan: EditPlan) -> str:
+        """
+        Renders an edit plan.
+
+        Parameters:
+            plan (EditPlan): The plan to render.
+
+        Returns:
+            str: The path to the output video file.
+
+        Raises:
+            RuntimeError: If ffmpeg fails.
+        """
+        output_dir = os.path.dirname(plan.output_video)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        self.run(self.compile(plan))
+        return plan.output_video
+
+    @staticmethod
+    def audio_arguments(plan: EditPlan) -> list[str]:
+        """
+        Returns the ffmpeg arguments that copy or encode the audio of a plan.
+        """
+        if plan.audio_codec == "copy":
+            return ["-c:a", "copy"]
+        return ["-c:a", plan.audio_codec, "-b:a", f"{plan.audio_bitrate}k"]
+
+    def mux_audio(self, video_path, audio_source, output_video, duration=None, audio_arguments=("-c:a", "copy")) -> str:
+        """
+        Combines the video stream of one file with the audio stream of another, without re-encoding the video.
+
+        Args:
+            video_path (str): The file the video is taken from.
+            audio_source (str): The file the audio is taken from.
+            output_video (str): The path to the output video file.
+            duration (float, optional): How many seconds of the audio source to use. Defaults to all of it.
+            audio_arguments (list[str], optional): The ffmpeg audio codec arguments. Defaults to copying the audio.
+
+        Returns:
+            str: The path to the output video file.
+
+        Raises:
+            RuntimeError: If ffmpeg fails.
+        """
+        command = [self.ffmpeg_binary, "-y", "-loglevel", "error", "-i", video_path]
+        if duration is not None:
+            command += ["-t", f"{duration:.3f}"]
+        command += ["-i", audio_source, "-map", "0:v:0", "-map", "1:a:0?", "-c:v", "copy", *audio_arguments,
+                    "-movflags", "+faststart", output_video]
+        self.run(command)
+        return output_video
+
+    @staticmethod
+    def run(command):
+        """
+        Runs an ffmpeg command.
+
+        Raises:
+            RuntimeError: If ffmpeg fails.
+        """
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
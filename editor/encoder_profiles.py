@@ -0,0 +1,185 @@
+import os
+import re
+import subprocess
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    """
+    A named trade-off between encoding speed, quality and file size.
+
+    `max_short_side` caps the smaller dimension of the output and `max_bitrate` (kbit/s) caps the video bitrate of the CRF encode; None means no cap. `max_threads` is the most encoder threads worth giving one encode.
+    """
+    name: str
+    preset: str
+    crf: int
+    max_short_side: int | None
+    max_bitrate: int | None
+    max_threads: int
+    audio_bitrate: int = 128
+
+
+PROFILES = {
+    "fast-draft": EncoderProfile("fast-draft", preset="veryfast", crf=28, max_short_side=720, max_bitrate=2500, max_threads=8),
+    "balanced": EncoderProfile("balanced", preset="medium", crf=23, max_short_side=1080, max_bitrate=8000, max_threads=16),
+    "archive": EncoderProfile("archive", preset="slow", crf=18, max_short_side=None, max_bitrate=None, max_threads=16, audio_bitrate=192),
+}
+DEFAULT_PROFILE = "balanced"
+
+# What the target platforms accept for Shorts-style videos. A single encode for several platforms gets the strictest limits;
+# see separate_encode_platforms for the platforms that are worth an encode of their own.
+PLATFORM_LIMITS = {
+    "youtube": {"max_short_side": 1080, "max_bitrate": 12000},
+    "tiktok": {"max_short_side": 1080, "max_bitrate": 6000},
+}
+
+# Audio codecs that can be copied into an MP4 file for upload without re-encoding.
+COPYABLE_AUDIO_CODECS = ["aac", "mp3"]
+
+
+@dataclass
+class SourceInfo:
+    """
+    The properties of a source video that encoder settings depend on.
+    """
+    size: tuple[int, int]
+    fps: float
+    duration: float
+    has_audio: bool
+    audio_codec: str | None
+    bitrate: int | None
+
+
+@dataclass
+class EncoderSettings:
+    """
+    Concrete encoder options for one video, resolved from an EncoderProfile.
+    """
+    profile: str
+    preset: str
+    crf: int
+    threads: int
+    scaled_size: tuple[int, int] | None
+    max_bitrate: int | None
+    audio_codec: str
+    audio_bitrate: int
+
+    def rate_control_arguments(self) -> list[str]:
+        """
+        Returns the ffmpeg arguments for the quality and bitrate of the video encoder.
+        """
+        arguments = ["-crf", str(self.crf)]
+        if self.max_bitrate is not None:
+            arguments += ["-maxrate", f"{self.max_bitrate}k", "-bufsize", f"{self.max_bitrate * 2}k"]
+        return arguments
+
+    def audio_arguments(self) -> list[str]:
+        """
+        Returns the ffmpeg arguments for the audio encoder.
+        """
+        if self.audio_codec == "copy":
+            return ["-c:a", "copy"]
+        return ["-c:a", self.audio_codec, "-b:a", f"{self.audio_bitrate}k"]
+
+
+def probe_source(video_path) -> SourceInfo:
+    """
+    Probes the size, frame rate, duration, audio codec and overall bitrate of a video.
+    """
+    # MoviePy is imported here, so reading the profiles (e.g. to validate a job) does not load it.
+    from moviepy.config import get_setting
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    infos = ffmpeg_parse_infos(video_path)
+    # MoviePy's probe does not report codecs or bitrates, so read them from ffmpeg's stream summary.
+    result = subprocess.run([get_setting("FFMPEG_BINARY"), "-hide_banner", "-i", video_path],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    summary = result.stderr.decode(errors="replace")
+    audio_match = re.search(r"Stream #.*?Audio: (\w+)", summary)
+    bitrate_match = re.search(r"bitrate: (\d+) kb/s", summary)
+    return SourceInfo(tuple(infos["video_size"]), infos.get("video_fps") or 30.0, infos["duration"], infos["audio_found"],
+                      audio_match.group(1) if audio_match else None,
+                      int(bitrate_match.group(1)) if bitrate_match else None)
+
+
+def resolve_encoder_settings(profile=DEFAULT_PROFILE, source=None, output_size=None, platforms=None, cpu_count=None,
+                             concurrent_encodes=1) -> EncoderSettings:
+    """
+    Chooses encoder settings for a video from a profile, the target platforms and the machine.
+
+    The threads are the CPU cores shared by the encodes that run at the same time, up to the profile's maximum. The output is scaled down, never up, so its short side fits the profile's and the platforms' caps, and its bitrate is capped by them and by the source's bitrate. The audio stream is copied when its codec can go into an MP4 file as it is.
+
+    Args:
+        profile (str | EncoderProfile, optional): The profile or its name: "fast-draft", "balanced" or "archive". Defaults to "balanced".
+        source (SourceInfo, optional): The probed source video. Without it the audio is re-encoded.
+        output_size (tuple[int, int], optional): The size of the frames given to the encoder, after padding. Defaults to the source size.
+        platforms (str | list[str], optional): The platforms the video is uploaded to, e.g. ["tiktok", "youtube"].
+        cpu_count (int, optional): The number of CPU cores. Defaults to the detected number.
+        concurrent_encodes (int, optional): How many videos are encoded at the same time. Defaults to 1.
+
+    Returns:
+        EncoderSettings: The settings.
+
+    Raises:
+        ValueError: If the profile or a platform is unknown.
+    """
+    if isinstance(profile, str):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown encoder profile: {profile}")
+        profile = PROFILES[profile]
+    if isinstance(platforms, str):
+        platforms = [platforms]
+
+    limits = [(profile.max_short_side, profile.max_bitrate)]
+    for platform in platforms or []:
+        if platform not in PLATFORM_LIMITS:
+            raise ValueError(f"Unknown platform: {platform}")
+        limits.append((PLATFORM_LIMITS[platform]["max_short_side"], PLATFORM_LIMITS[platform]["max_bitrate"]))
+    max_short_side = min((short_side for short_side, _ in limits if short_side is not None), default=None)
+    max_bitrate = min((bitrate for _, bitrate in limits if bitrate is not None), default=None)
+    if max_bitrate is not None and source is not None and source.bitrate:
+        # A re-encode never needs more bits than the source had.
+        max_bitrate = min(max_bitrate, source.bitrate)
+
+    cpu_count = cpu_count or os.cpu_count() or 1
+    threads = max(1, min(profile.max_threads, cpu_count // max(1, concurrent_encodes)))
+
+    size = output_size or (source.size if source is not None else None)
+    scaled_size = None
+    if size is not None and max_short_side is not None and min(size) > max_short_side:
+        scale = max_short_side / min(size)
+        scaled_size = tuple(max(2, round(side * scale / 2) * 2) for side in size)
+
+    copy_audio = source is not None and source.audio_codec in COPYABLE_AUDIO_CODECS
+    return EncoderSettings(profile.name, profile.preset, profile.crf, threads, scaled_size, max_bitrate,
+                           "copy" if copy_audio else "aac", profile.audio_bitrate)
+
+
+def separate_encode_platforms(profile=DEFAULT_PROFILE, platforms=None, source=None, output_size=None) -> list[str]:
+    """
+    Returns the platforms that would get a larger or higher-bitrate video from an encode of their own than from one encode meeting the limits of all `platforms`.
+
+    A platform only gets a better video if the profile and the source leave room above the strictest limits, so e.g. the "fast-draft" profile or a low-bitrate source never need a second encode.
+
+    Args:
+        profile (str | EncoderProfile, optional): The profile or its name. Defaults to "balanced".
+        platforms (list[str], optional): The platforms the video is uploaded to.
+        source (SourceInfo, optional): The probed source video.
+        output_size (tuple[int, int], optional): The size of the frames given to the encoder, after padding. Defaults to the source size.
+
+    Returns:
+        list[str]: The platforms, in the order of `platforms`.
+
+    Raises:
+        ValueError: If the profile or a platform is unknown.
+    """
+    if isinstance(platforms, str):
+        platforms = [platforms]
+    shared = resolve_encoder_settings(profile, source, output_size, platforms)
+    separate = []
+    for platform in platforms or []:
+        own = resolve_encoder_settings(profile, source, output_size, [platform])
+        if (own.scaled_size, own.max_bitrate) != (shared.scaled_size, shared.max_bitrate):
+            separate.append(platform)
+    return separate
@@ -0,0 +1,108 @@
+import math
+
+import numpy as np
+
+
+def parse_aspect_ratio(aspect_ratio) -> tuple[int, int]:
+    """
+    Parses an aspect ratio such as "9:16" or "1:1".
+
+    Args:
+        aspect_ratio (str | tuple[int, int]): The aspect ratio as "width:height" or a (width, height) tuple.
+
+    Returns:
+        tuple[int, int]: The (width, height) of the aspect ratio.
+
+    Raises:
+        ValueError: If the aspect ratio is not valid.
+    """
+    if isinstance(aspect_ratio, str):
+        parts = aspect_ratio.split(":")
+        if len(parts) != 2:
+            raise ValueError(f"Invalid aspect ratio: {aspect_ratio}")
+        aspect_ratio = parts
+    try:
+        width, height = (int(value) for value in aspect_ratio)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid aspect ratio: {aspect_ratio}") from None
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Invalid aspect ratio: {aspect_ratio}")
+    return width, height
+
+
+def padded_size(frame_size, aspect_ratio="1:1") -> tuple[int, int]:
+    """
+    Calculates the size of a frame after adding black bars above and below it.
+
+    Only frames that are wider than the target aspect ratio are padded; narrower frames keep their size. The padded height is rounded up to an even number, as required by H.264 with 4:2:0 chroma.
+
+    Args:
+        frame_size (tuple[int, int]): The (width, height) of the frame.
+        aspect_ratio (str | tuple[int, int], optional): The target aspect ratio. Defaults to "1:1".
+
+    Returns:
+        tuple[int, int]: The (width, height) of the padded frame.
+    """
+    width, height = frame_size
+    ratio_width, ratio_height = parse_aspect_ratio(aspect_ratio)
+    if width * ratio_height <= height * ratio_width:
+        return width, height
+    target_height = math.ceil(width * ratio_height / ratio_width)
+    return width, target_height + target_height % 2
+
+
+def frame_offset(frame_size, canvas_size) -> tuple[int, int]:
+    """
+    Calculates where a frame is placed when it is centered in a padded canvas.
+
+    The offset is rounded down to even numbers so it falls on a 4:2:0 chroma sample, which is where ffmpeg's pad filter puts it too.
+
+    Args:
+        frame_size (tuple[int, int]): The (width, height) of the frame.
+        canvas_size (tuple[int, int]): The (width, height) of the padded canvas.
+
+    Returns:
+        tuple[int, int]: The (x, y) position of the frame in the canvas.
+    """
+    x = (canvas_size[0] - frame_size[0]) // 2
+    y = (canvas_size[1] - frame_size[1]) // 2
+    return x - x % 2, y - y % 2
+
+
+class FramePadder:
+    def __init__(self, frame_size, aspect_ratio="1:1", watermark=None):
+        """
+        Letterboxes frames by copying them into the middle of a reused black canvas.
+
+        The canvas is allocated once, so padding a frame costs a single copy. If a WatermarkRenderer is given, the watermark is blended into the copied frame in the same step.
+
+        Parameters:
+            frame_size (tuple[int, int]): The (width, height) of the input frames.
+            aspect_ratio (str | tuple[int, int]): The target aspect ratio, e.g. "9:16" or "1:1".
+            watermark (WatermarkRenderer, optional): The watermark to blend into each frame, positioned relative to the input frame.
+        """
+        width, height = frame_size
+        canvas_width, canvas_height = padded_size(frame_size, aspect_ratio)
+        self.size = (canvas_width, canvas_height)
+        self.watermark = watermark
+
+        x, y = frame_offset(frame_size, self.size)
+        self.canvas = np.zeros((canvas_height, canvas_width, 3), dtype=np.uint8)
+        self.frame_area = self.canvas[y:y + height, x:x + width]
+
+    def apply(self, frame):
+        """
+        Returns the padded (and watermarked) frame.
+
+        The returned array is the padder's canvas, which is overwritten by the next call.
+
+        Parameters:
+            frame (numpy.ndarray): A (height, width, 3) uint8 frame. It is not modified.
+
+        Returns:
+            numpy.ndarray: The padded frame.
+        """
+        np.copyto(self.frame_area, frame)
+        if self.watermark is not None:
+            self.watermark.blend_into(self.frame_area)
+        return self.canvas
@@ -0,0 +1,202 @@
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+from moviepy.editor import VideoFileClip
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+from editor.edit_plan import DURATION_LIMIT, MAX_DURATION, FFmpegBackend
+from editor.encoder_profiles import DEFAULT_PROFILE, probe_source, resolve_encoder_settings
+from editor.frame_padder import FramePadder
+from editor.watermark_renderer import WatermarkRenderer
+
+# How many decoded frames each variant may fall behind the decoder before the decoder waits for it.
+QUEUE_FRAMES = 8
+
+
+@dataclass
+class Variant:
+    """
+    One edited version of a video: its watermark, letterboxing and output file, and optionally the platforms it is encoded for.
+    """
+    output_video: str
+    watermark_text: str | None = "Watermark"
+    position: str = "top"
+    margin: int = 20
+    aspect_ratio: str = "1:1"
+    # The platforms whose limits apply to this version, instead of the ones given to render_variants.
+    platforms: list[str] | None = None
+
+
+@dataclass
+class VariantTiming:
+    """
+    Where the time of one variant went during a multi-variant render.
+
+    `wall_seconds` runs from the start of the render until the variant's file is complete. `blend_seconds` is spent watermarking and padding frames, `write_seconds` waiting for the variant's encoder to accept them and `mux_seconds` adding the audio.
+    """
+    output_video: str
+    frames: int = 0
+    wall_seconds: float = 0.0
+    blend_seconds: float = 0.0
+    write_seconds: float = 0.0
+    mux_seconds: float = 0.0
+    error: str | None = None
+
+
+@dataclass
+class MultiVariantReport:
+    """
+    The timings of a multi-variant render. The source is decoded once, in `decode_seconds`, for all variants.
+    """
+    input_video: str
+    decode_seconds: float
+    wall_seconds: float
+    variants: list[VariantTiming]
+
+
+class _VariantEncoder:
+    def __init__(self, variant, source, settings, fps, font, font_color, video_only):
+        """
+        Watermarks, pads and encodes the frames of one variant on its own thread, with its own ffmpeg encoder.
+        """
+        self.variant = variant
+        self.settings = settings
+        self.video_only = video_only
+        self.timing = VariantTiming(variant.output_video)
+        self.frames = queue.Queue(maxsize=QUEUE_FRAMES)
+
+        renderer = None
+        if variant.watermark_text:
+            font_size = min(source.size) / 10
+            renderer = WatermarkRenderer.from_text(variant.watermark_text, font_size, font_color, font, source.size,
+                                                   variant.position, variant.margin)
+        self.padder = FramePadder(source.size, variant.aspect_ratio, watermark=renderer)
+
+        ffmpeg_params = settings.rate_control_arguments()
+        if settings.scaled_size is not None:
+            ffmpeg_params += ["-vf", "scale={}:{}".format(*settings.scaled_size)]
+        output_dir = os.path.dirname(variant.output_video)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        self.writer = FFMPEG_VideoWriter(video_only, self.padder.size, fps, codec="libx264", preset=settings.preset,
+                                         threads=settings.threads, ffmpeg_params=ffmpeg_params)
+        self.thread = threading.Thread(target=self._run, name=f"variant-{os.path.basename(variant.output_video)}",
+                                       daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            if self.timing.error is not None:
+                # Keep draining, so the decoder never blocks on a variant that failed.
+                continue
+            try:
+                start_time = time.perf_counter()
+                padded = self.padder.apply(frame)
+                blended_time = time.perf_counter()
+                self.writer.write_frame(padded)
+                self.timing.blend_seconds += blended_time - start_time
+                self.timing.write_seconds += time.perf_counter() - blended_time
+                self.timing.frames += 1
+            except Exception as e:
+                self.timing.error = str(e)
+
+    def finish(self, input_video, duration, has_audio, backend, start_time):
+        """
+        Waits for the encoder to finish and adds the source's audio.
+        """
+        self.thread.join()
+        self.writer.close()
+        try:
+            if self.timing.error is None:
+                mux_start = time.perf_counter()
+                if has_audio:
+                    backend.mux_audio(self.video_only, input_video, self.variant.output_video, duration=duration,
+                                      audio_arguments=self.settings.audio_arguments())
+                else:
+                    os.replace(self.video_only, self.variant.output_video)
+                self.timing.mux_seconds = time.perf_counter() - mux_start
+        except Exception as e:
+            self.timing.error = str(e)
+        finally:
+            if os.path.exists(self.video_only):
+                os.remove(self.video_only)
+        self.timing.wall_seconds = time.perf_counter() - start_time
+
+
+def render_variants(input_video, variants, profile=DEFAULT_PROFILE, platforms=None, preset=None, threads=None,
+                    font="Kalam", font_color="blue2", backend=None, concurrent_encodes=1) -> MultiVariantReport:
+    """
+    Renders several edited versions of a video while decoding the source only once.
+
+    Every decoded frame is handed to one thread per variant, which watermarks and pads it and feeds it to the variant's own ffmpeg encoder, so all encoders run at the same time. The encoders share the CPU cores, each getting an equal part. The watermark, trimming and letterboxing match the "numpy" engine of `add_watermark_to_video`. The audio is muxed in from the source afterwards, copied when its codec allows.
+
+    Args:
+        input_video (str): The path to the input video file.
+        variants (list[Variant]): The versions to render.
+        profile (str, optional): The encoder profile: "fast-draft", "balanced" or "archive". Defaults to "balanced".
+        platforms (list[str], optional): The platforms the videos are uploaded to, whose size and bitrate limits apply to the variants that do not name their own.
+        preset (str, optional): The x264 preset, overriding the profile's choice.
+        threads (int, optional): The number of threads of each encoder, overriding the profile's choice.
+        font (str, optional): The watermark font. Defaults to "Kalam".
+        font_color (str, optional): The watermark color. Defaults to "blue2".
+        backend (FFmpegBackend, optional): The backend used for muxing the audio. Defaults to a new FFmpegBackend.
+        concurrent_encodes (int, optional): How many videos are rendered at the same time, sharing the CPU cores. Defaults to 1.
+
+    Returns:
+        MultiVariantReport: The timings of the render. A variant that failed has its `error` set and no output file.
+
+    Raises:
+        ValueError: If there are no variants or two variants have the same output file.
+    """
+    if len(variants) == 0:
+        raise ValueError("No variants to render")
+    if len({os.path.abspath(variant.output_video) for variant in variants}) != len(variants):
+        raise ValueError("Every variant needs its own output file")
+    backend = backend or FFmpegBackend()
+
+    start_time = time.perf_counter()
+    source = probe_source(input_video)
+    source_clip = VideoFileClip(input_video, audio=False)
+    try:
+        video_clip = source_clip
+        if video_clip.duration > DURATION_LIMIT:
+            video_clip = video_clip.subclip(0, MAX_DURATION)
+
+        encoders = []
+        decode_seconds = 0.0
+        try:
+            for variant in variants:
+                settings = resolve_encoder_settings(profile, source, FramePadder(source.size, variant.aspect_ratio).size,
+                                                    variant.platforms if variant.platforms is not None else platforms,
+                                                    concurrent_encodes=len(variants) * concurrent_encodes)
+                settings.preset = preset or settings.preset
+                settings.threads = threads or settings.threads
+                encoders.append(_VariantEncoder(variant, source, settings, video_clip.fps, font, font_color,
+                                                variant.output_video + ".video-only.mp4"))
+
+            frames = video_clip.iter_frames(dtype="uint8")
+            while True:
+                decode_start = time.perf_counter()
+                frame = next(frames, None)
+                decode_seconds += time.perf_counter() - decode_start
+                if frame is None or all(encoder.timing.error is not None for encoder in encoders):
+                    break
+                # The frame is shared: the padders copy it and never write to it.
+                for encoder in encoders:
+                    encoder.frames.put(frame)
+        finally:
+            for encoder in encoders:
+                encoder.frames.put(None)
+            for encoder in encoders:
+                encoder.finish(input_video, video_clip.duration, source.has_audio, backend, start_time)
+    finally:
+        source_clip.close()
+
+    return MultiVariantReport(input_video, decode_seconds, time.perf_counter() - start_time,
+                              [encoder.timing for encoder in encoders])
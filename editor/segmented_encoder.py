@@ -0,0 +1,86 @@
+import dataclasses
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from editor.edit_plan import EditPlan, FFmpegBackend
+
+
+def _render_segment(plan):
+    return FFmpegBackend().render(plan)
+
+
+def render_segmented(plan: EditPlan, workers=None, segment_seconds=None, backend=None) -> str:
+    """
+    Renders an edit plan by encoding keyframe-aligned segments of the video in parallel.
+
+    The (trimmed) source video is split without re-encoding, which can only cut at keyframes. Every segment is then watermarked, padded and encoded in its own process. Finally, the segments are joined without re-encoding and the original audio is muxed back in once, so the audio is never cut.
+
+    Args:
+        plan (EditPlan): The plan to render.
+        workers (int, optional): The number of segments encoded at the same time. Defaults to the number of CPU cores.
+        segment_seconds (float, optional): The target segment length. Defaults to splitting the video into one segment per worker.
+        backend (FFmpegBackend, optional): The backend used for splitting and joining. Defaults to a new FFmpegBackend.
+
+    Returns:
+        str: The path to the output video file.
+
+    Raises:
+        RuntimeError: If ffmpeg fails.
+    """
+    backend = backend or FFmpegBackend()
+    workers = workers or os.cpu_count() or 1
+    duration = plan.output_duration or 0
+    if segment_seconds is None:
+        segment_seconds = max(2.0, duration / workers)
+
+    output_dir = os.path.dirname(os.path.abspath(plan.output_video))
+    os.makedirs(output_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix="segments-", dir=output_dir)
+
+    try:
+        # Split the video stream at keyframes.
+        command = [backend.ffmpeg_binary, "-y", "-loglevel", "error"]
+        if plan.duration is not None:
+            command += ["-t", f"{plan.duration:.3f}"]
+        command += ["-i", plan.input_video, "-map", "0:v:0", "-c", "copy", "-f", "segment",
+                    "-segment_time", f"{segment_seconds:.3f}", "-reset_timestamps", "1",
+                    os.path.join(work_dir, "source-%04d.mp4")]
+        backend.run(command)
+
+        sources = sorted(name for name in os.listdir(work_dir) if name.startswith("source-"))
+        segment_plans = [
+            dataclasses.replace(plan,
+                                input_video=os.path.join(work_dir, name),
+                                output_video=os.path.join(work_dir, name.replace("source-", "encoded-")),
+                                duration=None,
+                                has_audio=False,
+                                threads=max(1, (os.cpu_count() or 1) // workers))
+            for name in sources
+        ]
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(segment_plans))) as executor:
+            encoded = list(executor.map(_render_segment, segment_plans))
+
+        list_file = os.path.join(work_dir, "segments.txt")
+        with open(list_file, "w", encoding="utf-8") as f:
+            for path in encoded:
+                f.write("file '{}'\n".format(path.replace("'", "'\\''")))
+
+        # Join the encoded segments and take the audio from the source.
+        command = [backend.ffmpeg_binary, "-y", "-loglevel", "error",
+                   "-f", "concat", "-safe", "0", "-i", list_file]
+        if plan.has_audio:
+            if plan.duration is not None:
+                command += ["-t", f"{plan.duration:.3f}"]
+            command += ["-i", plan.input_video, "-map", "0:v:0", "-map", "1:a:0?", *backend.audio_arguments(plan)]
+        else:
+            command += ["-map", "0:v:0"]
+        command += ["-c:v", "copy", "-movflags", "+faststart", plan.output_video]
+        backend.run(command)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return plan.output_video
+
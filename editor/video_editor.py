@@ -1,43 +1,41 @@
-from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip, ColorClip
+from moviepy.editor import VideoClip, VideoFileClip, ImageClip, CompositeVideoClip
+import dataclasses
 import os
 
+from editor.edit_plan import FFmpegBackend, build_edit_plan
+from editor.encoder_profiles import DEFAULT_PROFILE, probe_source, resolve_encoder_settings, separate_encode_platforms
+from editor.frame_padder import FramePadder, padded_size
+from editor.multi_variant import Variant, render_variants
+from editor.segmented_encoder import render_segmented
+from editor.watermark_cache import watermark_cache
+from editor.watermark_renderer import WatermarkRenderer
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
-def ensure_video_is_portrait(existing_clip: CompositeVideoClip) -> CompositeVideoClip:
+def ensure_video_is_portrait(existing_clip: VideoClip, aspect_ratio="1:1") -> VideoClip:
     """
-    Inserts an existing CompositeVideoClip into a centered empty black clip with a square 1:1 aspect ratio, only if the existing clip is landscape.
+    Centers an existing clip on a black background with the target aspect ratio, only if the existing clip is wider than that aspect ratio.
+
+    Each frame is copied into a reused black canvas instead of compositing a full-size ColorClip.
 
     Parameters:
-        existing_clip (CompositeVideoClip): The existing CompositeVideoClip to be centered.
+        existing_clip (VideoClip): The existing clip to be centered.
+        aspect_ratio (str, optional): The target aspect ratio, e.g. "1:1" or "9:16". Defaults to "1:1".
 
     Returns:
-        CompositeVideoClip: The composite video clip with the existing clip centered on an empty black clip, or the original clip if it's portrait.
+        VideoClip: The clip with the existing clip centered on a black background, or the original clip if it's already narrow enough.
     """
-    # Check if the existing clip is portrait or square.
-    if existing_clip.size[0] <= existing_clip.size[1]:
-        # Return the original clip if it's portrait or square.
+    # Return the original clip if it's portrait or narrow enough.
+    if padded_size(existing_clip.size, aspect_ratio) == tuple(existing_clip.size):
         return existing_clip
 
-    # Calculate the aspect ratio of the input clip.
-    input_aspect_ratio = existing_clip.size[0] / existing_clip.size[1]
-
-    # Calculate the height of the resized clip to fit the target aspect ratio.
-    target_width = existing_clip.size[0]
-
-    # Calculate the height of the resized clip to fit the target aspect ratio.
-    target_height = existing_clip.size[1] * input_aspect_ratio
-
-    # Create the empty black clip with the same duration and dimensions as the existing clip.
-    empty_black_clip = ColorClip(size=(int(target_width), int(target_height)), color=(0, 0, 0), duration=existing_clip.duration)
-
-    # Composite the existing clip onto the empty black clip, centering it vertically.
-    centered_clip = CompositeVideoClip([empty_black_clip, existing_clip.set_position(("center"))])
-
-    return centered_clip
+    padder = FramePadder(existing_clip.size, aspect_ratio)
+    return existing_clip.fl_image(padder.apply)
 
 
-def add_watermark_to_video(input_video: str, output_video="", watermark_text="Watermark", position="top", margin=20) -> str | None:
+def add_watermark_to_video(input_video: str, output_video="", watermark_text="Watermark", position="top", margin=20, engine="numpy", aspect_ratio="1:1", segmented=False, threads=None, preset=None,
+                           profile=DEFAULT_PROFILE, platforms=None, concurrent_encodes=1) -> str | None:
     """
     Adds a watermark to a video.
 
@@ -47,6 +45,14 @@ def add_watermark_to_video(input_video: str, output_video="", watermark_text="Wa
         watermark_text (str, optional): The text to be added as a watermark. Defaults to "Watermark".
         position (str, optional): The position of the watermark on the video. Can be "top" or "bottom". Defaults to "top".
         margin (int, optional): The margin between the watermark and the edges of the video. Defaults to 20.
+        engine (str, optional): How the watermark is drawn. "numpy" blends a pre-rendered watermark into each frame in place, "compositor" uses MoviePy's CompositeVideoClip. Both produce the same frames. "ffmpeg" trims, watermarks and pads in a single ffmpeg run without decoding frames in Python. Defaults to "numpy".
+        aspect_ratio (str, optional): The aspect ratio landscape videos are letterboxed to, e.g. "1:1" or "9:16". Defaults to "1:1".
+        segmented (bool, optional): Whether to split the video at keyframes and encode the segments in parallel on all CPU cores. Only supported by the "ffmpeg" engine. Defaults to False.
+        threads (int, optional): The number of encoder threads, overriding the profile's choice. Segmented encoding divides the CPU cores between its segments instead.
+        preset (str, optional): The x264 preset, e.g. "ultrafast" or "medium", overriding the profile's choice.
+        profile (str, optional): The encoder profile: "fast-draft", "balanced" or "archive". It chooses the preset, CRF, bitrate cap, threads and scaling from the CPU cores and the probed source. Compatible audio is copied instead of re-encoded. Defaults to "balanced".
+        platforms (list[str], optional): The platforms the video is uploaded to, e.g. ["tiktok", "youtube"], whose size and bitrate limits apply as well.
+        concurrent_encodes (int, optional): How many videos are encoded at the same time, sharing the CPU cores. Defaults to 1.
 
     Returns:
         str | None: The path to the output video file if the watermark was successfully added, None otherwise.
@@ -55,11 +61,30 @@ def add_watermark_to_video(input_video: str, output_video="", watermark_text="Wa
         Exception: If an error occurs while adding the watermark to the video.
     """
     try:
+        if engine not in ["numpy", "compositor", "ffmpeg"]:
+            raise ValueError(f"Unknown watermark engine: {engine}")
+        if segmented and engine != "ffmpeg":
+            raise ValueError("Segmented encoding requires the ffmpeg engine")
+
         if not output_video:
-            output_video = os.path.join(BASE_DIR + r"\Edited-Videos", os.path.basename(input_video))
+            output_video = os.path.join(BASE_DIR, "Edited-Videos", os.path.basename(input_video))
 
         print(f"Output video path: {output_video}")
 
+        if engine == "ffmpeg":
+            plan = build_edit_plan(input_video, output_video, watermark_text, position, margin, aspect_ratio,
+                                   profile=profile, platforms=platforms, concurrent_encodes=concurrent_encodes)
+            plan = dataclasses.replace(plan, preset=preset or plan.preset, threads=threads or plan.threads)
+            if segmented:
+                return render_segmented(plan)
+            return FFmpegBackend().render(plan)
+
+        source = probe_source(input_video)
+        settings = resolve_encoder_settings(profile, source, padded_size(source.size, aspect_ratio), platforms,
+                                            concurrent_encodes=concurrent_encodes)
+        settings.preset = preset or settings.preset
+        settings.threads = threads or settings.threads
+
         video_clip = VideoFileClip(input_video)
         audio_clip = video_clip.audio
 
@@ -67,29 +92,151 @@ def add_watermark_to_video(input_video: str, output_video="", watermark_text="Wa
         font_size = min(video_clip.size[0], video_clip.size[1]) / 10
         font_color = "blue2"
         font = "Kalam"
-        watermark = (TextClip(watermark_text, fontsize=font_size, color=font_color, font=font)
-                        .set_position(("center", video_clip.size[1] - margin - font_size) if position == "bottom" else ("center", margin))
-                        .set_duration(video_clip.duration))
-
-        # Composite video with watermark.
-        watermarked_video = CompositeVideoClip([video_clip.set_audio(None), watermark.set_audio(None)])
-        watermarked_video = watermarked_video.set_audio(audio_clip)
+        if engine == "numpy":
+            # Blend the pre-rendered watermark into each decoded frame, padding it in the same step.
+            renderer = WatermarkRenderer.from_text(watermark_text, font_size, font_color, font, video_clip.size, position, margin)
+            padder = FramePadder(video_clip.size, aspect_ratio, watermark=renderer)
+            watermarked_video = video_clip.fl_image(padder.apply)
+        else:
+            watermark_rgb, watermark_alpha = watermark_cache.get(watermark_text, font, font_size, font_color)
+            watermark = (ImageClip(watermark_rgb).set_mask(ImageClip(watermark_alpha, ismask=True))
+                            .set_position(("center", video_clip.size[1] - margin - font_size) if position == "bottom" else ("center", margin))
+                            .set_duration(video_clip.duration))
+
+            # Composite video with watermark.
+            watermarked_video = CompositeVideoClip([video_clip.set_audio(None), watermark.set_audio(None)])
+            watermarked_video = watermarked_video.set_audio(audio_clip)
 
         # Set max duration to 1 minute.
         if watermarked_video.duration > 60:
             watermarked_video = watermarked_video.subclip(0, 59.9)
         
-        # Insert centered empty clip if video is portrait.
-        watermarked_video = ensure_video_is_portrait(watermarked_video)
-
-        # Write video with optimized codecs and multithreading.
-        watermarked_video.write_videofile(output_video, codec="libx264", audio_codec="aac", temp_audiofile="temp-audio.m4a", remove_temp=True, threads=12)
+        # Insert centered empty clip if video is landscape (already done by the numpy engine).
+        if engine == "compositor":
+            watermarked_video = ensure_video_is_portrait(watermarked_video, aspect_ratio)
+
+        # Write video with the profile's encoder settings.
+        ffmpeg_params = settings.rate_control_arguments()
+        if settings.scaled_size is not None:
+            ffmpeg_params += ["-vf", "scale={}:{}".format(*settings.scaled_size)]
+        if settings.audio_codec == "copy" and audio_clip is not None:
+            # Encode only the video, then copy the source's audio stream next to it.
+            video_only = output_video + ".video-only.mp4"
+            watermarked_video.write_videofile(video_only, codec="libx264", audio=False, threads=settings.threads,
+                                              preset=settings.preset, ffmpeg_params=ffmpeg_params)
+            try:
+                FFmpegBackend().mux_audio(video_only, input_video, output_video, duration=watermarked_video.duration,
+                                          audio_arguments=settings.audio_arguments())
+            finally:
+                os.remove(video_only)
+        else:
+            watermarked_video.write_videofile(output_video, codec="libx264", audio_codec="aac", audio_bitrate=f"{settings.audio_bitrate}k",
+                                              temp_audiofile=output_video + ".temp-audio.m4a", remove_temp=True,
+                                              threads=settings.threads, preset=settings.preset, ffmpeg_params=ffmpeg_params)
     except Exception as e:
         print(f"An error occurred: {e}")
         return None
     else:
         return output_video
 
+def add_watermark_for_platforms(input_video: str, output_video="", watermark_text="Watermark", position="top", margin=20,
+                                aspect_ratio="1:1", profile=DEFAULT_PROFILE, platforms=None, concurrent_encodes=1) -> str | None:
+    """
+    Adds a watermark to a video that is uploaded to several platforms, encoding it once more for each platform that allows a better video.
+
+    The video at `output_video` meets the limits of every platform. A platform whose own limits leave the profile and the source room for a larger or higher-bitrate video also gets its own version, found with `platform_video`. Platform versions left over from an earlier edit of the same output are deleted first, so they are never uploaded instead. All versions are rendered from a single decode of the source.
+
+    Args:
+        input_video (str): The path to the input video file.
+        output_video (str, optional): The path to the output video file. Defaults to the input's name in the "Edited-Videos" directory.
+        watermark_text (str, optional): The text to be added as a watermark. Defaults to "Watermark".
+        position (str, optional): The position of the watermark: "top" or "bottom". Defaults to "top".
+        margin (int, optional): The margin between the watermark and the edges of the video. Defaults to 20.
+        aspect_ratio (str, optional): The aspect ratio landscape videos are letterboxed to, e.g. "1:1" or "9:16". Defaults to "1:1".
+        profile (str, optional): The encoder profile: "fast-draft", "balanced" or "archive". Defaults to "balanced".
+        platforms (list[str], optional): The platforms the video is uploaded to, e.g. ["tiktok", "youtube"].
+        concurrent_encodes (int, optional): How many videos are edited at the same time, sharing the CPU cores. Defaults to 1.
+
+    Returns:
+        str | None: The path to the video meeting every platform's limits, or None if any version could not be created.
+    """
+    if not output_video:
+        output_video = os.path.join(BASE_DIR, "Edited-Videos", os.path.basename(input_video))
+    try:
+        source = probe_source(input_video)
+        separate = separate_encode_platforms(profile, platforms, source, padded_size(source.size, aspect_ratio))
+        for platform in platforms or []:
+            if os.path.exists(platform_video_path(output_video, platform)):
+                os.remove(platform_video_path(output_video, platform))
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return None
+    if len(separate) == 0:
+        return add_watermark_to_video(input_video, output_video, watermark_text, position, margin, aspect_ratio=aspect_ratio,
+                                      profile=profile, platforms=platforms, concurrent_encodes=concurrent_encodes)
+
+    variants = [Variant(output_video, watermark_text, position, margin, aspect_ratio, platforms=platforms)]
+    variants += [Variant(platform_video_path(output_video, platform), watermark_text, position, margin, aspect_ratio,
+                         platforms=[platform])
+                 for platform in separate]
+    outputs = add_watermark_variants(input_video, variants, profile=profile, concurrent_encodes=concurrent_encodes)
+    if outputs is None or None in outputs:
+        return None
+    return outputs[0]
+
+
+def platform_video_path(output_video, platform) -> str:
+    """
+    Returns where `add_watermark_for_platforms` saves the version of a video encoded for one platform.
+    """
+    root, extension = os.path.splitext(output_video)
+    return f"{root}.{platform}{extension}"
+
+
+def platform_video(edited_video, platform) -> str:
+    """
+    Returns the version of an edited video to upload to a platform: the platform's own version if it has one, otherwise the video meeting every platform's limits.
+    """
+    own_video = platform_video_path(edited_video, platform)
+    return own_video if os.path.exists(own_video) else edited_video
+
+
+def add_watermark_variants(input_video: str, variants, profile=DEFAULT_PROFILE, platforms=None, preset=None, threads=None,
+                           concurrent_encodes=1) -> list[str | None] | None:
+    """
+    Adds different watermarks to several copies of a video, decoding the video only once.
+
+    Each variant is watermarked and letterboxed like the "numpy" engine of `add_watermark_to_video` does, and all variants are encoded at the same time.
+
+    Args:
+        input_video (str): The path to the input video file.
+        variants (list[Variant]): The versions to create, each with its own watermark text, position, margin, aspect ratio and output file.
+        profile (str, optional): The encoder profile: "fast-draft", "balanced" or "archive". Defaults to "balanced".
+        platforms (list[str], optional): The platforms the videos are uploaded to, whose size and bitrate limits apply.
+        preset (str, optional): The x264 preset, overriding the profile's choice.
+        threads (int, optional): The number of threads of each encoder, overriding the profile's choice.
+        concurrent_encodes (int, optional): How many videos are edited at the same time, sharing the CPU cores. Defaults to 1.
+
+    Returns:
+        list[str | None] | None: For each variant, in the same order, the path to its output video file, or None if it failed. None if the video could not be read.
+    """
+    try:
+        report = render_variants(input_video, variants, profile=profile, platforms=platforms, preset=preset, threads=threads,
+                                 concurrent_encodes=concurrent_encodes)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return None
+
+    outputs = []
+    for timing in report.variants:
+        if timing.error is not None:
+            print(f"An error occurred while creating {timing.output_video}: {timing.error}")
+            outputs.append(None)
+        else:
+            print(f"Output video path: {timing.output_video} ({timing.wall_seconds:.2f} s)")
+            outputs.append(timing.output_video)
+    return outputs
+
 if __name__ == "__main__":
     input_video = input("Enter input video file path: ").strip('"')
     output_video = input("Enter output video file path (leave empty for default): ").strip('"')
@@ -0,0 +1,217 @@
+import re
+import subprocess
+from dataclasses import dataclass
+
+import numpy as np
+from moviepy.config import get_setting
+
+from editor.encoder_profiles import probe_source
+
+# Frames are decoded as FRAME_SIZE x FRAME_SIZE grayscale images. Hashes are taken from HASH_INPUT x HASH_INPUT images,
+# the whole frame reduced by half or its central part, and made of the HASH_SIZE x HASH_SIZE lowest DCT frequencies.
+FRAME_SIZE = 64
+HASH_INPUT = 32
+HASH_SIZE = 8
+# The number of equal parts of a video that get their own hash.
+SEGMENTS = 8
+# When the keyframes are further apart than a segment, frames are sampled at this rate per segment instead.
+SAMPLES_PER_SEGMENT = 4
+# The number of equal parts of the audio whose loudness is compared.
+AUDIO_SEGMENTS = 16
+AUDIO_SAMPLE_RATE = 8000
+
+# How far two near-duplicates may differ.
+MAX_VIDEO_DISTANCE = 12
+MAX_SEGMENT_DISTANCE = 16
+MIN_AUDIO_SIMILARITY = 0.95
+DURATION_TOLERANCE = 0.02
+
+
+def _dct_matrix(size) -> np.ndarray:
+    """
+    Returns the orthonormal DCT-II matrix, so that `matrix @ x @ matrix.T` is the 2D DCT of x.
+    """
+    rows = np.arange(size)[:, np.newaxis]
+    columns = np.arange(size)[np.newaxis, :]
+    matrix = np.sqrt(2 / size) * np.cos(np.pi * (2 * columns + 1) * rows / (2 * size))
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+# Only the rows for the lowest frequencies are needed.
+_DCT_LOW = _dct_matrix(HASH_INPUT)[:HASH_SIZE].astype(np.float32)
+_BIT_WEIGHTS = np.uint64(1) << np.arange(HASH_SIZE * HASH_SIZE, dtype=np.uint64)
+
+
+@dataclass
+class VideoFingerprint:
+    """
+    A compact perceptual signature of a video.
+
+    `video_hash` is the perceptual hash of the centre of the average frame, which watermarks, borders and small crops barely change; it is used to look up candidates. `segment_hashes` are the hashes of the average frame of each of SEGMENTS equal parts of the video, in order. `audio_energy` is the unit-length loudness of AUDIO_SEGMENTS equal parts of the audio, or None without audio.
+    """
+    video_hash: int
+    segment_hashes: np.ndarray
+    duration: float
+    audio_energy: np.ndarray | None
+
+
+def perceptual_hashes(images) -> np.ndarray:
+    """
+    Computes a 64-bit DCT perceptual hash for each image at once.
+
+    Args:
+        images (numpy.ndarray): A (count, HASH_INPUT, HASH_INPUT) array of grayscale images.
+
+    Returns:
+        numpy.ndarray: The hashes as a uint64 array of length count. A bit is set where the frequency is above the image's median low frequency.
+    """
+    images = np.asarray(images, dtype=np.float32)
+    low = np.einsum("ij,njk,lk->nil", _DCT_LOW, images, _DCT_LOW).reshape(len(images), -1)
+    # The DC term only measures brightness, so it does not take part in the median.
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    return ((low > median).astype(np.uint64) * _BIT_WEIGHTS).sum(axis=1, dtype=np.uint64)
+
+
+def hamming_distances(hashes, other_hashes) -> np.ndarray:
+    """
+    Returns the number of differing bits between every hash of `hashes` and every hash of `other_hashes`, as a (len(hashes), len(other_hashes)) array.
+    """
+    xor = np.bitwise_xor.outer(np.asarray(hashes, dtype=np.uint64), np.asarray(other_hashes, dtype=np.uint64))
+    return np.unpackbits(xor[..., np.newaxis].view(np.uint8), axis=-1).sum(axis=-1)
+
+
+def sampled_frames(video_path, duration, ffmpeg_binary=None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Decodes a sparse set of small grayscale frames of a video, with their timestamps.
+
+    Only keyframes are decoded, which skips almost all of the decoding work. If the keyframes are further apart than a segment, the video is decoded in full and sampled at SAMPLES_PER_SEGMENT frames per segment instead.
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray]: The timestamps in seconds and a (count, FRAME_SIZE, FRAME_SIZE) uint8 array of frames.
+
+    Raises:
+        RuntimeError: If ffmpeg cannot decode the video.
+    """
+    ffmpeg_binary = ffmpeg_binary or get_setting("FFMPEG_BINARY")
+    # showinfo logs the timestamp of every frame it passes on.
+    scale = f"scale={FRAME_SIZE}:{FRAME_SIZE}:flags=area,format=gray,showinfo"
+    frame_bytes = FRAME_SIZE * FRAME_SIZE
+
+    def decode(input_arguments, video_filter):
+        result = subprocess.run([ffmpeg_binary, "-hide_banner", "-nostats", *input_arguments, "-i", video_path,
+                                 "-map", "0:v:0", "-vf", video_filter, "-fps_mode", "passthrough", "-f", "rawvideo", "-"],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+        timestamps = np.array([float(value) for value in re.findall(rb"pts_time:\s*(-?[\d.]+)", result.stderr)])
+        count = min(len(timestamps), len(result.stdout) // frame_bytes)
+        frames = np.frombuffer(result.stdout[:count * frame_bytes], dtype=np.uint8)
+        return timestamps[:count], frames.reshape(count, FRAME_SIZE, FRAME_SIZE)
+
+    timestamps, frames = decode(["-skip_frame", "nokey"], scale)
+    gaps = np.diff(np.concatenate([[0.0], timestamps, [duration]]))
+    if duration > 0 and (len(frames) == 0 or gaps.max() > duration / SEGMENTS):
+        timestamps, frames = decode([], f"fps={SAMPLES_PER_SEGMENT * SEGMENTS / duration:.6f},{scale}")
+    return timestamps, frames
+
+
+def time_weights(timestamps, boundaries) -> np.ndarray:
+    """
+    Returns how many seconds of each part of a video each sampled frame stands for.
+
+    A frame stands for the time from halfway after the previous sample to halfway before the next one, so averages weighted by it hardly depend on where an encoder put its keyframes.
+
+    Args:
+        timestamps (numpy.ndarray): The timestamps of the sampled frames, in increasing order.
+        boundaries (numpy.ndarray): The start and end times of the parts, e.g. [0, duration] for the whole video.
+
+    Returns:
+        numpy.ndarray: A (len(boundaries) - 1, len(timestamps)) array of seconds.
+    """
+    midpoints = (timestamps[1:] + timestamps[:-1]) / 2
+    starts = np.concatenate([[boundaries[0]], midpoints])
+    ends = np.concatenate([midpoints, [boundaries[-1]]])
+    overlap = np.minimum(ends, boundaries[1:, np.newaxis]) - np.maximum(starts, boundaries[:-1, np.newaxis])
+    return np.clip(overlap, 0, None)
+
+
+def audio_energy(video_path, ffmpeg_binary=None) -> np.ndarray | None:
+    """
+    Returns the unit-length RMS loudness of AUDIO_SEGMENTS equal parts of a video's audio, or None if it has no audio.
+    """
+    ffmpeg_binary = ffmpeg_binary or get_setting("FFMPEG_BINARY")
+    result = subprocess.run([ffmpeg_binary, "-loglevel", "error", "-i", video_path, "-map", "0:a:0", "-ac", "1",
+                             "-ar", str(AUDIO_SAMPLE_RATE), "-f", "s16le", "-"],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    samples = np.frombuffer(result.stdout[:len(result.stdout) // 2 * 2], dtype=np.int16).astype(np.float32)
+    if result.returncode != 0 or len(samples) < AUDIO_SEGMENTS:
+        return None
+    segments = samples[:len(samples) // AUDIO_SEGMENTS * AUDIO_SEGMENTS].reshape(AUDIO_SEGMENTS, -1)
+    energy = np.sqrt(np.mean(segments ** 2, axis=1))
+    norm = np.linalg.norm(energy)
+    return (energy / norm).astype(np.float32) if norm > 0 else energy.astype(np.float32)
+
+
+def compute_fingerprint(video_path) -> VideoFingerprint:
+    """
+    Computes the perceptual fingerprint of a video from its keyframes, duration and audio loudness.
+
+    Args:
+        video_path (str): The path to the video file.
+
+    Returns:
+        VideoFingerprint: The fingerprint.
+
+    Raises:
+        RuntimeError: If ffmpeg cannot decode the video.
+    """
+    source = probe_source(video_path)
+    timestamps, frames = sampled_frames(video_path, source.duration)
+    if len(frames) == 0:
+        raise RuntimeError(f"No frames could be decoded from {video_path}")
+    duration = max(source.duration, timestamps[-1])
+
+    frames = frames.astype(np.float32)
+    factor = FRAME_SIZE // HASH_INPUT
+    whole = frames.reshape(len(frames), HASH_INPUT, factor, HASH_INPUT, factor).mean(axis=(2, 4))
+    offset = (FRAME_SIZE - HASH_INPUT) // 2
+    centre = frames[:, offset:offset + HASH_INPUT, offset:offset + HASH_INPUT]
+
+    # Average the frames of each segment and of the whole video, each frame weighted by the time it stands for.
+    segment_weights = time_weights(timestamps, np.linspace(0, duration, SEGMENTS + 1))
+    video_weights = time_weights(timestamps, np.array([0, duration]))
+    averages = np.concatenate([np.einsum("sk,kij->sij", segment_weights, whole),
+                               np.einsum("sk,kij->sij", video_weights, centre)])
+    hashes = perceptual_hashes(averages)
+    return VideoFingerprint(int(hashes[-1]), hashes[:SEGMENTS], source.duration,
+                            audio_energy(video_path) if source.has_audio else None)
+
+
+def duration_window(duration) -> tuple[float, float]:
+    """
+    Returns the shortest and longest duration a near-duplicate of a video of this duration can have.
+    """
+    margin = max(0.5, DURATION_TOLERANCE * duration / (1 - DURATION_TOLERANCE))
+    return duration - margin, duration + margin
+
+
+def is_near_duplicate(fingerprint, other) -> bool:
+    """
+    Decides whether two fingerprints belong to the same clip, e.g. a re-upload, a re-encoded or a watermarked copy.
+
+    The durations must agree within DURATION_TOLERANCE (or half a second for short videos), the video hashes and the segment hashes must be close, and the audio loudness must follow the same curve (or both videos must be silent).
+    """
+    low, high = duration_window(fingerprint.duration)
+    if not low <= other.duration <= high:
+        return False
+    if (fingerprint.video_hash ^ other.video_hash).bit_count() > MAX_VIDEO_DISTANCE:
+        return False
+    if np.diagonal(hamming_distances(fingerprint.segment_hashes, other.segment_hashes)).mean() > MAX_SEGMENT_DISTANCE:
+        return False
+
+    if (fingerprint.audio_energy is None) != (other.audio_energy is None):
+        return False
+    if fingerprint.audio_energy is not None:
+        return float(np.dot(fingerprint.audio_energy, other.audio_energy)) >= MIN_AUDIO_SIMILARITY
+    return True
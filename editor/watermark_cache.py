@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+from moviepy.editor import TextClip
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Bump when the way watermarks are rendered changes, so old cache entries are no longer used.
+RENDERER_VERSION = 1
+
+
+class WatermarkCache:
+    def __init__(self, cache_dir=os.path.join(BASE_DIR, "Watermark-Cache"), max_memory_entries=16, max_disk_bytes=64 * 1024 * 1024):
+        """
+        Caches rendered text watermarks in memory and as PNG files on disk.
+
+        Rendering a TextClip launches ImageMagick, so the rendered image is kept and reused for every video with the same text, font, size and color. The disk cache is shared by every process using the same directory: files are written atomically, and the least recently used files are removed once the directory grows past `max_disk_bytes`.
+
+        Parameters:
+            cache_dir (str): The directory holding the cached PNG files.
+            max_memory_entries (int): The number of watermarks kept in memory.
+            max_disk_bytes (int): The maximum total size of the cached files.
+        """
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(text, font, font_size, color) -> str:
+        """
+        Returns the cache key of a watermark.
+        """
+        fields = [text, font, float(font_size), color, RENDERER_VERSION]
+        return hashlib.sha256(json.dumps(fields).encode("utf-8")).hexdigest()
+
+    def get(self, text, font, font_size, color) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns a rendered watermark, rendering it only if it is not cached yet.
+
+        Parameters:
+            text (str): The watermark text.
+            font (str): The font of the text.
+            font_size (float): The font size of the text.
+            color (str): The ImageMagick color name of the text.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: The (height, width, 3) uint8 colors and the (height, width) float opacity between 0 and 1, as used by TextClip and its mask.
+        """
+        key = self.cache_key(text, font, font_size, color)
+
+        with self._lock:
+            rgba = self._memory.get(key)
+            if rgba is not None:
+                self._memory.move_to_end(key)
+
+        if rgba is None:
+            rgba = self._read(key)
+            if rgba is None:
+                rgba = render_watermark(text, font, font_size, color)
+                self._write(key, rgba)
+            self._remember(key, rgba)
+
+        return rgba[:, :, :3], rgba[:, :, 3] / 255
+
+    def put(self, text, font, font_size, color, rgba):
+        """
+        Stores an already rendered watermark, e.g. one made without ImageMagick.
+
+        Parameters:
+            text (str): The watermark text.
+            font (str): The font of the text.
+            font_size (float): The font size of the text.
+            color (str): The ImageMagick color name of the text.
+            rgba (numpy.ndarray): The (height, width, 4) uint8 RGBA image of the watermark.
+        """
+        key = self.cache_key(text, font, font_size, color)
+        rgba = np.ascontiguousarray(rgba, dtype=np.uint8)
+        self._write(key, rgba)
+        self._remember(key, rgba)
+
+    def path(self, text, font, font_size, color) -> str:
+        """
+        Returns the path of the cached PNG file of a watermark, rendering it first if needed.
+        """
+        self.get(text, font, font_size, color)
+        return self._file_path(self.cache_key(text, font, font_size, color))
+
+    def _file_path(self, key):
+        return os.path.join(self.cache_dir, key + ".png")
+
+    def _remember(self, key, rgba):
+        with self._lock:
+            self._memory[key] = rgba
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _read(self, key):
+        file_path = self._file_path(key)
+        try:
+            with Image.open(file_path) as image:
+                rgba = np.array(image.convert("RGBA"))
+            # Mark the file as recently used for eviction.
+            os.utime(file_path)
+        except (OSError, ValueError):
+            return None
+        return rgba
+
+    def _write(self, key, rgba):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(suffix=".png.tmp", dir=self.cache_dir)
+            with os.fdopen(fd, "wb") as f:
+                Image.fromarray(rgba, "RGBA").save(f, format="PNG")
+            os.replace(temp_path, self._file_path(key))
+            self._evict()
+        except OSError as e:
+            print(f"Could not cache the watermark: {e}")
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".png"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, file_path in sorted(entries):
+            if total_bytes <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(file_path)
+            except OSError:
+                # Another process may have removed it already.
+                pass
+            total_bytes -= size
+
+
+def render_watermark(text, font, font_size, color) -> np.ndarray:
+    """
+    Renders a text watermark with ImageMagick.
+
+    Returns:
+        numpy.ndarray: The (height, width, 4) uint8 RGBA image of the text.
+    """
+    text_clip = TextClip(text, fontsize=font_size, color=color, font=font)
+    rgb = text_clip.get_frame(0)[:, :, :3].astype(np.uint8)
+    if text_clip.mask is not None:
+        alpha = np.rint(text_clip.mask.get_frame(0) * 255).astype(np.uint8)
+    else:
+        alpha = np.full(rgb.shape[:2], 255, dtype=np.uint8)
+    return np.dstack([rgb, alpha])
+
+
+# Shared by every watermark rendered in this process.
+watermark_cache = WatermarkCache()
@@ -0,0 +1,113 @@
+import numpy as np
+
+from editor.watermark_cache import watermark_cache
+
+
+class WatermarkRenderer:
+    def __init__(self, rgb, alpha, frame_size, position):
+        """
+        Blends a fixed watermark into video frames without compositing the whole frame.
+
+        The watermark is premultiplied once and blended only into the rows it covers, reusing the same buffers for every frame.
+
+        Parameters:
+            rgb (numpy.ndarray): The watermark colors as a (height, width, 3) array.
+            alpha (numpy.ndarray): The watermark opacity as a (height, width) array of floats between 0 and 1.
+            frame_size (tuple[int, int]): The (width, height) of the frames the watermark is applied to.
+            position (tuple[int, int]): The (x, y) position of the top left corner of the watermark in the frame. May be partly outside the frame.
+        """
+        frame_width, frame_height = frame_size
+        x, y = int(position[0]), int(position[1])
+        height, width = alpha.shape[:2]
+
+        # Clip the watermark to the frame, the same way MoviePy's blit does.
+        left, top = max(0, x), max(0, y)
+        right, bottom = min(frame_width, x + width), min(frame_height, y + height)
+        self.frame_size = (frame_width, frame_height)
+        self.rows = slice(top, max(top, bottom))
+        self.columns = slice(left, max(left, right))
+        self.is_visible = left < right and top < bottom
+
+        patch_rows = slice(top - y, top - y + max(0, bottom - top))
+        patch_columns = slice(left - x, left - x + max(0, right - left))
+        alpha = np.asarray(alpha, dtype=np.float64)[patch_rows, patch_columns, np.newaxis]
+        rgb = np.asarray(rgb, dtype=np.float64)[patch_rows, patch_columns, :3]
+
+        self.premultiplied = (alpha * rgb).astype(np.float32)
+        self.inverse_alpha = (1.0 - alpha).astype(np.float32)
+        self._blend_buffer = np.empty(self.premultiplied.shape, dtype=np.float32)
+        self._frame_buffer = np.empty((frame_height, frame_width, 3), dtype=np.uint8)
+
+    @classmethod
+    def from_text(cls, text, font_size, color, font, frame_size, position="top", margin=20):
+        """
+        Creates a renderer for a text watermark laid out like the CompositeVideoClip watermark in `add_watermark_to_video`. The text is rendered through the shared watermark cache.
+
+        Parameters:
+            text (str): The watermark text.
+            font_size (float): The font size of the text.
+            color (str): The ImageMagick color name of the text.
+            font (str): The font of the text.
+            frame_size (tuple[int, int]): The (width, height) of the video frames.
+            position (str): "top" or "bottom".
+            margin (int): The margin between the watermark and the top or bottom edge of the frame.
+
+        Returns:
+            WatermarkRenderer: The renderer for the watermark.
+        """
+        rgb, alpha = watermark_cache.get(text, font, font_size, color)
+        return cls(rgb, alpha, frame_size, watermark_position(frame_size, alpha.shape[:2], position, margin, font_size))
+
+    def apply(self, frame):
+        """
+        Returns the frame with the watermark blended in.
+
+        The returned array is a buffer owned by the renderer that is overwritten by the next call, so it must be consumed (e.g. written to the encoder) before the next frame is rendered.
+
+        Parameters:
+            frame (numpy.ndarray): A (height, width, 3) uint8 frame. It is not modified.
+
+        Returns:
+            numpy.ndarray: The watermarked frame.
+        """
+        np.copyto(self._frame_buffer, frame)
+        self.blend_into(self._frame_buffer)
+        return self._frame_buffer
+
+    def blend_into(self, frame):
+        """
+        Blends the watermark into a writable frame in place.
+
+        Parameters:
+            frame (numpy.ndarray): A writable (height, width, 3) uint8 array.
+        """
+        if not self.is_visible:
+            return
+        band = frame[self.rows, self.columns]
+        np.multiply(band, self.inverse_alpha, out=self._blend_buffer)
+        np.add(self._blend_buffer, self.premultiplied, out=self._blend_buffer)
+        # Truncate like the compositor's astype("uint8").
+        np.copyto(band, self._blend_buffer, casting="unsafe")
+
+
+def watermark_position(frame_size, watermark_size, position="top", margin=20, font_size=None) -> tuple[int, int]:
+    """
+    Calculates where the watermark is placed in the frame.
+
+    Args:
+        frame_size (tuple[int, int]): The (width, height) of the frame.
+        watermark_size (tuple[int, int]): The (height, width) of the watermark image.
+        position (str, optional): "top" or "bottom". Defaults to "top".
+        margin (int, optional): The margin between the watermark and the edge of the frame. Defaults to 20.
+        font_size (float, optional): The font size used for bottom placement. Defaults to the watermark height.
+
+    Returns:
+        tuple[int, int]: The (x, y) position of the top left corner of the watermark.
+    """
+    frame_width, frame_height = frame_size
+    watermark_height, watermark_width = watermark_size
+    if font_size is None:
+        font_size = watermark_height
+    x = (frame_width - watermark_width) / 2
+    y = frame_height - margin - font_size if position == "bottom" else margin
+    return int(x), int(y)
@@ -1,36 +1,59 @@
-import sqlite3
+import argparse
+import contextlib
+import dataclasses
+import json
 import os
+import sys
+import time
 
-from downloader.tiktok_downloader import download_tiktok, validate_tiktok_url
-from editor.video_editor import add_watermark_to_video
-from uploader.tiktok_upload import upload_tiktok
-from uploader.youtube_uploader import YouTubeUploader
+# Only light modules are imported here. MoviePy, Selenium, the Google API client and tiktok_uploader are imported by the
+# functions that need them, so commands such as `status` start without loading them.
+from downloader.download_cache import validate_tiktok_url
+from editor.encoder_profiles import PROFILES
+from pipeline.batch_pipeline import VideoJob, job_from_row, read_jobs
+from pipeline.job_store import DONE, JobStore, STAGES
 
 from dotenv import load_dotenv
 load_dotenv()
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Connect to SQLite database
-conn = sqlite3.connect(BASE_DIR + r'\video_info.db')
-c = conn.cursor()
+# The SQLite database holding the jobs (existing video_info tables are migrated automatically).
+DB_PATH = os.getenv("VIDEO_INFO_DB", os.path.join(BASE_DIR, "video_info.db"))
 
-# Create table if not exists
-c.execute('''CREATE TABLE IF NOT EXISTS video_info
-             (tiktok_url TEXT, video_description TEXT, watermark_position TEXT,
-             downloaded_tiktok TEXT, edited_video TEXT, tiktok_is_uploaded TEXT, youtube_video_id TEXT)''')
-conn.commit()
+# Where the stage metrics are exported, e.g. for a Prometheus textfile collector.
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(BASE_DIR, "metrics"))
 
+# Opened on first use by get_job_store.
+job_store = None
 
-def save_video_info(tiktok_url, video_description, watermark_position, downloaded_tiktok,
-                    edited_video, tiktok_is_uploaded, youtube_video_id) -> None:
+
+def get_job_store() -> JobStore:
+    """
+    Returns the job store, connecting to the SQLite database the first time it is needed.
+    """
+    global job_store
+    if job_store is None:
+        job_store = JobStore(DB_PATH)
+    return job_store
+
+
+def export_stage_metrics() -> None:
     """
-    Save video download info to SQLite3 database.
+    Exports the stage metrics stored in the database as "pipeline.prom" and "pipeline.json" in METRICS_DIR, and prints the median and 95th percentile time of each stage.
     """
-    c.execute("INSERT INTO video_info VALUES (?, ?, ?, ?, ?, ?, ?)",
-              (tiktok_url, video_description, watermark_position, downloaded_tiktok,
-               edited_video, tiktok_is_uploaded, youtube_video_id))
-    conn.commit()
+    from pipeline.metrics import METRICS_ENABLED, export_metrics
+
+    if not METRICS_ENABLED:
+        return
+    try:
+        summary = export_metrics(get_job_store().stage_metrics(), METRICS_DIR)
+    except OSError as e:
+        print(f"An error occurred while exporting the metrics: {e}")
+        return
+    for stage, stage_summary in summary.items():
+        print(f"{stage}: {stage_summary['runs']} runs, {stage_summary['failures']} failed, "
+              f"p50 {stage_summary['wall_seconds_p50']:.1f} s, p95 {stage_summary['wall_seconds_p95']:.1f} s")
 
 
 def upload_new_video() -> bool:
@@ -39,23 +62,26 @@ def upload_new_video() -> bool:
 
     This function prompts the user to enter the TikTok video URL, video description, and watermark position. It then validates the TikTok URL, checks the length of the video description, and ensures the watermark position is either "top" or "bottom".
 
-    The function downloads the TikTok video using the `download_tiktok` function from the `downloader.tiktok_downloader` module. It adds a watermark to the downloaded video using the `add_watermark_to_video` function from the `editor.video_editor` module.
+    The function downloads the TikTok video using the `download_tiktok` function from the `downloader.tiktok_downloader` module and fingerprints it with `fingerprint_stage`; a near-duplicate of an earlier job's video is not uploaded again. It adds a watermark to the downloaded video using the `add_watermark_for_platforms` function from the `editor.video_editor` module.
 
     The edited video is then uploaded to TikTok using the `upload_tiktok` function from the `uploader.tiktok_upload` module. After that, the video is uploaded to YouTube using the `upload_video` method of the `YouTubeUploader` class from the `uploader.youtube_uploader` module.
 
-    If any exception occurs during the process, an error message is printed and the function returns `False`. Otherwise, it returns `True`.
+    If any exception occurs during the process, an error message is printed and the function returns `False`. Otherwise, it returns `True`. Either way the job is saved to the database, so a failed upload can be retried with `retry_jobs`.
 
     Returns:
         bool: `True` if the video is successfully uploaded, `False` otherwise.
     """
+    from downloader.download_cache import DownloadCache
+    from downloader.tiktok_downloader import download_tiktok
+    from editor.video_editor import add_watermark_for_platforms, platform_video
+    from uploader.tiktok_upload import upload_tiktok
+    from uploader.youtube_uploader import YouTubeUploader
+    from pipeline.video_stages import TARGET_PLATFORMS, fingerprint_stage
+
     tiktok_url = None
     video_description = None
     watermark_position = None
-    downloaded_tiktok = None
-    edited_video = None
-    tiktok_is_uploaded = None
-    youtube_video_id = None
-    
+
     while True:
         tiktok_url = input("Enter the TikTok video URL: ")
         if validate_tiktok_url(tiktok_url):
@@ -71,102 +97,514 @@ def upload_new_video() -> bool:
         if watermark_position in ["top", "bottom"]:
             break
 
+    store = get_job_store()
+    job = VideoJob(tiktok_url, video_description, watermark_position)
+    stage = "download"
     try:
-        downloaded_tiktok = download_tiktok(tiktok_url)
+        # The fingerprint index refers to the job by its ID.
+        job.job_id = store.add_job(tiktok_url, video_description, watermark_position)
+        # Do not evict the downloads that unfinished jobs are still waiting to retry.
+        job.downloaded_tiktok = download_tiktok(tiktok_url, cache=DownloadCache(keep_paths=store.unfinished_downloads))
+
+        stage = "fingerprint"
+        fingerprint_stage(job, store)
+        if job.duplicate_of is not None:
+            return True
 
-        edited_video = add_watermark_to_video(downloaded_tiktok, watermark_text=os.getenv("WATERMARK_TEXT"), position=watermark_position, margin=20)
+        stage = "edit"
+        job.edited_video = add_watermark_for_platforms(job.downloaded_tiktok, watermark_text=os.getenv("WATERMARK_TEXT"), position=watermark_position,
+                                                       margin=20, platforms=TARGET_PLATFORMS)
 
-        tiktok_is_uploaded = upload_tiktok(edited_video, video_description, BASE_DIR + r"\uploader\cookies.txt")
+        stage = "tiktok"
+        job.tiktok_is_uploaded = upload_tiktok(platform_video(job.edited_video, "tiktok"), video_description, os.path.join(BASE_DIR, "uploader", "cookies.txt"))
 
+        stage = "youtube"
         youtube_uploader = YouTubeUploader()
-        youtube_video_id = youtube_uploader.upload_video(edited_video, title=video_description, description=video_description)
+        job.youtube_video_id = youtube_uploader.upload_video(platform_video(job.edited_video, "youtube"), title=video_description, description=video_description)
     except Exception as e:
         print(f"An error occurred: {e}")
+        job.error = f"{stage}: {e}"
         return False
     finally:
-        save_video_info(tiktok_url, video_description, watermark_position, downloaded_tiktok,
-                        edited_video, tiktok_is_uploaded, youtube_video_id)
+        store.save_job(job)
     return True
 
 
-def upload_failed_video() -> bool:
-    """
-    Uploads failed videos from the database.
-    
-    This function retrieves failed videos from the 'video_info' table in the database. The failed videos are selected based on the following conditions:
-    - 'downloaded_tiktok' is NULL
-    - 'edited_video' is NULL and 'downloaded_tiktok' is not NULL
-    - 'tiktok_is_uploaded' is 0 and 'edited_video' is not NULL
-    - 'youtube_video_id' is NULL or 'tiktok_is_uploaded' is NULL
-    
-    For each failed video, the function performs the following steps:
-    - If 'downloaded_tiktok' is None, it downloads the TikTok video using the 'download_tiktok' function. If the download is successful, it updates the 'video_info' table with the downloaded TikTok video.
-    - If 'edited_video' is None, it adds a watermark to the downloaded TikTok video using the 'add_watermark_to_video' function. If the watermarking is successful, it updates the 'video_info' table with the edited video.
-    - If 'tiktok_is_uploaded' is None, it uploads the edited video to TikTok using the 'upload_tiktok' function. If the upload is successful, it updates the 'video_info' table with the upload status.
-    - If 'youtube_video_id' is None, it uploads the edited video to YouTube using the 'YouTubeUploader' class. If the upload is successful, it updates the 'video_info' table with the YouTube video ID.
-    
-    If all failed videos are successfully processed, the function returns True. If any error occurs during the process, the function prints the error message and returns False.
-    
+def retry_jobs(job_ids=None, failed_only=False) -> list[VideoJob]:
+    """
+    Runs the missing stages of unfinished jobs from the database.
+
+    This function retrieves the jobs with unfinished stages from the job store, using its index of unfinished jobs, and runs their missing stages with a retry scheduler:
+    - Stages of different videos run concurrently, while each video still goes through download, watermarking, TikTok upload and YouTube upload in order.
+    - Every downloaded video is fingerprinted first; a near-duplicate of an earlier job's video is neither watermarked nor uploaded.
+    - A failed stage is retried with exponential backoff and jitter. A video that keeps failing is given up on without stopping the other videos.
+    - Downloads, TikTok uploads and YouTube uploads each have their own rate limit.
+    - Each worker thread reuses one YouTube client.
+    - YouTube uploads interrupted by a crash or a lost connection resume from the last byte YouTube acknowledged.
+
+    The outcome of every attempt is recorded for that job only, by its job ID, together with the stage's timings and resource use, which are then exported to METRICS_DIR.
+
+    Args:
+        job_ids (list[int], optional): Only run these jobs; finished and unknown jobs are skipped. Defaults to every unfinished job.
+        failed_only (bool, optional): Only run jobs that failed before, not ones that were never attempted. Defaults to False.
+
+    Returns:
+        list[VideoJob]: The jobs that were run, with `error` set on the ones that still failed.
+    """
+    store = get_job_store()
+    if job_ids:
+        rows = [row for row in map(store.get_job, job_ids) if row is not None and row["status"] != "done"]
+    else:
+        # Get failed videos from the database in priority order
+        rows = store.pending_jobs()
+    if failed_only:
+        rows = [row for row in rows if row["attempts"] > 0]
+
+    if len(rows) == 0:
+        print("No failed videos found.")
+        return []
+
+    from downloader.webdriver_pool import WebDriverPool
+    from pipeline.retry_scheduler import RetryScheduler
+    from pipeline.video_stages import build_retry_stages
+
+    jobs = [job_from_row(row) for row in rows]
+
+    def record_stage(job, stage, status, result, error):
+        with store.batch():
+            store.update_stage(job.job_id, stage, status, result, error)
+            store.add_metrics(job.job_id, job.metrics)
+        job.metrics.clear()
+
+    pool = WebDriverPool(size=2)
+    try:
+        scheduler = RetryScheduler(build_retry_stages(pool=pool, job_store=store), workers=4, on_stage=record_stage)
+        jobs = scheduler.run(jobs)
+    finally:
+        pool.close()
+        export_stage_metrics()
+
+    for job in jobs:
+        if job.error is not None:
+            print(f"Failed to process {job.tiktok_url}: {job.error}")
+    return jobs
+
+
+def upload_failed_video(job_ids=None) -> bool:
+    """
+    Uploads failed videos from the database, running the missing stages of unfinished jobs with `retry_jobs`.
+
+    Args:
+        job_ids (list[int], optional): Only retry these jobs. Defaults to every unfinished job.
+
     Returns:
         bool: True if all failed videos are successfully processed, False otherwise.
     """
+    return all(job.error is None for job in retry_jobs(job_ids))
+
+
+def job_problem(job) -> str | None:
+    """
+    Checks a job definition before it is added to the database.
+
+    Returns:
+        str | None: Why the job is skipped, e.g. "invalid TikTok URL", or None if it is valid.
+    """
+    if not validate_tiktok_url(job.tiktok_url):
+        return "invalid TikTok URL"
+    if len(job.video_description) > 100:
+        return "video with a description longer than 100 characters"
+    if job.watermark_position not in ["top", "bottom"]:
+        return "video with an invalid watermark position"
+    if job.encoder_profile is not None and job.encoder_profile not in PROFILES:
+        return "video with an unknown encoder profile"
+    return None
+
+
+def submit_jobs(jobs) -> list[VideoJob]:
+    """
+    Adds jobs to the database without processing them, so they can be run later, e.g. by `retry_jobs`.
+
+    Args:
+        jobs (list[VideoJob]): The jobs to add. Invalid jobs, videos that already have a finished job, videos listed twice and videos whose unfinished job has different settings are skipped with a message.
+
+    Returns:
+        list[VideoJob]: The jobs that were added, with their job IDs set.
+    """
+    store = get_job_store()
+    valid_jobs = []
+    job_ids = set()
+    with store.batch():
+        for job in jobs:
+            problem = job_problem(job)
+            if problem is not None:
+                print(f"Skipping {problem}: {job.tiktok_url}")
+                continue
+            # The job ID lets an interrupted YouTube upload resume in a later run.
+            job_id = store.add_job(job.tiktok_url, job.video_description, job.watermark_position, job.encoder_profile)
+            row = store.get_job(job_id)
+            if row["status"] == DONE:
+                print(f"Skipping video already processed by job {job_id}: {job.tiktok_url}")
+                continue
+            if job_id in job_ids:
+                print(f"Skipping video listed twice: {job.tiktok_url}")
+                continue
+            if ((row["video_description"], row["watermark_position"], row["encoder_profile"])
+                    != (job.video_description, job.watermark_position, job.encoder_profile)):
+                print(f"Skipping video queued by job {job_id} with different settings, retry that job instead: "
+                      f"{job.tiktok_url}")
+                continue
+            job.job_id = job_id
+            job_ids.add(job_id)
+            valid_jobs.append(job)
+    return valid_jobs
+
+
+def run_batch(jobs) -> list[VideoJob]:
+    """
+    Adds a batch of jobs to the database and processes them.
+
+    The videos are processed by a staged pipeline: downloads, encodes and uploads run in separate worker pools connected by bounded queues, so several videos are in flight at once. Every downloaded video is fingerprinted, and videos that are near-duplicates of an earlier job's video are neither edited nor uploaded. Edited videos that are ready at about the same time are uploaded to TikTok together in one browser session. Every finished video is saved to the database, including the ones that failed, so they can be retried with `retry_jobs`. The timings and resource use of every stage are stored with the job and exported to METRICS_DIR.
+
+    Args:
+        jobs (list[VideoJob]): The jobs to process. Invalid jobs are skipped with a message.
+
+    Returns:
+        list[VideoJob]: The valid jobs after processing, with `error` set on the ones that failed.
+    """
+    valid_jobs = submit_jobs(jobs)
+    if len(valid_jobs) == 0:
+        print("No valid videos found.")
+        return []
+
+    from downloader.webdriver_pool import WebDriverPool
+    from pipeline.batch_pipeline import BatchPipeline
+    from pipeline.video_stages import build_video_stages
+
+    store = get_job_store()
+    download_workers = 2
+    pool = WebDriverPool(size=download_workers)
+    pipeline = BatchPipeline(build_video_stages(download_workers=download_workers, pool=pool, job_store=store))
+    processed = []
+    start_time = time.time()
+
     try:
-        # Get failed videos from the database in priority order
-        c.execute("SELECT * FROM video_info WHERE downloaded_tiktok IS NULL OR edited_video IS NULL OR tiktok_is_uploaded IS NULL OR youtube_video_id IS NULL")
-        failed_videos = c.fetchall()
+        for job in pipeline.run(valid_jobs):
+            store.save_job(job)
+            processed.append(job)
+            if job.error is not None:
+                print(f"Failed to process {job.tiktok_url}: {job.error}")
+            elif job.duplicate_of is not None:
+                print(f"Skipped {job.tiktok_url}, a duplicate of job {job.duplicate_of}")
+            else:
+                print(f"Finished processing {job.tiktok_url}")
+    finally:
+        pool.close()
+        export_stage_metrics()
 
-        if len(failed_videos) == 0:
-            print("No failed videos found.")
-            return True
-        
-        for video_info in failed_videos:
-            tiktok_url, video_description, watermark_position, downloaded_tiktok, edited_video, tiktok_is_uploaded, youtube_video_id = video_info
-
-            if downloaded_tiktok is None:
-                downloaded_tiktok = download_tiktok(tiktok_url)
-                
-                if downloaded_tiktok is not None:
-                    c.execute("UPDATE video_info SET downloaded_tiktok=? WHERE tiktok_url=?", (downloaded_tiktok, tiktok_url))
-                    conn.commit()
-
-            if edited_video is None:
-                edited_video = add_watermark_to_video(downloaded_tiktok, watermark_text="SportsFirm", position=watermark_position, margin=20)
-
-                if edited_video is not None:
-                    c.execute("UPDATE video_info SET edited_video=? WHERE tiktok_url=?", (edited_video, tiktok_url))
-                    conn.commit()
-
-            if tiktok_is_uploaded is None:
-                tiktok_is_uploaded = upload_tiktok(edited_video, video_description, BASE_DIR + r"\uploader\cookies.txt")
-                
-                if tiktok_is_uploaded is not None:
-                    c.execute("UPDATE video_info SET tiktok_is_uploaded=? WHERE tiktok_url=?", (tiktok_is_uploaded, tiktok_url))
-                    conn.commit()
-
-            if youtube_video_id is None:
-                youtube_uploader = YouTubeUploader()
-                youtube_video_id = youtube_uploader.upload_video(edited_video, title=video_description, description=video_description)
-
-                if youtube_video_id is not None:
-                    c.execute("UPDATE video_info SET youtube_video_id=? WHERE tiktok_url=?", (youtube_video_id, tiktok_url))
-                    conn.commit()
-    except Exception as e:
+    elapsed = time.time() - start_time
+    print(f"Processed {len(valid_jobs)} videos in {elapsed:.1f} seconds ({len(valid_jobs) * 3600 / max(elapsed, 1e-9):.1f} videos per hour).")
+    return processed
+
+
+def read_jobs_file(jobs_file) -> list[VideoJob]:
+    """
+    Reads job definitions from a file, or from standard input if `jobs_file` is "-".
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If a line is not a valid job definition.
+    """
+    if jobs_file == "-":
+        return read_jobs(sys.stdin)
+    with open(jobs_file, encoding="utf-8") as f:
+        return read_jobs(f)
+
+
+def upload_batch(jobs_file) -> bool:
+    """
+    Uploads a batch of videos listed in a file with `run_batch`.
+
+    Each line of the file describes one video, either as a JSON object with the keys "url", "description" and "position" or as the same values separated by tabs. Pass "-" to read the jobs from standard input.
+
+    Args:
+        jobs_file (str): The path to the job file, or "-" for standard input.
+
+    Returns:
+        bool: True if every video was processed successfully, False otherwise.
+    """
+    try:
+        jobs = read_jobs_file(jobs_file)
+    except (OSError, ValueError) as e:
         print(f"An error occurred: {e}")
         return False
+
+    processed = run_batch(jobs)
+    return len(processed) == len(jobs) and all(job.error is None for job in processed)
+
+
+def job_result(job) -> dict:
+    """
+    Returns the fields of a VideoJob reported by the command line interface.
+    """
+    result = dataclasses.asdict(job)
+    del result["metrics"]
+    return result
+
+
+def send_to_daemon(socket_path, jobs) -> list[dict]:
+    """
+    Submits jobs to a running daemon over its Unix socket.
+
+    Returns:
+        list[dict]: The daemon's reply for each job: its "job_id", or an "error".
+    """
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        replies = connection.makefile("r", encoding="utf-8")
+        results = []
+        for job in jobs:
+            fields = {"url": job.tiktok_url, "description": job.video_description, "position": job.watermark_position}
+            if job.encoder_profile is not None:
+                fields["profile"] = job.encoder_profile
+            connection.sendall((json.dumps(fields) + "\n").encode("utf-8"))
+            results.append(json.loads(replies.readline()))
+        return results
+
+
+def command_submit(args) -> tuple[bool, dict]:
+    if args.file:
+        jobs = read_jobs_file(args.file)
+    elif args.url:
+        jobs = [VideoJob(args.url, args.description, args.position, encoder_profile=args.profile)]
+    else:
+        raise ValueError("Give a TikTok URL or a job file")
+    if args.socket:
+        replies = send_to_daemon(args.socket, jobs)
+        for job, reply in zip(jobs, replies):
+            if "error" in reply:
+                print(f"Skipping {job.tiktok_url}: {reply['error']}")
+            job.job_id = reply.get("job_id")
+        submitted = [job for job in jobs if job.job_id is not None]
+    else:
+        submitted = submit_jobs(jobs)
+    return len(submitted) == len(jobs), {"submitted": [job_result(job) for job in submitted],
+                                         "skipped": len(jobs) - len(submitted)}
+
+
+def command_run(args) -> tuple[bool, dict]:
+    if args.jobs_file:
+        jobs = read_jobs_file(args.jobs_file)
+        processed = run_batch(jobs)
+        ok = len(processed) == len(jobs)
+    else:
+        processed = retry_jobs()
+        ok = True
+    return ok and all(job.error is None for job in processed), {"jobs": [job_result(job) for job in processed]}
+
+
+def command_retry(args) -> tuple[bool, dict]:
+    processed = retry_jobs(args.job_ids, failed_only=not args.job_ids)
+    return all(job.error is None for job in processed), {"jobs": [job_result(job) for job in processed]}
+
+
+def command_status(args) -> tuple[bool, dict]:
+    store = get_job_store()
+    if args.job_ids:
+        rows = [row for row in map(store.get_job, args.job_ids) if row is not None]
+    elif args.all:
+        rows = store.all_jobs(limit=args.limit)
     else:
-        return True
+        rows = store.pending_jobs(limit=args.limit)
+    columns = ["job_id", "tiktok_url", "video_description", "watermark_position", "encoder_profile", "status",
+               *(f"{stage}_status" for stage in STAGES), *STAGES.values(), "duplicate_of", "attempts", "last_error", "updated_at"]
+    return True, {"jobs": [{column: row[column] for column in columns} for row in rows]}
+
+
+def command_daemon(args) -> tuple[bool, dict]:
+    from downloader.webdriver_pool import WebDriverPool
+    from pipeline.daemon import PipelineDaemon
+    from pipeline.video_stages import build_retry_stages
+
+    if not args.socket and not args.drop_dir:
+        raise ValueError("Give a socket path, a drop folder or both")
+    store = get_job_store()
+    encode_workers = args.encode_workers or os.cpu_count() or 1
+    # The browser sessions stay open for as long as the daemon runs.
+    pool = WebDriverPool(size=2)
+    try:
+        daemon = PipelineDaemon(store, build_retry_stages(pool=pool, job_store=store, concurrent_encodes=encode_workers),
+                                socket_path=args.socket, drop_dir=args.drop_dir, workers=args.workers,
+                                encode_workers=encode_workers, max_in_flight=args.max_in_flight,
+                                drain_timeout=args.drain_timeout, validate=job_problem)
+        daemon.run()
+    finally:
+        pool.close()
+        export_stage_metrics()
+    return True, {"pending": len(store.pending_jobs())}
+
+
+def command_edit(args) -> tuple[bool, dict]:
+    from editor.video_editor import add_watermark_to_video
+
+    edited_video = add_watermark_to_video(args.input, args.output or "", watermark_text=args.text, position=args.position,
+                                          margin=args.margin, engine=args.engine, aspect_ratio=args.aspect_ratio,
+                                          segmented=args.segmented, profile=args.profile, platforms=args.platform)
+    return edited_video is not None, {"edited_video": edited_video}
+
+
+def command_download(args) -> tuple[bool, dict]:
+    from downloader.tiktok_downloader import download_tiktok
+
+    downloaded_tiktok = download_tiktok(args.url, backend=args.backend)
+    return downloaded_tiktok is not None, {"downloaded_tiktok": downloaded_tiktok}
+
+
+def command_upload(args) -> tuple[bool, dict]:
+    result = {}
+    if args.platform in ["tiktok", "both"]:
+        from uploader.tiktok_upload import upload_tiktok
+
+        result["tiktok_is_uploaded"] = upload_tiktok(args.video, args.description,
+                                                     args.cookies or os.path.join(BASE_DIR, "uploader", "cookies.txt"))
+    if args.platform in ["youtube", "both"]:
+        from uploader.youtube_uploader import YouTubeUploader
+
+        result["youtube_video_id"] = YouTubeUploader().upload_video(args.video, title=args.title or args.description,
+                                                                    description=args.description)
+    return all(value is not None for value in result.values()), result
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Builds the parser of the command line interface.
+    """
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", action="store_true",
+                        help="print the result as JSON on standard output, and progress messages on standard error")
+
+    parser = argparse.ArgumentParser(prog="main.py", description="Downloads TikTok videos, watermarks them and uploads them to TikTok and YouTube. Without a command, asks what to do interactively.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", parents=[common], help="add jobs to the database without processing them")
+    submit.add_argument("url", nargs="?", help="the TikTok video URL")
+    submit.add_argument("-d", "--description", default="", help="the video description (max. 100 characters)")
+    submit.add_argument("-p", "--position", default="top", choices=["top", "bottom"], help="the watermark position")
+    submit.add_argument("--profile", choices=list(PROFILES), help="the encoder profile")
+    submit.add_argument("-f", "--file", help="a job file to add instead of a single URL, or - for standard input")
+    submit.add_argument("--socket", help="hand the jobs to the daemon listening on this Unix socket")
+    submit.set_defaults(handler=command_submit)
+
+    run = commands.add_parser("run", parents=[common], help="process a job file, or every unfinished job in the database")
+    run.add_argument("jobs_file", nargs="?", help="the job file, or - for standard input")
+    run.set_defaults(handler=command_run)
+
+    retry = commands.add_parser("retry", parents=[common], help="retry the given jobs, or every job that failed")
+    retry.add_argument("job_ids", nargs="*", type=int, metavar="job_id")
+    retry.set_defaults(handler=command_retry)
+
+    status = commands.add_parser("status", parents=[common], help="list unfinished jobs and the status of their stages")
+    status.add_argument("job_ids", nargs="*", type=int, metavar="job_id")
+    status.add_argument("--all", action="store_true", help="include finished jobs")
+    status.add_argument("--limit", type=int, help="the maximum number of jobs to list")
+    status.set_defaults(handler=command_status)
+
+    daemon = commands.add_parser("daemon", parents=[common],
+                                 help="keep running and process jobs as they arrive; stops gracefully on SIGTERM")
+    daemon.add_argument("--socket", help="the Unix socket accepting jobs, one job definition per line")
+    daemon.add_argument("--drop-dir", help="a folder watched for job files ending in .jobs")
+    daemon.add_argument("--workers", type=int, default=4, help="the number of downloads and uploads run at the same time")
+    daemon.add_argument("--encode-workers", type=int, help="the number of encoding processes; defaults to the CPU cores")
+    daemon.add_argument("--max-in-flight", type=int, default=8, help="the number of jobs processed at the same time")
+    daemon.add_argument("--drain-timeout", type=float, help="the longest wait in seconds for running stages on shutdown")
+    daemon.set_defaults(handler=command_daemon)
+
+    edit = commands.add_parser("edit", parents=[common], help="add a watermark to a video file")
+    edit.add_argument("input", help="the input video file")
+    edit.add_argument("-o", "--output", help="the output video file")
+    edit.add_argument("--text", default=os.getenv("WATERMARK_TEXT", "Watermark"), help="the watermark text")
+    edit.add_argument("-p", "--position", default="top", choices=["top", "bottom"], help="the watermark position")
+    edit.add_argument("--margin", type=int, default=20, help="the margin between the watermark and the edge")
+    edit.add_argument("--aspect-ratio", default="1:1", help="the aspect ratio landscape videos are letterboxed to")
+    edit.add_argument("--engine", default="numpy", choices=["numpy", "compositor", "ffmpeg"])
+    edit.add_argument("--segmented", action="store_true", help="encode segments in parallel (ffmpeg engine only)")
+    edit.add_argument("--profile", default="balanced", choices=list(PROFILES), help="the encoder profile")
+    edit.add_argument("--platform", action="append", choices=["tiktok", "youtube"],
+                      help="a platform whose size and bitrate limits apply; can be repeated")
+    edit.set_defaults(handler=command_edit)
+
+    download = commands.add_parser("download", parents=[common], help="download a TikTok video")
+    download.add_argument("url", help="the TikTok video URL")
+    download.add_argument("--backend", default="browser", choices=["browser", "http"])
+    download.set_defaults(handler=command_download)
+
+    upload = commands.add_parser("upload", parents=[common], help="upload a video file to TikTok and/or YouTube")
+    upload.add_argument("video", help="the video file")
+    upload.add_argument("-d", "--description", required=True, help="the video description")
+    upload.add_argument("--title", help="the YouTube title; defaults to the description")
+    upload.add_argument("--platform", default="both", choices=["tiktok", "youtube", "both"])
+    upload.add_argument("--cookies", help="the TikTok cookies file")
+    upload.set_defaults(handler=command_upload)
+    return parser
+
+
+def run_cli(argv=None) -> int:
+    """
+    Runs a command of the non-interactive command line interface, e.g. `python main.py status --json`.
+
+    Args:
+        argv (list[str], optional): The command line arguments. Defaults to `sys.argv[1:]`.
+
+    Returns:
+        int: The exit code: 0 if the command succeeded, 1 otherwise.
+    """
+    args = build_parser().parse_args(argv)
+    try:
+        # With --json, standard output only carries the result, so it can be piped into other tools.
+        with contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext():
+            try:
+                ok, result = args.handler(args)
+            except (OSError, ValueError) as e:
+                print(f"An error occurred: {e}")
+                ok, result = False, {"error": str(e)}
+    finally:
+        if job_store is not None:
+            job_store.close()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        for key, value in result.items():
+            if isinstance(value, list):
+                for job in value:
+                    print("  ".join(f"{field}={field_value}" for field, field_value in job.items() if field_value is not None))
+            else:
+                print(f"{key}: {value}")
+    return 0 if ok else 1
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_cli())
+
     new_video = input("Do you want to upload a new video? (Type 'yes' or 'y' to proceed): ")
 
     if new_video.lower() == "yes" or new_video.lower() == "y":
         upload_new_video() # Upload new video
 
+    batch_videos = input("Do you want to upload a batch of videos from a file? (Type 'yes' or 'y' to proceed): ")
+
+    if batch_videos.lower() == "yes" or batch_videos.lower() == "y":
+        jobs_file = input("Enter the path to the job file ('-' to read from standard input): ").strip('"')
+        upload_batch(jobs_file) # Upload batch of videos
+
     failed_video = input("Do you want to upload a failed video? (Type 'yes' or 'y' to proceed): ")
 
     if failed_video.lower() == "yes" or failed_video.lower() == "y":
         upload_failed_video() # Upload failed video
 
     print("Goodbye!")
-    conn.close()
+    if job_store is not None:
+        job_store.close()
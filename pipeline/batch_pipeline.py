@@ -0,0 +1,300 @@
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+# Marks the end of the job stream on a stage queue.
+_END_OF_JOBS = None
+# Returned by _get once the pipeline has been stopped.
+_STOPPED = object()
+# Returned by _get when its deadline passes before an item arrives.
+_TIMED_OUT = object()
+# How often threads blocked on a stage queue check whether the pipeline has been stopped, in seconds.
+_STOP_POLL_INTERVAL = 0.1
+# How long stopping the pipeline waits for its threads, in seconds. Threads still running a stage after that are left to finish on their own.
+_STOP_TIMEOUT = 5.0
+
+
+@dataclass
+class VideoJob:
+    """
+    A single video moving through the pipeline, mirroring a row of the 'video_info' table.
+    """
+    tiktok_url: str
+    video_description: str
+    watermark_position: str = "top"
+    downloaded_tiktok: str | None = None
+    edited_video: str | None = None
+    tiktok_is_uploaded: bool | None = None
+    youtube_video_id: str | None = None
+    error: str | None = None
+    job_id: int | None = None
+    encoder_profile: str | None = None
+    fingerprint_id: int | None = None
+    # The ID of the earlier job with the same video. Duplicates skip the stages after fingerprinting.
+    duplicate_of: int | None = None
+    # StageMetrics recorded by instrumented stages, until they are saved to the job store.
+    metrics: list = field(default_factory=list)
+
+
+def job_from_row(row) -> VideoJob:
+    """
+    Creates the VideoJob of a job store row.
+    """
+    return VideoJob(row["tiktok_url"], row["video_description"], row["watermark_position"], row["downloaded_tiktok"],
+                    row["edited_video"], row["tiktok_is_uploaded"], row["youtube_video_id"], job_id=row["job_id"],
+                    encoder_profile=row["encoder_profile"], fingerprint_id=row["fingerprint_id"],
+                    duplicate_of=row["duplicate_of"])
+
+
+class Stage:
+    def __init__(self, name, func, workers=None, cpu_bound=False, batch_size=1, batch_wait=0.0):
+        """
+        Describes one step of the pipeline.
+
+        Args:
+            name (str): The name of the stage, used in log messages.
+            func (callable): A function that takes a VideoJob and returns the updated VideoJob. CPU-bound functions must be picklable (defined at module level). If `batch_size` is greater than 1, it instead takes a list of VideoJobs and returns a list of the same length holding, for each job, the updated VideoJob or the exception that made it fail.
+            workers (int, optional): The number of jobs the stage processes at the same time. Defaults to the number of CPU cores for CPU-bound stages and 2 otherwise.
+            cpu_bound (bool, optional): Whether the stage runs in a process pool instead of worker threads. Defaults to False.
+            batch_size (int, optional): The largest number of jobs passed to `func` at once. Defaults to 1.
+            batch_wait (float, optional): How many seconds a worker holding fewer than `batch_size` jobs waits for more to arrive before processing them. Defaults to 0, i.e. only the jobs already waiting are batched.
+        """
+        self.name = name
+        self.func = func
+        self.cpu_bound = cpu_bound
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        if workers is None:
+            workers = (os.cpu_count() or 1) if cpu_bound else 2
+        self.workers = max(1, workers)
+
+
+class BatchPipeline:
+    def __init__(self, stages, queue_size=2):
+        """
+        Runs video jobs through a chain of stages connected by bounded queues.
+
+        Every stage has its own pool of workers, so while one video is being encoded the next one can be downloading and the previous one uploading.
+
+        Args:
+            stages (list[Stage]): The stages in the order a job passes through them.
+            queue_size (int, optional): The maximum number of jobs waiting in front of each stage. Defaults to 2.
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+
+    def run(self, jobs):
+        """
+        Feeds the jobs into the pipeline and yields them as they leave the last stage.
+
+        Jobs that fail in one stage have their `error` set and skip the remaining stages, so one bad video does not stop the batch. Jobs found to be duplicates skip the remaining stages too. If the caller stops iterating early, the pipeline stops taking new jobs and its threads exit.
+
+        Args:
+            jobs (iterable[VideoJob]): The jobs to process.
+
+        Yields:
+            VideoJob: Each job once it has passed through every stage, in completion order.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        queues.append(queue.Queue())
+
+        executors = [ProcessPoolExecutor(max_workers=stage.workers) if stage.cpu_bound else None
+                     for stage in self.stages]
+        stop = threading.Event()
+
+        threads = [threading.Thread(target=self._feed, args=(jobs, queues[0], stop), daemon=True)]
+        for index, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work,
+                    args=(stage, executors[index], queues[index], queues[index + 1], remaining, lock, stop),
+                    daemon=True))
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                job = queues[-1].get()
+                if job is _END_OF_JOBS:
+                    break
+                yield job
+        finally:
+            stop.set()
+            deadline = time.monotonic() + _STOP_TIMEOUT
+            for thread in threads:
+                thread.join(timeout=max(0.0, deadline - time.monotonic()))
+            for executor in executors:
+                if executor is not None:
+                    executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _feed(jobs, output_queue, stop):
+        for job in jobs:
+            if not _put(output_queue, job, stop):
+                return
+        _put(output_queue, _END_OF_JOBS, stop)
+
+    @staticmethod
+    def _work(stage, executor, input_queue, output_queue, remaining, lock, stop):
+        while True:
+            job = _get(input_queue, stop)
+            if job is _STOPPED:
+                return
+            if job is _END_OF_JOBS:
+                # Let the sibling workers see the end marker too; the last one to stop passes it on.
+                _put(input_queue, _END_OF_JOBS, stop)
+                with lock:
+                    remaining[0] -= 1
+                    if remaining[0] == 0:
+                        _put(output_queue, _END_OF_JOBS, stop)
+                return
+
+            if stage.batch_size > 1:
+                for job in BatchPipeline._run_batch(stage, BatchPipeline._collect_batch(stage, job, input_queue, stop)):
+                    if not _put(output_queue, job, stop):
+                        return
+                continue
+
+            if job.error is None and job.duplicate_of is None:
+                try:
+                    if executor is not None:
+                        job = executor.submit(stage.func, job).result()
+                    else:
+                        job = stage.func(job)
+                except Exception as e:
+                    print(f"An error occurred in the {stage.name} stage: {e}")
+                    job.error = f"{stage.name}: {e}"
+                    if executor is not None:
+                        # The job was updated in another process, so only the exception carries its metrics back.
+                        job.metrics += getattr(e, "stage_metrics", [])
+
+            if not _put(output_queue, job, stop):
+                return
+
+    @staticmethod
+    def _collect_batch(stage, job, input_queue, stop) -> list[VideoJob]:
+        """
+        Takes up to `stage.batch_size` jobs from the queue, starting with `job`, waiting at most `stage.batch_wait` seconds for more. Returns no jobs once the pipeline is stopped.
+        """
+        batch = [job]
+        deadline = time.monotonic() + stage.batch_wait
+        while len(batch) < stage.batch_size:
+            job = _get(input_queue, stop, deadline)
+            if job is _STOPPED:
+                return []
+            if job is _TIMED_OUT:
+                break
+            if job is _END_OF_JOBS:
+                # Leave the end marker for the next call of _work.
+                _put(input_queue, _END_OF_JOBS, stop)
+                break
+            batch.append(job)
+        return batch
+
+    @staticmethod
+    def _run_batch(stage, jobs) -> list[VideoJob]:
+        """
+        Runs a batch stage on the jobs that have not failed yet.
+        """
+        pending = [job for job in jobs if job.error is None and job.duplicate_of is None]
+        if len(pending) == 0:
+            return jobs
+
+        try:
+            results = stage.func(pending)
+        except Exception as e:
+            results = [e] * len(pending)
+
+        finished = [job for job in jobs if job.error is not None or job.duplicate_of is not None]
+        for job, result in zip(pending, results):
+            if isinstance(result, Exception):
+                print(f"An error occurred in the {stage.name} stage: {result}")
+                job.error = f"{stage.name}: {result}"
+                result = job
+            finished.append(result)
+        return finished
+
+
+def _put(output_queue, item, stop) -> bool:
+    """
+    Puts an item on a bounded queue, giving up once the pipeline is stopped.
+
+    Returns:
+        bool: Whether the item was put on the queue.
+    """
+    while not stop.is_set():
+        try:
+            output_queue.put(item, timeout=_STOP_POLL_INTERVAL)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(input_queue, stop, deadline=None):
+    """
+    Takes the next item from a queue, or returns _STOPPED once the pipeline is stopped, or _TIMED_OUT once the `time.monotonic()` deadline has passed, if one is given.
+    """
+    while not stop.is_set():
+        timeout = _STOP_POLL_INTERVAL
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                return _TIMED_OUT
+        try:
+            return input_queue.get(timeout=timeout)
+        except queue.Empty:
+            pass
+    return _STOPPED
+
+
+def read_jobs(lines) -> list[VideoJob]:
+    """
+    Parses batch job definitions.
+
+    Each non-empty line is either a JSON object with the keys "url", "description", "position" and optionally "profile" (the encoder profile), or the same values separated by tabs. Lines starting with "#" are ignored.
+
+    Args:
+        lines (iterable[str]): The lines of the job file.
+
+    Returns:
+        list[VideoJob]: The parsed jobs.
+
+    Raises:
+        ValueError: If a line cannot be parsed.
+    """
+    jobs = []
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        if line.startswith("{"):
+            try:
+                fields = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {line_number}: {e}") from e
+            url = fields.get("url")
+            description = fields.get("description", "")
+            position = fields.get("position", "top")
+            profile = fields.get("profile")
+        else:
+            parts = line.split("\t")
+            if len(parts) < 2:
+                raise ValueError(f"Line {line_number}: expected 'url<TAB>description[<TAB>position[<TAB>profile]]'")
+            url, description = parts[0], parts[1]
+            position = parts[2] if len(parts) > 2 else "top"
+            profile = parts[3] if len(parts) > 3 else None
+
+        if not url:
+            raise ValueError(f"Line {line_number}: missing URL")
+        jobs.append(VideoJob(url.strip(), description.strip(), position.strip().lower(),
+                             encoder_profile=profile.strip() if profile else None))
+    return jobs
@@ -0,0 +1,337 @@
+import asyncio
+import functools
+import json
+import os
+import random
+import signal
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from pipeline.batch_pipeline import VideoJob, job_from_row, read_jobs
+from pipeline.job_store import DONE, FAILED, PENDING, RUNNING, STAGES, OriginalNotFinished
+
+# Job files are only picked up from the drop folder once they have this extension, so a file that is still being written (under another name) is never read half-way.
+DROP_EXTENSION = ".jobs"
+
+
+class PipelineDaemon:
+    def __init__(self, job_store, stages, socket_path=None, drop_dir=None, workers=4, encode_workers=None,
+                 process_stages=("edit",), max_in_flight=8, max_attempts=4, base_delay=2.0, max_delay=120.0,
+                 poll_interval=2.0, drain_timeout=None, validate=None):
+        """
+        Keeps running and streams jobs through the pipeline stages as they arrive.
+
+        An asyncio loop accepts jobs from a Unix socket and from a drop folder, stores them in the job store and moves every job through its unfinished stages. I/O-bound stages run on a long-lived thread pool and CPU-bound stages (encoding) on a long-lived process pool, so warm state such as browser sessions, YouTube clients and cached watermarks survives from one job to the next. Failed stages are retried with exponential backoff like the RetryScheduler does.
+
+        A job whose video turns out to be a near-duplicate of a job that has not finished yet waits for that job without holding its place or counting a failed attempt, then is looked up again.
+
+        Every stage transition is written to the job store, which makes restarts safe: on start-up, every unfinished job is picked up again from its first unfinished stage. On SIGTERM or SIGINT the daemon stops accepting jobs, lets every running stage finish and record its result, and exits; the remaining stages run after the next start.
+
+        The socket speaks newline-delimited text. Each request line is a job definition in the job file format of `read_jobs`, answered with a JSON line holding its "job_id" or an "error", or the JSON object {"command": "status"}, answered with the IDs of the jobs in flight.
+
+        Parameters:
+            job_store (JobStore): Where jobs and the results of their stages are stored.
+            stages (list[ScheduledStage]): The stages in the order a job passes through them.
+            socket_path (str, optional): The path of the Unix socket accepting jobs. Defaults to no socket.
+            drop_dir (str, optional): A folder watched for job files ending in ".jobs". Read files are moved to its "processed" subfolder, unreadable ones to "rejected". Defaults to no drop folder.
+            workers (int): The number of I/O-bound stages run at the same time.
+            encode_workers (int, optional): The number of processes running CPU-bound stages. Defaults to the number of CPU cores.
+            process_stages (tuple[str]): The names of the CPU-bound stages. Their functions must be picklable.
+            max_in_flight (int): The number of jobs moving through the stages at the same time. Other jobs wait in memory.
+            max_attempts (int): The number of times a stage is tried before its job is given up on until the next start.
+            base_delay (float): The backoff delay in seconds after the first failure.
+            max_delay (float): The longest backoff delay in seconds.
+            poll_interval (float): How often the drop folder is checked, in seconds.
+            drain_timeout (float, optional): How long to wait for running stages on shutdown. Stages still running then are recorded when they finish, before the process exits. Defaults to waiting until they finish.
+            validate (callable, optional): Called with each submitted VideoJob; returns why the job is rejected, or None to accept it.
+        """
+        self.job_store = job_store
+        self.stages = stages
+        self.socket_path = socket_path
+        self.drop_dir = drop_dir
+        self.workers = workers
+        self.encode_workers = encode_workers or os.cpu_count() or 1
+        self.process_stages = set(process_stages)
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        self.validate = validate
+
+        self._tasks = {}
+        self._stopping = None
+        self._slots = None
+        self._threads = None
+        self._processes = None
+
+    def run(self):
+        """
+        Runs the daemon until it receives SIGTERM or SIGINT.
+        """
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        """
+        Serves jobs until `stop` is called or a SIGTERM or SIGINT arrives, then drains.
+        """
+        loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pipeline-stage")
+        self._processes = ProcessPoolExecutor(max_workers=self.encode_workers)
+        for signal_number in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signal_number, self.stop)
+
+        server = None
+        watcher = None
+        try:
+            restored = self.job_store.pending_jobs()
+            for row in restored:
+                self._schedule(job_from_row(row))
+            print(f"Daemon started, restored {len(restored)} unfinished jobs.")
+
+            if self.socket_path is not None:
+                if os.path.exists(self.socket_path):
+                    os.remove(self.socket_path)
+                server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+                print(f"Accepting jobs on {self.socket_path}")
+            if self.drop_dir is not None:
+                watcher = asyncio.create_task(self._watch_drop_dir())
+                print(f"Watching {self.drop_dir} for job files")
+
+            await self._stopping.wait()
+        finally:
+            print("Stopping: no new jobs are accepted, waiting for running stages to finish.")
+            if server is not None:
+                # Stop listening, without waiting for connected clients to hang up.
+                server.close()
+                os.remove(self.socket_path)
+            if watcher is not None:
+                watcher.cancel()
+            await self._drain()
+            for signal_number in (signal.SIGTERM, signal.SIGINT):
+                loop.remove_signal_handler(signal_number)
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._processes.shutdown(wait=False, cancel_futures=True)
+            print("Daemon stopped.")
+
+    def stop(self):
+        """
+        Asks the daemon to drain and exit. Must be called from the daemon's event loop.
+        """
+        if self._stopping is not None:
+            self._stopping.set()
+
+    def submit(self, job) -> int:
+        """
+        Stores a job and schedules it, unless the same video already has a finished job or one in flight.
+
+        Returns:
+            int: The job ID.
+
+        Raises:
+            ValueError: If the job is rejected by `validate` or the daemon is stopping.
+        """
+        if self._stopping is not None and self._stopping.is_set():
+            raise ValueError("the daemon is stopping")
+        if self.validate is not None:
+            problem = self.validate(job)
+            if problem is not None:
+                raise ValueError(problem)
+
+        job.job_id = self.job_store.add_job(job.tiktok_url, job.video_description, job.watermark_position,
+                                            job.encoder_profile)
+        row = self.job_store.get_job(job.job_id)
+        if row["status"] != DONE and job.job_id not in self._tasks:
+            self._schedule(job_from_row(row))
+        return job.job_id
+
+    def backoff(self, attempt) -> float:
+        """
+        Returns the delay before the next try after `attempt` failed tries ("full jitter").
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _schedule(self, job):
+        task = asyncio.create_task(self._process(job))
+        self._tasks[job.job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.job_id, None))
+
+    async def _process(self, job):
+        while not self._stopping.is_set():
+            async with self._slots:
+                original_job_id = await self._run_stages(job)
+            if original_job_id is None:
+                return
+            await self._wait_for_job(original_job_id)
+
+    async def _run_stages(self, job) -> int | None:
+        """
+        Runs the unfinished stages of a job.
+
+        Returns:
+            int | None: The ID of the unfinished job whose video this job's video duplicates, or None once the job is finished, given up on or the daemon is stopping.
+        """
+        attempts = 0
+        while not self._stopping.is_set():
+            stage = self._next_stage(job)
+            if stage is None:
+                if job.duplicate_of is not None:
+                    print(f"Skipped {job.tiktok_url}, a duplicate of job {job.duplicate_of}")
+                else:
+                    print(f"Finished processing {job.tiktok_url}")
+                return None
+            if not await self._take_token(stage):
+                return None
+            self._record(job, stage.name, RUNNING, None, None)
+            try:
+                job = await self._run_stage(stage, job)
+            except OriginalNotFinished as e:
+                self._record(job, stage.name, PENDING, None, None)
+                return e.original_job_id
+            except Exception as e:
+                attempts += 1
+                self._record(job, stage.name, FAILED, None, str(e))
+                if attempts >= self.max_attempts:
+                    print(f"Giving up on {job.tiktok_url} after {attempts} failed {stage.name} attempts: {e}")
+                    return None
+                try:
+                    # Waiting for a retry ends early on shutdown; the stage is retried after the next start.
+                    await asyncio.wait_for(self._stopping.wait(), self.backoff(attempts))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            attempts = 0
+            self._record(job, stage.name, DONE, getattr(job, STAGES[stage.name]), None)
+
+    async def _wait_for_job(self, job_id):
+        """
+        Waits until a job in flight finishes, or for one drop folder poll interval if it is run elsewhere, ending early on shutdown.
+        """
+        task = self._tasks.get(job_id)
+        stopping = asyncio.create_task(self._stopping.wait())
+        await asyncio.wait([stopping] if task is None else [stopping, task], timeout=None if task else self.poll_interval,
+                           return_when=asyncio.FIRST_COMPLETED)
+        stopping.cancel()
+
+    async def _take_token(self, stage) -> bool:
+        """
+        Waits on the event loop until the stage's rate limit lets it run, so no worker thread is held up meanwhile.
+
+        Returns:
+            bool: True once a token is taken, False if the daemon started stopping first.
+        """
+        while not self._stopping.is_set():
+            wait = stage.rate_limit.try_acquire() if stage.rate_limit is not None else 0
+            if wait == 0:
+                return True
+            try:
+                await asyncio.wait_for(self._stopping.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+        return False
+
+    async def _run_stage(self, stage, job) -> VideoJob:
+        executor = self._processes if stage.name in self.process_stages else self._threads
+        future = executor.submit(stage.func, job)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # The stage keeps running after the drain timeout, so its outcome is recorded once it finishes.
+            future.add_done_callback(functools.partial(self._record_late, job, stage.name))
+            raise
+        except Exception as e:
+            if executor is self._processes:
+                # The job was updated in another process, so only the exception carries its metrics back.
+                job.metrics += getattr(e, "stage_metrics", [])
+            raise
+
+    def _next_stage(self, job):
+        if job.duplicate_of is not None:
+            return None
+        for stage in self.stages:
+            if getattr(job, STAGES[stage.name]) is None:
+                return stage
+        return None
+
+    def _record(self, job, stage_name, status, result, error):
+        try:
+            with self.job_store.batch():
+                self.job_store.update_stage(job.job_id, stage_name, status, result, error)
+                self.job_store.add_metrics(job.job_id, job.metrics)
+            job.metrics.clear()
+        except Exception as e:
+            print(f"An error occurred while recording the {stage_name} stage: {e}")
+
+    def _record_late(self, job, stage_name, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            job = future.result()
+            self._record(job, stage_name, DONE, getattr(job, STAGES[stage_name]), None)
+        else:
+            job.metrics += getattr(error, "stage_metrics", [])
+            self._record(job, stage_name, FAILED, None, str(error))
+
+    async def _drain(self):
+        tasks = list(self._tasks.values())
+        if len(tasks) == 0:
+            return
+        _, still_running = await asyncio.wait(tasks, timeout=self.drain_timeout)
+        for task in still_running:
+            task.cancel()
+        if still_running:
+            print(f"Gave up waiting for {len(still_running)} jobs; their running stages are recorded when they finish, "
+                  "the other stages run after the next start.")
+            await asyncio.wait(still_running)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while not reader.at_eof():
+                line = (await reader.readline()).decode("utf-8").strip()
+                if not line:
+                    continue
+                writer.write((json.dumps(self._handle_request(line)) + "\n").encode("utf-8"))
+                await writer.drain()
+        except (ConnectionError, UnicodeDecodeError) as e:
+            print(f"An error occurred while reading a request: {e}")
+        finally:
+            writer.close()
+
+    def _handle_request(self, line) -> dict:
+        try:
+            if line.startswith("{") and json.loads(line).get("command") == "status":
+                return {"in_flight": sorted(self._tasks), "stopping": self._stopping.is_set()}
+            jobs = read_jobs([line])
+            if len(jobs) != 1:
+                raise ValueError("expected one job definition per line")
+            return {"job_id": self.submit(jobs[0])}
+        except ValueError as e:
+            return {"error": str(e)}
+
+    async def _watch_drop_dir(self):
+        for folder in ("processed", "rejected"):
+            os.makedirs(os.path.join(self.drop_dir, folder), exist_ok=True)
+        while True:
+            for entry in sorted(os.scandir(self.drop_dir), key=lambda entry: entry.name):
+                if entry.is_file() and entry.name.endswith(DROP_EXTENSION):
+                    self._read_drop_file(entry.path)
+            await asyncio.sleep(self.poll_interval)
+
+    def _read_drop_file(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                jobs = read_jobs(f)
+        except (OSError, ValueError) as e:
+            print(f"Rejected job file {path}: {e}")
+            os.replace(path, os.path.join(self.drop_dir, "rejected", os.path.basename(path)))
+            return
+        for job in jobs:
+            try:
+                self.submit(job)
+            except ValueError as e:
+                print(f"Skipping {job.tiktok_url}: {e}")
+        os.replace(path, os.path.join(self.drop_dir, "processed", os.path.basename(path)))
+
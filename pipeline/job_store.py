@@ -0,0 +1,586 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from downloader.download_cache import canonicalize_tiktok_url
+
+# Pipeline stages, in order, with the column holding each stage's result.
+STAGES = {
+    "download": "downloaded_tiktok",
+    "fingerprint": "fingerprint_id",
+    "edit": "edited_video",
+    "tiktok": "tiktok_is_uploaded",
+    "youtube": "youtube_video_id",
+}
+# The stages of the old flat video_info table, whose jobs are not fingerprinted.
+LEGACY_STAGES = {stage: column for stage, column in STAGES.items() if stage != "fingerprint"}
+PENDING = "pending"
+RUNNING = "running"
+FAILED = "failed"
+DONE = "done"
+# The status of the stages a duplicate video never runs.
+SKIPPED = "skipped"
+
+# Fingerprint hashes are looked up by FINGERPRINT_BANDS bands of their bits. Two hashes at most FINGERPRINT_BANDS - 1 bits
+# apart have at least one equal band, so an indexed lookup per band finds every close hash without scanning the table.
+# There is one band more than MAX_VIDEO_DISTANCE in editor.video_fingerprint, so every near-duplicate is found.
+FINGERPRINT_BANDS = 13
+# The first bit of each band, and the end of the last one: bands of 4 and 5 bits.
+BAND_STARTS = [band * 64 // FINGERPRINT_BANDS for band in range(FINGERPRINT_BANDS + 1)]
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS jobs
+       (job_id INTEGER PRIMARY KEY,
+        canonical_url TEXT NOT NULL UNIQUE,
+        tiktok_url TEXT NOT NULL,
+        video_description TEXT,
+        watermark_position TEXT,
+        encoder_profile TEXT,
+        downloaded_tiktok TEXT,
+        fingerprint_id INTEGER,
+        duplicate_of INTEGER,
+        edited_video TEXT,
+        tiktok_is_uploaded INTEGER,
+        youtube_video_id TEXT,
+        youtube_upload_uri TEXT,
+        youtube_upload_offset INTEGER NOT NULL DEFAULT 0,
+        youtube_upload_file TEXT,
+        youtube_upload_size INTEGER,
+        download_status TEXT NOT NULL DEFAULT 'pending',
+        fingerprint_status TEXT NOT NULL DEFAULT 'pending',
+        edit_status TEXT NOT NULL DEFAULT 'pending',
+        tiktok_status TEXT NOT NULL DEFAULT 'pending',
+        youtube_status TEXT NOT NULL DEFAULT 'pending',
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL)''',
+    # Partial indexes only contain unfinished jobs, so finding work stays cheap however many jobs are done.
+    "CREATE INDEX IF NOT EXISTS jobs_unfinished ON jobs (job_id) WHERE status != 'done'",
+    '''CREATE TABLE IF NOT EXISTS stage_metrics
+       (metric_id INTEGER PRIMARY KEY,
+        job_id INTEGER NOT NULL REFERENCES jobs (job_id),
+        stage TEXT NOT NULL,
+        started_at REAL NOT NULL,
+        wall_seconds REAL NOT NULL,
+        cpu_seconds REAL NOT NULL,
+        -- Only recorded for stages running in a process pool worker.
+        peak_rss_bytes INTEGER,
+        bytes_in INTEGER,
+        bytes_out INTEGER,
+        fps REAL,
+        outcome TEXT NOT NULL,
+        error TEXT)''',
+    "CREATE INDEX IF NOT EXISTS stage_metrics_job ON stage_metrics (job_id)",
+    "CREATE INDEX IF NOT EXISTS stage_metrics_started ON stage_metrics (started_at)",
+    f'''CREATE TABLE IF NOT EXISTS fingerprints
+       (fingerprint_id INTEGER PRIMARY KEY,
+        job_id INTEGER NOT NULL REFERENCES jobs (job_id),
+        video_hash INTEGER NOT NULL,
+        {", ".join(f"band{band} INTEGER NOT NULL" for band in range(FINGERPRINT_BANDS))},
+        duration REAL NOT NULL,
+        segment_hashes BLOB NOT NULL,
+        audio_energy BLOB,
+        created_at REAL NOT NULL)''',
+]
+
+# Created after the missing columns are added, since older databases lack the status columns of newer stages and the
+# band columns of a finer fingerprint index.
+STAGE_INDEXES = [
+    f"CREATE INDEX IF NOT EXISTS jobs_{stage}_unfinished ON jobs (job_id) WHERE {stage}_status != 'done'"
+    for stage in STAGES
+] + [
+    f"CREATE INDEX IF NOT EXISTS fingerprints_band{band} ON fingerprints (band{band}, duration)"
+    for band in range(FINGERPRINT_BANDS)
+]
+
+# Columns added after the job table was introduced, with their definitions, added to older databases on open.
+ADDED_COLUMNS = {
+    "youtube_upload_uri": "TEXT",
+    "youtube_upload_offset": "INTEGER NOT NULL DEFAULT 0",
+    "encoder_profile": "TEXT",
+    "fingerprint_id": "INTEGER",
+    "fingerprint_status": "TEXT NOT NULL DEFAULT 'pending'",
+    "duplicate_of": "INTEGER",
+    "youtube_upload_file": "TEXT",
+    "youtube_upload_size": "INTEGER",
+}
+
+
+def canonical_job_url(url) -> str:
+    """
+    Returns the key identifying a video's job: its TikTok video ID when the URL contains one, otherwise the URL without query string or fragment.
+    """
+    video_id = canonicalize_tiktok_url(url)
+    if video_id is not None:
+        return f"tiktok:{video_id}"
+    parts = urlsplit(url.strip())
+    return f"{parts.scheme}://{parts.netloc}{parts.path}".rstrip("/")
+
+
+class OriginalNotFinished(RuntimeError):
+    """
+    Raised by the fingerprint stage when a video is a near-duplicate of the video of a job that has not finished yet, so the job can wait for that job instead of failing.
+    """
+
+    def __init__(self, original_job_id):
+        super().__init__(original_job_id)
+        self.original_job_id = original_job_id
+
+    def __str__(self):
+        return f"job {self.original_job_id} with the same video has not finished yet"
+
+
+class JobStore:
+    def __init__(self, db_path):
+        """
+        Stores video jobs and the status of each of their stages in SQLite.
+
+        The database runs in WAL mode, so readers never block the writer. Every thread gets its own connection. Writes are committed immediately unless they are made inside `batch()`. An existing flat `video_info` table is migrated into the job table the first time the database is opened.
+
+        Parameters:
+            db_path (str): The path to the SQLite database.
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        conn = self.connection
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self._add_missing_columns(conn)
+            self._add_missing_bands(conn)
+            for statement in STAGE_INDEXES:
+                conn.execute(statement)
+            self._migrate_video_info(conn)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        The calling thread's connection.
+        """
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = conn
+            self._local.batch_depth = 0
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups the writes made in a `with` block into a single commit.
+        """
+        conn = self.connection
+        self._local.batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            if self._local.batch_depth == 1:
+                conn.rollback()
+            raise
+        else:
+            if self._local.batch_depth == 1:
+                conn.commit()
+        finally:
+            self._local.batch_depth -= 1
+
+    def _write(self, sql, parameters=()) -> sqlite3.Cursor:
+        conn = self.connection
+        cursor = conn.execute(sql, parameters)
+        if self._local.batch_depth == 0:
+            conn.commit()
+        return cursor
+
+    def add_job(self, tiktok_url, video_description, watermark_position, encoder_profile=None) -> int:
+        """
+        Adds a job for a video, unless the same video already has one.
+
+        Args:
+            tiktok_url (str): The TikTok video URL.
+            video_description (str): The video description.
+            watermark_position (str): "top" or "bottom".
+            encoder_profile (str, optional): The encoder profile of the video. Defaults to the editor's default profile.
+
+        Returns:
+            int: The ID of the new or existing job.
+        """
+        now = time.time()
+        canonical_url = canonical_job_url(tiktok_url)
+        self._write('''INSERT INTO jobs (canonical_url, tiktok_url, video_description, watermark_position, encoder_profile,
+                                           created_at, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (canonical_url) DO NOTHING''',
+                    (canonical_url, tiktok_url, video_description, watermark_position, encoder_profile, now, now))
+        row = self.connection.execute("SELECT job_id FROM jobs WHERE canonical_url=?", (canonical_url,)).fetchone()
+        return row["job_id"]
+
+    def update_stage(self, job_id, stage, status, result=None, error=None):
+        """
+        Records the outcome of a stage of a job.
+
+        Args:
+            job_id (int): The job ID.
+            stage (str): "download", "fingerprint", "edit", "tiktok" or "youtube".
+            status (str): The new status of the stage ("pending", "running", "failed" or "done").
+            result (optional): The stage's result (file path, fingerprint ID, upload flag or YouTube video ID), stored when not None.
+            error (str, optional): The error message of a failed attempt.
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage: {stage}")
+
+        assignments = [f"{stage}_status=?", "updated_at=?"]
+        parameters = [status, time.time()]
+        if result is not None:
+            assignments.append(f"{STAGES[stage]}=?")
+            parameters.append(result)
+        if status == FAILED:
+            assignments += ["attempts=attempts+1", "last_error=?"]
+            parameters.append(error)
+
+        with self.batch():
+            self._write(f"UPDATE jobs SET {', '.join(assignments)} WHERE job_id=?", (*parameters, job_id))
+            self._update_overall_status(job_id)
+
+    def save_job(self, job) -> int:
+        """
+        Stores the results and stage metrics of a VideoJob that has been through the pipeline, creating its job if needed.
+
+        If the job failed, the stage named in its "<stage name>: <error>" message, such as "tiktok upload: ...", is marked as failed.
+
+        Args:
+            job (VideoJob): The job.
+
+        Returns:
+            int: The job ID.
+        """
+        with self.batch():
+            job_id = job.job_id or self.add_job(job.tiktok_url, job.video_description, job.watermark_position,
+                                                job.encoder_profile)
+            for stage, column in STAGES.items():
+                result = getattr(job, column)
+                if result is not None:
+                    self.update_stage(job_id, stage, DONE, result)
+            if job.error is not None:
+                # Batch pipeline stage names start with the job store stage, e.g. "youtube upload".
+                stage = job.error.partition(":")[0].split(" ")[0]
+                if stage in STAGES:
+                    self.update_stage(job_id, stage, FAILED, error=job.error)
+                else:
+                    self._write("UPDATE jobs SET attempts=attempts+1, last_error=?, updated_at=? WHERE job_id=?",
+                                (job.error, time.time(), job_id))
+            self.add_metrics(job_id, job.metrics)
+        job.metrics.clear()
+        return job_id
+
+    def add_metrics(self, job_id, records):
+        """
+        Stores the StageMetrics recorded for a job.
+        """
+        for record in records:
+            self._write('''INSERT INTO stage_metrics (job_id, stage, started_at, wall_seconds, cpu_seconds, peak_rss_bytes,
+                                                     bytes_in, bytes_out, fps, outcome, error)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                        (job_id, record.stage, record.started_at, record.wall_seconds, record.cpu_seconds,
+                         record.peak_rss_bytes, record.bytes_in, record.bytes_out, record.fps, record.outcome, record.error))
+
+    def stage_metrics(self, job_id=None, since=None) -> list[sqlite3.Row]:
+        """
+        Returns stored stage metrics, oldest first.
+
+        Args:
+            job_id (int, optional): Only return the metrics of this job.
+            since (float, optional): Only return runs started at or after this Unix time.
+
+        Returns:
+            list[sqlite3.Row]: The metric rows.
+        """
+        conditions, parameters = [], []
+        if job_id is not None:
+            conditions.append("job_id=?")
+            parameters.append(job_id)
+        if since is not None:
+            conditions.append("started_at>=?")
+            parameters.append(since)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self.connection.execute(f"SELECT * FROM stage_metrics{where} ORDER BY metric_id", parameters).fetchall()
+
+    def get_job(self, job_id) -> sqlite3.Row | None:
+        """
+        Returns a job's row, or None if it does not exist.
+        """
+        return self.connection.execute("SELECT * FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+
+    def pending_jobs(self, stage=None, limit=None) -> list[sqlite3.Row]:
+        """
+        Returns the jobs that still have unfinished stages, oldest first.
+
+        Args:
+            stage (str, optional): Only return jobs for which this stage is unfinished. Defaults to any stage.
+            limit (int, optional): The maximum number of jobs to return.
+
+        Returns:
+            list[sqlite3.Row]: The job rows.
+        """
+        if stage is None:
+            condition = "status != 'done'"
+        elif stage in STAGES:
+            condition = f"{stage}_status != 'done' AND {stage}_status != 'skipped'"
+        else:
+            raise ValueError(f"Unknown stage: {stage}")
+        sql = f"SELECT * FROM jobs WHERE {condition} ORDER BY job_id"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self.connection.execute(sql).fetchall()
+
+    def unfinished_downloads(self) -> list[str]:
+        """
+        Returns the downloaded videos of the jobs that still have unfinished stages, which later stages or retries still read.
+        """
+        rows = self.connection.execute(
+            "SELECT downloaded_tiktok FROM jobs WHERE status != 'done' AND downloaded_tiktok IS NOT NULL").fetchall()
+        return [row["downloaded_tiktok"] for row in rows]
+
+    def all_jobs(self, limit=None) -> list[sqlite3.Row]:
+        """
+        Returns every job, finished or not, newest first.
+
+        Args:
+            limit (int, optional): The maximum number of jobs to return.
+
+        Returns:
+            list[sqlite3.Row]: The job rows.
+        """
+        sql = "SELECT * FROM jobs ORDER BY job_id DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self.connection.execute(sql).fetchall()
+
+    def mark_duplicate(self, job_id, original_job_id):
+        """
+        Marks a job whose video is a near-duplicate of an earlier job's video. Its unfinished stages are skipped, so the video is neither edited nor uploaded again.
+
+        Args:
+            job_id (int): The job ID.
+            original_job_id (int): The ID of the job with the same video.
+        """
+        skipped = ", ".join(f"{stage}_status = CASE WHEN {stage}_status = 'done' THEN 'done' ELSE 'skipped' END"
+                            for stage in STAGES)
+        with self.batch():
+            self._write(f"UPDATE jobs SET duplicate_of=?, {skipped}, updated_at=? WHERE job_id=?",
+                        (original_job_id, time.time(), job_id))
+            self._update_overall_status(job_id)
+
+    def add_fingerprint(self, job_id, fingerprint) -> int:
+        """
+        Adds the fingerprint of a job's video to the fingerprint index.
+
+        Args:
+            job_id (int): The job ID.
+            fingerprint (VideoFingerprint): The fingerprint.
+
+        Returns:
+            int: The fingerprint ID.
+        """
+        audio_energy = fingerprint.audio_energy.tobytes() if fingerprint.audio_energy is not None else None
+        cursor = self._write(f'''INSERT INTO fingerprints (job_id, video_hash, {", ".join(f"band{band}" for band in range(FINGERPRINT_BANDS))},
+                                                          duration, segment_hashes, audio_energy, created_at)
+                                  VALUES ({", ".join("?" * (FINGERPRINT_BANDS + 6))})''',
+                             (job_id, _signed_hash(fingerprint.video_hash), *_hash_bands(fingerprint.video_hash),
+                              fingerprint.duration, fingerprint.segment_hashes.tobytes(), audio_energy, time.time()))
+        return cursor.lastrowid
+
+    def find_duplicate(self, fingerprint, exclude_job_id=None) -> sqlite3.Row | None:
+        """
+        Looks up the stored fingerprint of a near-duplicate video.
+
+        Candidates are the fingerprints of about the same duration that share at least one band of their video hash, found with one index lookup per band however many fingerprints are stored. Candidates whose video hash is close enough are then compared in full with `is_near_duplicate`. Fingerprints of jobs with a failed stage are ignored, since their video may never be published.
+
+        Args:
+            fingerprint (VideoFingerprint): The fingerprint of the new video.
+            exclude_job_id (int, optional): A job whose own fingerprint is ignored.
+
+        Returns:
+            sqlite3.Row | None: The fingerprint row of the closest near-duplicate, with the status of its job as "job_status", or None if there is none.
+        """
+        import numpy as np
+        from editor.video_fingerprint import MAX_VIDEO_DISTANCE, VideoFingerprint, duration_window, is_near_duplicate
+
+        lookups = " UNION ".join(f"SELECT fingerprint_id FROM fingerprints WHERE band{band}=? AND duration BETWEEN ? AND ?"
+                                 for band in range(FINGERPRINT_BANDS))
+        low, high = duration_window(fingerprint.duration)
+        parameters = [value for band in _hash_bands(fingerprint.video_hash) for value in (band, low, high)]
+        candidates = self.connection.execute(f"SELECT fingerprint_id, video_hash FROM fingerprints WHERE fingerprint_id IN ({lookups})",
+                                             parameters).fetchall()
+        # Most candidates only share a band by chance, so they are dropped before their full fingerprints are loaded.
+        close = sorted((distance, row["fingerprint_id"]) for row in candidates
+                       if (distance := (_unsigned_hash(row["video_hash"]) ^ fingerprint.video_hash).bit_count()) <= MAX_VIDEO_DISTANCE)
+
+        not_failed = " AND ".join(f"jobs.{stage}_status != 'failed'" for stage in STAGES)
+        for _, fingerprint_id in close:
+            row = self.connection.execute(f'''SELECT fingerprints.*, jobs.status AS job_status FROM fingerprints
+                                               JOIN jobs ON jobs.job_id = fingerprints.job_id
+                                               WHERE fingerprints.fingerprint_id=? AND {not_failed}''', (fingerprint_id,)).fetchone()
+            if row is None or row["job_id"] == exclude_job_id:
+                continue
+            audio_energy = np.frombuffer(row["audio_energy"], dtype=np.float32) if row["audio_energy"] is not None else None
+            stored = VideoFingerprint(_unsigned_hash(row["video_hash"]), np.frombuffer(row["segment_hashes"], dtype=np.uint64),
+                                      row["duration"], audio_energy)
+            if is_near_duplicate(fingerprint, stored):
+                return row
+        return None
+
+    def upload_session(self, job_id) -> tuple[str, int, str | None, int | None] | None:
+        """
+        Returns the session URI of a job's interrupted YouTube upload, the number of bytes YouTube acknowledged, and the path and size of the uploaded file, or None if there is no interrupted upload. The path and size are None for sessions saved before they were recorded.
+        """
+        row = self.connection.execute('''SELECT youtube_upload_uri, youtube_upload_offset, youtube_upload_file, youtube_upload_size
+                                         FROM jobs WHERE job_id=?''', (job_id,)).fetchone()
+        if row is None or row["youtube_upload_uri"] is None:
+            return None
+        return row["youtube_upload_uri"], row["youtube_upload_offset"], row["youtube_upload_file"], row["youtube_upload_size"]
+
+    def save_upload_session(self, job_id, session_uri, offset, video_path, video_size):
+        """
+        Records the session URI of a job's YouTube upload, the number of bytes acknowledged so far, and the path and size of the uploaded file.
+        """
+        self._write('''UPDATE jobs SET youtube_upload_uri=?, youtube_upload_offset=?, youtube_upload_file=?, youtube_upload_size=?,
+                       updated_at=? WHERE job_id=?''', (session_uri, offset, video_path, video_size, time.time(), job_id))
+
+    def clear_upload_session(self, job_id):
+        """
+        Forgets a job's YouTube upload session once the upload has finished.
+        """
+        self._write('''UPDATE jobs SET youtube_upload_uri=NULL, youtube_upload_offset=0, youtube_upload_file=NULL,
+                       youtube_upload_size=NULL, updated_at=? WHERE job_id=?''', (time.time(), job_id))
+
+    def close(self):
+        """
+        Closes every thread's connection.
+        """
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _update_overall_status(self, job_id):
+        all_done = " AND ".join(f"{stage}_status IN ('done', 'skipped')" for stage in STAGES)
+        self._write(f"UPDATE jobs SET status = CASE WHEN {all_done} THEN 'done' ELSE 'pending' END WHERE job_id=?", (job_id,))
+
+    def _add_missing_columns(self, conn):
+        """
+        Adds the columns introduced since a database was created.
+        """
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, definition in ADDED_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+        if "fingerprint_status" not in existing:
+            # Jobs finished before videos were fingerprinted are not fingerprinted afterwards.
+            conn.execute("UPDATE jobs SET fingerprint_status='skipped' WHERE status='done'")
+
+    def _add_missing_bands(self, conn):
+        """
+        Adds the band columns of a finer fingerprint index and recomputes the bands of the stored fingerprints.
+        """
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(fingerprints)")}
+        missing = [f"band{band}" for band in range(FINGERPRINT_BANDS) if f"band{band}" not in existing]
+        if len(missing) == 0:
+            return
+        for column in missing:
+            conn.execute(f"ALTER TABLE fingerprints ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+        assignments = ", ".join(f"band{band}=?" for band in range(FINGERPRINT_BANDS))
+        conn.executemany(f"UPDATE fingerprints SET {assignments} WHERE fingerprint_id=?",
+                         [(*_hash_bands(_unsigned_hash(row["video_hash"])), row["fingerprint_id"])
+                          for row in conn.execute("SELECT fingerprint_id, video_hash FROM fingerprints")])
+
+    def _migrate_video_info(self, conn):
+        """
+        Moves the rows of the old flat `video_info` table into the job table and renames the old table.
+
+        The old table got a new row for every attempt at a video, so the rows of a video are merged: each result is taken from the latest row that has it.
+        """
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='video_info'").fetchone()
+        if not exists:
+            return
+
+        now = time.time()
+        rows = conn.execute('''SELECT tiktok_url, video_description, watermark_position, downloaded_tiktok,
+                                      edited_video, tiktok_is_uploaded, youtube_video_id FROM video_info ORDER BY rowid''').fetchall()
+        merged = set()
+        for row in rows:
+            if not row["tiktok_url"]:
+                continue
+            canonical_url = canonical_job_url(row["tiktok_url"])
+            results = [row["downloaded_tiktok"], row["edited_video"], row["tiktok_is_uploaded"], row["youtube_video_id"]]
+            conn.execute(f'''INSERT INTO jobs (canonical_url, tiktok_url, video_description, watermark_position,
+                                               {", ".join(LEGACY_STAGES.values())}, fingerprint_status, created_at, updated_at)
+                             VALUES ({", ".join("?" * 11)})
+                             ON CONFLICT (canonical_url) DO UPDATE SET
+                             {", ".join(f"{column}=COALESCE(excluded.{column}, jobs.{column})" for column in LEGACY_STAGES.values())}''',
+                         (canonical_url, row["tiktok_url"], row["video_description"], row["watermark_position"], *results,
+                          SKIPPED, now, now))
+            merged.add(canonical_url)
+
+        # A stage is done when any attempt stored its result.
+        statuses = ", ".join(f"{stage}_status = CASE WHEN {column} IS NULL THEN 'pending' ELSE 'done' END"
+                             for stage, column in LEGACY_STAGES.items())
+        all_done = " AND ".join(f"{column} IS NOT NULL" for column in LEGACY_STAGES.values())
+        for canonical_url in merged:
+            conn.execute(f"UPDATE jobs SET {statuses}, status = CASE WHEN {all_done} THEN 'done' ELSE 'pending' END "
+                         "WHERE canonical_url=?", (canonical_url,))
+        conn.execute("ALTER TABLE video_info RENAME TO video_info_migrated")
+        print(f"Migrated {len(rows)} rows from the video_info table into {len(merged)} jobs.")
+
+
+def _signed_hash(video_hash) -> int:
+    """
+    Returns a 64-bit hash as the signed integer SQLite can store.
+    """
+    return video_hash - (1 << 64) if video_hash >= 1 << 63 else video_hash
+
+
+def _unsigned_hash(stored_hash) -> int:
+    """
+    Returns the 64-bit hash stored as a signed integer by `_signed_hash`.
+    """
+    return stored_hash & ((1 << 64) - 1)
+
+
+def _hash_bands(video_hash) -> list[int]:
+    """
+    Splits a 64-bit hash into the FINGERPRINT_BANDS integers made of the bits from each of BAND_STARTS to the next.
+    """
+    return [(video_hash >> start) & ((1 << (end - start)) - 1) for start, end in zip(BAND_STARTS, BAND_STARTS[1:])]
+
+
+class UploadSession:
+    def __init__(self, job_store, job_id):
+        """
+        Persists the resumable YouTube upload session of one job, in the form expected by `YouTubeUploader.upload_video`.
+
+        Parameters:
+            job_store (JobStore): The job store.
+            job_id (int): The job ID.
+        """
+        self.job_store = job_store
+        self.job_id = job_id
+
+    def load(self) -> tuple[str, int, str | None, int | None] | None:
+        return self.job_store.upload_session(self.job_id)
+
+    def save(self, session_uri, offset, video_path, video_size):
+        self.job_store.save_upload_session(self.job_id, session_uri, offset, video_path, video_size)
+
+    def clear(self):
+        self.job_store.clear_upload_session(self.job_id)
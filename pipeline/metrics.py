@@ -0,0 +1,268 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where the CPU time of child processes and peak memory are not measured.
+    resource = None
+
+# Whether stages are instrumented, unless a caller decides otherwise. Set PIPELINE_METRICS=0 to turn it off.
+METRICS_ENABLED = os.getenv("PIPELINE_METRICS", "1") != "0"
+
+# The job attributes holding the file each stage reads and writes.
+STAGE_FILES = {
+    "download": (None, "downloaded_tiktok"),
+    "fingerprint": ("downloaded_tiktok", None),
+    "edit": ("downloaded_tiktok", "edited_video"),
+    "tiktok": ("edited_video", None),
+    "youtube": ("edited_video", None),
+}
+METRIC_PREFIX = "tiktok_automator_stage"
+
+
+@dataclass
+class StageMetrics:
+    """
+    The measurements of one run of one stage for one job.
+    """
+    stage: str
+    started_at: float
+    wall_seconds: float
+    cpu_seconds: float
+    peak_rss_bytes: int | None
+    bytes_in: int | None
+    bytes_out: int | None
+    fps: float | None
+    outcome: str
+    error: str | None = None
+
+
+class InstrumentedStage:
+    def __init__(self, stage, func, batch=False):
+        """
+        Wraps a stage function to record a StageMetrics entry in `job.metrics` for every job it processes.
+
+        CPU time is that of the worker thread. In a process pool worker, which runs one stage at a time, it also includes the stage's child processes such as ffmpeg; in threads, child processes are left out, since other threads' children are reaped by the same process. Peak RSS is only recorded in a process pool worker, as the highest resident memory of the worker or any of its finished children so far; threads share their process's memory, so theirs is left empty. The wrapper is picklable, so it also works in process pools; there the record of a failed run travels back on the exception as `stage_metrics`.
+
+        Parameters:
+            stage (str): The stage name ("download", "fingerprint", "edit", "tiktok" or "youtube").
+            func (callable): The stage function.
+            batch (bool): Whether `func` takes and returns lists of jobs, as batch pipeline stages do. The time of a batch is split evenly between its jobs.
+        """
+        self.stage = stage
+        self.func = func
+        self.batch = batch
+
+    def __call__(self, job):
+        jobs = job if self.batch else [job]
+        input_attribute, output_attribute = STAGE_FILES.get(self.stage, (None, None))
+        bytes_in = [file_size(getattr(job, input_attribute, None)) if input_attribute else None for job in jobs]
+
+        # Only a process pool worker has its child processes to itself.
+        include_children = multiprocessing.parent_process() is not None
+        started_at = time.time()
+        start_wall = time.perf_counter()
+        start_cpu = cpu_time(include_children)
+        try:
+            result = self.func(job)
+        except Exception as e:
+            records = self._record(jobs, [e] * len(jobs), started_at, start_wall, start_cpu, include_children, bytes_in,
+                                   output_attribute)
+            e.stage_metrics = records
+            raise
+        results = result if self.batch else [result]
+        self._record(jobs, results, started_at, start_wall, start_cpu, include_children, bytes_in, output_attribute)
+        return result
+
+    def _record(self, jobs, results, started_at, start_wall, start_cpu, include_children, bytes_in,
+                output_attribute) -> list[StageMetrics]:
+        wall_seconds = (time.perf_counter() - start_wall) / max(1, len(jobs))
+        cpu_seconds = (cpu_time(include_children) - start_cpu) / max(1, len(jobs))
+        rss = peak_rss() if include_children else None
+
+        records = []
+        for job, result, job_bytes_in in zip(jobs, results, bytes_in):
+            failed = isinstance(result, Exception)
+            output = getattr(job, output_attribute, None) if output_attribute and not failed else None
+            record = StageMetrics(self.stage, started_at, wall_seconds, cpu_seconds, rss, job_bytes_in,
+                                  file_size(output), encode_fps(output, wall_seconds) if self.stage == "edit" else None,
+                                  "failed" if failed else "done", str(result) if failed else None)
+            job.metrics.append(record)
+            records.append(record)
+        return records
+
+
+def instrument(stage, func, enabled=None, batch=False):
+    """
+    Returns `func` wrapped in an InstrumentedStage, or `func` itself when instrumentation is disabled, so a disabled stage costs nothing.
+
+    Args:
+        stage (str): The stage name.
+        func (callable): The stage function.
+        enabled (bool, optional): Whether to instrument the stage. Defaults to METRICS_ENABLED.
+        batch (bool, optional): Whether `func` processes lists of jobs. Defaults to False.
+    """
+    if enabled is None:
+        enabled = METRICS_ENABLED
+    return InstrumentedStage(stage, func, batch) if enabled else func
+
+
+def cpu_time(include_children=True) -> float:
+    """
+    Returns the CPU time used by the calling thread and, if `include_children` is set, by all of this process's finished child processes.
+    """
+    if resource is None or not include_children:
+        return time.thread_time()
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.thread_time() + children_usage.ru_utime + children_usage.ru_stime
+
+
+def peak_rss() -> int | None:
+    """
+    Returns the peak resident memory in bytes of this process or its largest finished child process, over the whole life of the process.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux.
+    return 1024 * max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def file_size(path) -> int | None:
+    """
+    Returns the size of a file in bytes, or None if there is no such file.
+    """
+    if not isinstance(path, str) or not os.path.isfile(path):
+        return None
+    return os.path.getsize(path)
+
+
+def encode_fps(video_path, seconds) -> float | None:
+    """
+    Returns how many frames of a video were encoded per second, given how long the encode took.
+    """
+    if file_size(video_path) is None or seconds <= 0:
+        return None
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    try:
+        frames = ffmpeg_parse_infos(video_path).get("video_nframes")
+    except (IOError, OSError):
+        return None
+    return frames / seconds if frames else None
+
+
+def percentile(values, fraction) -> float | None:
+    """
+    Returns the given percentile (0 to 1) of the values, interpolating linearly between the closest ranks.
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(records) -> dict:
+    """
+    Summarizes stage metrics per stage.
+
+    Args:
+        records (iterable): StageMetrics entries, or mappings with the same keys such as job store rows.
+
+    Returns:
+        dict: For each stage, the number of runs and failures, the p50 and p95 wall and CPU times, the peak RSS of process pool stages, the bytes read and written, and the p50 encode fps.
+    """
+    by_stage = {}
+    for record in records:
+        record = asdict(record) if isinstance(record, StageMetrics) else dict(record)
+        by_stage.setdefault(record["stage"], []).append(record)
+
+    summary = {}
+    for stage, stage_records in by_stage.items():
+        def values(key):
+            return [record[key] for record in stage_records if record[key] is not None]
+
+        summary[stage] = {
+            "runs": len(stage_records),
+            "failures": sum(record["outcome"] == "failed" for record in stage_records),
+            "wall_seconds_p50": percentile(values("wall_seconds"), 0.5),
+            "wall_seconds_p95": percentile(values("wall_seconds"), 0.95),
+            "wall_seconds_sum": sum(values("wall_seconds")),
+            "cpu_seconds_p50": percentile(values("cpu_seconds"), 0.5),
+            "cpu_seconds_p95": percentile(values("cpu_seconds"), 0.95),
+            "cpu_seconds_sum": sum(values("cpu_seconds")),
+            "peak_rss_bytes": max(values("peak_rss_bytes"), default=None),
+            "bytes_in": sum(values("bytes_in")),
+            "bytes_out": sum(values("bytes_out")),
+            "fps_p50": percentile(values("fps"), 0.5),
+        }
+    return summary
+
+
+def prometheus_text(summary) -> str:
+    """
+    Formats a summary from `summarize` in the Prometheus text exposition format.
+    """
+    lines = []
+
+    def metric(name, metric_type, help_text, samples):
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} {metric_type}")
+        for suffix, labels, value in samples:
+            if value is not None:
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{METRIC_PREFIX}_{name}{suffix}{{{label_text}}} {value:.6g}")
+
+    for name, help_text in [("wall_seconds", "Wall time of a stage run."), ("cpu_seconds", "CPU time of a stage run.")]:
+        metric(name, "summary", help_text,
+               [sample for stage, stage_summary in summary.items() for sample in [
+                   ("", {"stage": stage, "quantile": "0.5"}, stage_summary[f"{name}_p50"]),
+                   ("", {"stage": stage, "quantile": "0.95"}, stage_summary[f"{name}_p95"]),
+                   ("_sum", {"stage": stage}, stage_summary[f"{name}_sum"]),
+                   ("_count", {"stage": stage}, stage_summary["runs"]),
+               ]])
+    metric("runs_total", "counter", "Stage runs by outcome.",
+           [("", {"stage": stage, "outcome": outcome}, count)
+            for stage, stage_summary in summary.items()
+            for outcome, count in [("done", stage_summary["runs"] - stage_summary["failures"]),
+                                   ("failed", stage_summary["failures"])]])
+    metric("peak_rss_bytes", "gauge", "Peak resident memory of the process pool worker running a stage, with its children.",
+           [("", {"stage": stage}, stage_summary["peak_rss_bytes"]) for stage, stage_summary in summary.items()])
+    metric("bytes_total", "counter", "Bytes of the files read and written by a stage.",
+           [("", {"stage": stage, "direction": direction}, stage_summary[f"bytes_{direction}"])
+            for stage, stage_summary in summary.items() for direction in ("in", "out")])
+    metric("encode_fps", "gauge", "Median frames encoded per second.",
+           [("", {"stage": stage}, stage_summary["fps_p50"]) for stage, stage_summary in summary.items()])
+    return "\n".join(lines) + "\n"
+
+
+def export_metrics(records, directory, name="pipeline") -> dict:
+    """
+    Writes a Prometheus text-format file and a JSON summary of stage metrics.
+
+    The files are replaced atomically, so a Prometheus textfile collector never reads a partial file.
+
+    Args:
+        records (iterable): StageMetrics entries or job store rows.
+        directory (str): The directory the "<name>.prom" and "<name>.json" files are written to.
+        name (str, optional): The base name of the files. Defaults to "pipeline".
+
+    Returns:
+        dict: The summary.
+    """
+    summary = summarize(records)
+    os.makedirs(directory, exist_ok=True)
+    for extension, content in [("prom", prometheus_text(summary)), ("json", json.dumps(summary, indent=2))]:
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}-")
+        with os.fdopen(file_descriptor, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(temp_path, os.path.join(directory, f"{name}.{extension}"))
+    return summary
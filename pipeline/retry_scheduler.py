@@ -0,0 +1,178 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline.job_store import DONE, FAILED, STAGES
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1):
+        """
+        Limits how often an action can happen.
+
+        Parameters:
+            rate (float): The number of tokens added per second.
+            capacity (int): The maximum number of tokens, i.e. the largest burst allowed.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """
+        Takes a token if one is available, without waiting.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the number of seconds until the next token is available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """
+        Takes a token, waiting until one is available.
+        """
+        while (wait := self.try_acquire()) > 0:
+            time.sleep(wait)
+
+
+class ScheduledStage:
+    def __init__(self, name, func, rate_limit=None):
+        """
+        A stage run by the RetryScheduler.
+
+        Parameters:
+            name (str): The stage name as used by the job store ("download", "fingerprint", "edit", "tiktok" or "youtube").
+            func (callable): A function that takes a VideoJob, stores the stage's result on it and returns it, raising an exception on failure.
+            rate_limit (TokenBucket, optional): The rate limit shared by every call of this stage.
+        """
+        if name not in STAGES:
+            raise ValueError(f"Unknown stage: {name}")
+        self.name = name
+        self.func = func
+        self.rate_limit = rate_limit
+
+
+class RetryScheduler:
+    def __init__(self, stages, workers=4, max_attempts=4, base_delay=2.0, max_delay=120.0, on_stage=None):
+        """
+        Runs the unfinished stages of many jobs concurrently, retrying failed stages with exponential backoff.
+
+        Each job runs its stages in order, but different jobs run at the same time. A failed stage is retried after a random delay of up to `base_delay * 2 ** attempt` seconds, without blocking a worker while it waits. A stage held back by its rate limit waits the same way. A job that keeps failing gives up on its own without affecting the other jobs.
+
+        Parameters:
+            stages (list[ScheduledStage]): The stages in the order a job passes through them.
+            workers (int): The number of stages run at the same time.
+            max_attempts (int): The number of times a stage is tried before its job is given up on.
+            base_delay (float): The backoff delay in seconds after the first failure.
+            max_delay (float): The longest backoff delay in seconds.
+            on_stage (callable, optional): Called as on_stage(job, stage_name, status, result, error) after every attempt, from a worker thread.
+        """
+        self.stages = stages
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_stage = on_stage
+
+    def backoff(self, attempt) -> float:
+        """
+        Returns the delay before the next try after `attempt` failed tries ("full jitter").
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def run(self, jobs) -> list:
+        """
+        Runs the jobs until every stage has succeeded or has failed `max_attempts` times.
+
+        Stages whose result is already set on a job are skipped, and so are all stages of a job found to be a duplicate.
+
+        Args:
+            jobs (list[VideoJob]): The jobs to run.
+
+        Returns:
+            list[VideoJob]: The jobs, with `error` set on those that were given up on.
+        """
+        jobs = list(jobs)
+        counter = itertools.count()
+        ready = [(0.0, next(counter), job, 0) for job in jobs]
+        heapq.heapify(ready)
+        in_flight = [0]
+        condition = threading.Condition()
+
+        def reschedule(job, attempts, delay):
+            with condition:
+                heapq.heappush(ready, (time.monotonic() + delay, next(counter), job, attempts))
+                condition.notify()
+
+        def finish():
+            with condition:
+                in_flight[0] -= 1
+                condition.notify()
+
+        def run_stage(job, attempts):
+            try:
+                stage = self._next_stage(job)
+                if stage is None:
+                    return
+                if stage.rate_limit is not None:
+                    # Wait for the rate limit in the queue, so the worker can run other jobs' stages meanwhile.
+                    wait = stage.rate_limit.try_acquire()
+                    if wait > 0:
+                        reschedule(job, attempts, wait)
+                        return
+                try:
+                    job = stage.func(job)
+                except Exception as e:
+                    attempts += 1
+                    self._notify(job, stage.name, FAILED, None, str(e))
+                    if attempts >= self.max_attempts:
+                        print(f"Giving up on {job.tiktok_url} after {attempts} failed {stage.name} attempts: {e}")
+                        job.error = f"{stage.name}: {e}"
+                        return
+                    reschedule(job, attempts, self.backoff(attempts))
+                    return
+                self._notify(job, stage.name, DONE, getattr(job, STAGES[stage.name]), None)
+                if self._next_stage(job) is not None:
+                    reschedule(job, 0, 0)
+            finally:
+                finish()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            with condition:
+                while ready or in_flight[0]:
+                    now = time.monotonic()
+                    while ready and ready[0][0] <= now:
+                        _, _, job, attempts = heapq.heappop(ready)
+                        in_flight[0] += 1
+                        executor.submit(run_stage, job, attempts)
+                    timeout = ready[0][0] - now if ready else None
+                    condition.wait(timeout)
+
+        return jobs
+
+    def _next_stage(self, job):
+        if job.duplicate_of is not None:
+            return None
+        for stage in self.stages:
+            if getattr(job, STAGES[stage.name]) is None:
+                return stage
+        return None
+
+    def _notify(self, job, stage_name, status, result, error):
+        if self.on_stage is not None:
+            try:
+                self.on_stage(job, stage_name, status, result, error)
+            except Exception as e:
+                print(f"An error occurred while recording the {stage_name} stage: {e}")
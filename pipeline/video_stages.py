@@ -0,0 +1,203 @@
+import functools
+import os
+import threading
+
+from downloader.download_cache import DownloadCache
+from downloader.tiktok_downloader import download_tiktok
+from editor.encoder_profiles import DEFAULT_PROFILE
+from editor.video_editor import add_watermark_for_platforms, platform_video
+from editor.video_fingerprint import compute_fingerprint
+from uploader.tiktok_upload import upload_tiktok, upload_tiktok_batch
+from uploader.youtube_uploader import YouTubeUploader
+from pipeline.batch_pipeline import Stage
+from pipeline.job_store import DONE, OriginalNotFinished, UploadSession
+from pipeline.metrics import instrument
+from pipeline.retry_scheduler import ScheduledStage, TokenBucket
+
+# Each upload worker thread keeps its own YouTube uploader, which takes its thread's client from the factory for every upload.
+_worker_state = threading.local()
+
+# Looking up a fingerprint and adding it happen together, so two copies of a video fingerprinted at the same time are still found.
+_fingerprint_lock = threading.Lock()
+
+# Every edited video is uploaded to both platforms. It meets the limits of both, and a platform that allows a better video gets its own version.
+TARGET_PLATFORMS = ["tiktok", "youtube"]
+
+
+class KeptDownloads:
+    def __init__(self, job_store=None):
+        """
+        The downloads a download cache must not evict: those of the job store's unfinished jobs, and those made by a batch that are not saved to the job store yet.
+
+        Parameters:
+            job_store (JobStore, optional): The job store. Defaults to keeping only the batch's downloads.
+        """
+        self.job_store = job_store
+        self._paths = set()
+        self._lock = threading.Lock()
+
+    def add(self, path):
+        """
+        Keeps a file downloaded by the batch.
+        """
+        with self._lock:
+            self._paths.add(path)
+
+    def __call__(self) -> list[str]:
+        with self._lock:
+            paths = list(self._paths)
+        if self.job_store is not None:
+            paths += self.job_store.unfinished_downloads()
+        return paths
+
+
+def download_stage(job, pool=None, cache=None, kept_downloads=None):
+    """
+    Downloads the TikTok video of a job, using a browser session from the pool and a download cache if they are given. The download is added to `kept_downloads` if it is given.
+    """
+    job.downloaded_tiktok = download_tiktok(job.tiktok_url, pool=pool, cache=cache)
+    if job.downloaded_tiktok is None:
+        raise RuntimeError("the video could not be downloaded")
+    if kept_downloads is not None:
+        kept_downloads.add(job.downloaded_tiktok)
+    return job
+
+
+def fingerprint_stage(job, job_store):
+    """
+    Fingerprints the downloaded video of a job and looks it up in the job store's fingerprint index.
+
+    If a finished earlier job has a near-duplicate video, the job is marked as its duplicate and skips editing and uploading. If that job has not finished yet, the stage raises OriginalNotFinished, so the job is looked up again once it has; jobs that failed do not count. Otherwise the fingerprint is added to the index.
+    """
+    fingerprint = compute_fingerprint(job.downloaded_tiktok)
+    with _fingerprint_lock:
+        duplicate = job_store.find_duplicate(fingerprint, exclude_job_id=job.job_id)
+        if duplicate is None:
+            job.fingerprint_id = job_store.add_fingerprint(job.job_id, fingerprint)
+            return job
+        if duplicate["job_status"] != DONE:
+            raise OriginalNotFinished(duplicate["job_id"])
+        job.fingerprint_id = duplicate["fingerprint_id"]
+        job.duplicate_of = duplicate["job_id"]
+    job_store.mark_duplicate(job.job_id, job.duplicate_of)
+    print(f"{job.tiktok_url} is a duplicate of job {job.duplicate_of}, skipping it")
+    return job
+
+
+def edit_stage(job, concurrent_encodes=1):
+    """
+    Adds the watermark to the downloaded video of a job, encoding it with the job's encoder profile for the target platforms, once more for each platform that allows a better video.
+    """
+    job.edited_video = add_watermark_for_platforms(job.downloaded_tiktok, watermark_text=os.getenv("WATERMARK_TEXT"),
+                                                   position=job.watermark_position, margin=20,
+                                                   profile=job.encoder_profile or DEFAULT_PROFILE, platforms=TARGET_PLATFORMS,
+                                                   concurrent_encodes=concurrent_encodes)
+    if job.edited_video is None:
+        raise RuntimeError("the watermark could not be added")
+    return job
+
+
+def tiktok_upload_stage(job):
+    """
+    Uploads the edited video of a job to TikTok.
+    """
+    job.tiktok_is_uploaded = upload_tiktok(platform_video(job.edited_video, "tiktok"), job.video_description)
+    if job.tiktok_is_uploaded is None:
+        raise RuntimeError("the video could not be uploaded to TikTok")
+    return job
+
+
+def tiktok_batch_upload_stage(jobs):
+    """
+    Uploads the edited videos of several jobs to TikTok in one browser session.
+    """
+    results = upload_tiktok_batch([(platform_video(job.edited_video, "tiktok"), job.video_description) for job in jobs])
+    for job, result in zip(jobs, results):
+        job.tiktok_is_uploaded = result
+    return [job if result is not None else RuntimeError("the video could not be uploaded to TikTok")
+            for job, result in zip(jobs, results)]
+
+
+def youtube_upload_stage(job, job_store=None):
+    """
+    Uploads the edited video of a job to YouTube.
+
+    If a job store is given and the job has an ID, the upload session is persisted in the job store, so an interrupted upload resumes where it stopped.
+    """
+    if getattr(_worker_state, "youtube_uploader", None) is None:
+        _worker_state.youtube_uploader = YouTubeUploader()
+    upload_session = UploadSession(job_store, job.job_id) if job_store is not None and job.job_id is not None else None
+    job.youtube_video_id = _worker_state.youtube_uploader.upload_video(
+        platform_video(job.edited_video, "youtube"), title=job.video_description, description=job.video_description, upload_session=upload_session)
+    if job.youtube_video_id is None:
+        raise RuntimeError("the video could not be uploaded to YouTube")
+    return job
+
+
+def build_video_stages(download_workers=2, encode_workers=None, upload_workers=1, pool=None, job_store=None,
+                       tiktok_batch_size=4, tiktok_batch_wait=10.0) -> list[Stage]:
+    """
+    Builds the download, fingerprint, edit and upload stages used for batch uploads. The fingerprint stage needs the job store and is left out without one.
+
+    Args:
+        download_workers (int, optional): The number of concurrent downloads. Defaults to 2.
+        encode_workers (int, optional): The number of concurrent encodes. Defaults to the number of CPU cores.
+        upload_workers (int, optional): The number of concurrent uploads per platform. Defaults to 1.
+        pool (WebDriverPool, optional): The browser sessions shared by the download workers. Defaults to a new browser per download.
+        job_store (JobStore, optional): Where video fingerprints are looked up and YouTube upload sessions are persisted so interrupted uploads can resume. The download cache also keeps the downloads of its unfinished jobs. Defaults to none of these.
+        tiktok_batch_size (int, optional): The largest number of videos uploaded to TikTok in one browser session. Defaults to 4.
+        tiktok_batch_wait (float, optional): How many seconds an edited video waits for others to join its TikTok batch. Defaults to 10.
+
+    Returns:
+        list[Stage]: The stages in pipeline order.
+    """
+    encode_workers = encode_workers or os.cpu_count() or 1
+    # The batch's jobs are only saved once they leave the pipeline, so their downloads are kept until then as well.
+    kept_downloads = KeptDownloads(job_store)
+    cache = DownloadCache(keep_paths=kept_downloads)
+    stages = [
+        Stage("download", instrument("download", functools.partial(download_stage, pool=pool, cache=cache,
+                                                                   kept_downloads=kept_downloads)),
+              workers=download_workers),
+        Stage("edit", instrument("edit", functools.partial(edit_stage, concurrent_encodes=encode_workers)),
+              workers=encode_workers, cpu_bound=True),
+        Stage("tiktok upload", instrument("tiktok", tiktok_batch_upload_stage, batch=True), workers=upload_workers,
+              batch_size=tiktok_batch_size, batch_wait=tiktok_batch_wait),
+        Stage("youtube upload", instrument("youtube", functools.partial(youtube_upload_stage, job_store=job_store)),
+              workers=upload_workers),
+    ]
+    if job_store is not None:
+        stages.insert(1, Stage("fingerprint", instrument("fingerprint", functools.partial(fingerprint_stage, job_store=job_store)),
+                               workers=download_workers))
+    return stages
+
+
+def build_retry_stages(downloads_per_minute=20, tiktok_uploads_per_minute=2, youtube_uploads_per_minute=6, pool=None, job_store=None,
+                       concurrent_encodes=2) -> list[ScheduledStage]:
+    """
+    Builds the stages used to retry failed videos, each with its own rate limit. The fingerprint stage needs the job store and is left out without one.
+
+    Args:
+        downloads_per_minute (float, optional): The maximum download rate. Defaults to 20.
+        tiktok_uploads_per_minute (float, optional): The maximum TikTok upload rate. Defaults to 2.
+        youtube_uploads_per_minute (float, optional): The maximum YouTube upload rate. Defaults to 6.
+        pool (WebDriverPool, optional): The browser sessions shared by the downloads. Defaults to a new browser per download.
+        job_store (JobStore, optional): Where video fingerprints are looked up and YouTube upload sessions are persisted so interrupted uploads can resume. The download cache also keeps the downloads of its unfinished jobs. Defaults to none of these.
+        concurrent_encodes (int, optional): How many edits are expected to run at the same time, sharing the CPU cores. Defaults to 2.
+
+    Returns:
+        list[ScheduledStage]: The stages in pipeline order.
+    """
+    # Every stage's result is saved as soon as it finishes, so the job store knows every download to keep.
+    cache = DownloadCache(keep_paths=job_store.unfinished_downloads if job_store is not None else None)
+    stages = [
+        ScheduledStage("download", instrument("download", functools.partial(download_stage, pool=pool, cache=cache)),
+                       TokenBucket(downloads_per_minute / 60)),
+        ScheduledStage("edit", instrument("edit", functools.partial(edit_stage, concurrent_encodes=concurrent_encodes))),
+        ScheduledStage("tiktok", instrument("tiktok", tiktok_upload_stage), TokenBucket(tiktok_uploads_per_minute / 60)),
+        ScheduledStage("youtube", instrument("youtube", functools.partial(youtube_upload_stage, job_store=job_store)),
+                       TokenBucket(youtube_uploads_per_minute / 60)),
+    ]
+    if job_store is not None:
+        stages.insert(1, ScheduledStage("fingerprint", instrument("fingerprint", functools.partial(fingerprint_stage, job_store=job_store))))
+    return stages
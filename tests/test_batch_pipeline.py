@@ -0,0 +1,80 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from pipeline.batch_pipeline import BatchPipeline, Stage, VideoJob, read_jobs
+
+
+def test_read_jobs_parses_json_and_tab_separated_lines():
+    jobs = read_jobs([
+        "# A comment",
+        "",
+        '{"url": "https://www.tiktok.com/@a/video/1", "description": "First", "position": "Bottom", "profile": "archive"}',
+        "https://www.tiktok.com/@b/video/2\tSecond",
+        "https://www.tiktok.com/@c/video/3\tThird\ttop\tfast-draft",
+    ])
+    assert [(job.tiktok_url, job.video_description, job.watermark_position, job.encoder_profile) for job in jobs] == [
+        ("https://www.tiktok.com/@a/video/1", "First", "bottom", "archive"),
+        ("https://www.tiktok.com/@b/video/2", "Second", "top", None),
+        ("https://www.tiktok.com/@c/video/3", "Third", "top", "fast-draft"),
+    ]
+
+
+@pytest.mark.parametrize("line", ['{"url": ', "https://www.tiktok.com/@a/video/1", '{"description": "no url"}'])
+def test_read_jobs_reports_the_line_of_an_invalid_job(line):
+    with pytest.raises(ValueError, match="Line 2"):
+        read_jobs(["# header", line])
+
+
+def download(job):
+    job.downloaded_tiktok = job.tiktok_url + ".mp4"
+    return job
+
+
+def edit(job):
+    if "broken" in job.tiktok_url:
+        raise RuntimeError("cannot edit")
+    job.edited_video = job.downloaded_tiktok + ".edited"
+    return job
+
+
+def upload_batch(jobs):
+    for job in jobs:
+        job.youtube_video_id = "id-" + job.tiktok_url
+    return jobs
+
+
+def test_jobs_pass_every_stage_and_failures_skip_the_rest():
+    stages = [Stage("download", download, workers=2), Stage("edit", edit),
+              Stage("upload", upload_batch, batch_size=3, batch_wait=0.05)]
+    jobs = [VideoJob(f"video-{index}", "description") for index in range(5)] + [VideoJob("broken", "description")]
+    results = {job.tiktok_url: job for job in BatchPipeline(stages).run(jobs)}
+
+    assert len(results) == 6
+    assert results["video-3"].youtube_video_id == "id-video-3"
+    assert results["broken"].error == "edit: cannot edit"
+    assert results["broken"].youtube_video_id is None
+
+
+def test_stopping_early_stops_the_stage_threads():
+    def slow(job):
+        time.sleep(0.01)
+        return job
+
+    before = threading.active_count()
+    results = BatchPipeline([Stage("slow", slow), Stage("slow too", slow)], queue_size=1).run(
+        VideoJob(f"video-{index}", "description") for index in range(1000))
+    next(results)
+    results.close()
+    assert threading.active_count() == before
+
+
+def test_stopping_ends_the_wait_for_a_full_batch():
+    stage = Stage("upload", upload_batch, batch_size=10, batch_wait=30)
+    stop = threading.Event()
+    threading.Timer(0.1, stop.set).start()
+    start = time.monotonic()
+    assert BatchPipeline._collect_batch(stage, VideoJob("video", "description"), queue.Queue(), stop) == []
+    assert time.monotonic() - start < 1
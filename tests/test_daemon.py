@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+import pytest
+
+from pipeline.batch_pipeline import VideoJob
+from pipeline.daemon import PipelineDaemon
+from pipeline.job_store import DONE, JobStore, OriginalNotFinished
+from pipeline.retry_scheduler import ScheduledStage
+
+
+def download(job):
+    job.downloaded_tiktok = f"video-{job.job_id}.mp4"
+    return job
+
+
+def fingerprint(job):
+    job.fingerprint_id = job.job_id
+    return job
+
+
+def edit(job):
+    job.edited_video = f"edited-{job.job_id}.mp4"
+    return job
+
+
+def tiktok(job):
+    job.tiktok_is_uploaded = True
+    return job
+
+
+class FlakyUpload:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self, job):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("upload failed")
+        job.youtube_video_id = f"youtube-{job.job_id}"
+        return job
+
+
+class CopyFingerprint:
+    def __init__(self, store, original_job_id):
+        self.store = store
+        self.original_job_id = original_job_id
+
+    def __call__(self, job):
+        if job.job_id != self.original_job_id:
+            if self.store.get_job(self.original_job_id)["status"] != DONE:
+                raise OriginalNotFinished(self.original_job_id)
+            job.duplicate_of = self.original_job_id
+            self.store.mark_duplicate(job.job_id, self.original_job_id)
+        job.fingerprint_id = job.job_id
+        return job
+
+
+def slow_upload(job):
+    time.sleep(0.2)
+    job.youtube_video_id = f"youtube-{job.job_id}"
+    return job
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    yield store
+    store.close()
+
+
+def daemon_for(store, youtube, fingerprint=fingerprint) -> PipelineDaemon:
+    stages = [ScheduledStage("download", download), ScheduledStage("fingerprint", fingerprint), ScheduledStage("edit", edit),
+              ScheduledStage("tiktok", tiktok), ScheduledStage("youtube", youtube)]
+    return PipelineDaemon(store, stages, workers=2, encode_workers=1, process_stages=(), base_delay=0.01, max_delay=0.01)
+
+
+async def serve_until_done(daemon, store, jobs, timeout=10):
+    server = asyncio.create_task(daemon.serve())
+    # Let the daemon start, up to waiting for jobs, before jobs are submitted.
+    await asyncio.sleep(0)
+    job_ids = [daemon.submit(job) for job in jobs]
+    deadline = asyncio.get_running_loop().time() + timeout
+    while store.pending_jobs() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.02)
+    daemon.stop()
+    await server
+    return job_ids
+
+
+def test_daemon_runs_every_stage_of_submitted_jobs(store):
+    jobs = [VideoJob(f"https://www.tiktok.com/@user/video/{index}", "description") for index in range(4)]
+    job_ids = asyncio.run(serve_until_done(daemon_for(store, FlakyUpload(failures=0)), store, jobs))
+
+    for job_id in job_ids:
+        row = store.get_job(job_id)
+        assert row["status"] == DONE
+        assert row["youtube_video_id"] == f"youtube-{job_id}"
+
+
+def test_daemon_retries_failed_stages(store):
+    youtube = FlakyUpload(failures=2)
+    [job_id] = asyncio.run(serve_until_done(daemon_for(store, youtube), store,
+                                            [VideoJob("https://www.tiktok.com/@user/video/1", "description")]))
+
+    row = store.get_job(job_id)
+    assert row["status"] == DONE
+    assert row["attempts"] == 2
+    assert youtube.calls == 3
+
+
+def test_daemon_resumes_unfinished_jobs_from_their_first_unfinished_stage(store):
+    job_id = store.add_job("https://www.tiktok.com/@user/video/1", "description", "top")
+    store.update_stage(job_id, "download", DONE, "already-downloaded.mp4")
+
+    asyncio.run(serve_until_done(daemon_for(store, FlakyUpload(failures=0)), store, []))
+
+    row = store.get_job(job_id)
+    assert row["status"] == DONE
+    assert row["downloaded_tiktok"] == "already-downloaded.mp4"
+
+
+def test_duplicates_wait_for_their_unfinished_original_without_failing(store):
+    original = store.add_job("https://www.tiktok.com/@user/video/1", "description", "top")
+    daemon = daemon_for(store, slow_upload, fingerprint=CopyFingerprint(store, original))
+    [copy] = asyncio.run(serve_until_done(daemon, store, [VideoJob("https://www.tiktok.com/@user/video/2", "description")]))
+
+    row = store.get_job(copy)
+    assert row["status"] == DONE
+    assert row["duplicate_of"] == original
+    assert row["attempts"] == 0
+    assert row["youtube_video_id"] is None
+
+
+def test_submit_rejects_jobs_refused_by_validate(store):
+    daemon = daemon_for(store, FlakyUpload(failures=0))
+    daemon.validate = lambda job: "no description" if not job.video_description else None
+    with pytest.raises(ValueError, match="no description"):
+        daemon.submit(VideoJob("https://www.tiktok.com/@user/video/1", ""))
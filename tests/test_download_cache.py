@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from downloader.download_cache import DownloadCache
+from pipeline.job_store import JobStore
+from pipeline.video_stages import KeptDownloads
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    yield store
+    store.close()
+
+
+def video(tmp_path, name) -> str:
+    path = str(tmp_path / name)
+    with open(path, "wb") as f:
+        f.write(b"x" * 1000)
+    return path
+
+
+def test_eviction_keeps_unfinished_and_unsaved_downloads(tmp_path, store):
+    unfinished = video(tmp_path, "unfinished.mp4")
+    job_id = store.add_job("https://www.tiktok.com/@user/video/1", "description", "top")
+    store.update_stage(job_id, "download", "done", unfinished)
+    unsaved = video(tmp_path, "unsaved.mp4")
+    evicted = video(tmp_path, "evicted.mp4")
+    kept_downloads = KeptDownloads(store)
+    kept_downloads.add(unsaved)
+
+    cache = DownloadCache(str(tmp_path / "cache.db"), max_age=0, keep_paths=kept_downloads)
+    for video_id, path in [("1", unfinished), ("2", unsaved), ("3", evicted)]:
+        cache.store(video_id, path)
+    cache.evict()
+
+    assert os.path.exists(unfinished) and os.path.exists(unsaved)
+    assert not os.path.exists(evicted)
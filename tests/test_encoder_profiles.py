@@ -0,0 +1,60 @@
+import pytest
+
+from editor.encoder_profiles import PLATFORM_LIMITS, PROFILES, SourceInfo, resolve_encoder_settings, separate_encode_platforms
+
+
+def source(size=(1080, 1920), bitrate=20000, audio_codec="aac") -> SourceInfo:
+    return SourceInfo(size, 30.0, 20.0, audio_codec is not None, audio_codec, bitrate)
+
+
+def test_bitrate_is_capped_by_the_strictest_platform():
+    settings = resolve_encoder_settings("balanced", source(), platforms=["tiktok", "youtube"], cpu_count=8)
+    assert settings.max_bitrate == PLATFORM_LIMITS["tiktok"]["max_bitrate"]
+    assert resolve_encoder_settings("balanced", source(), platforms="youtube", cpu_count=8).max_bitrate == PROFILES["balanced"].max_bitrate
+
+
+def test_bitrate_never_exceeds_the_source():
+    settings = resolve_encoder_settings("balanced", source(bitrate=3000), platforms=["tiktok"], cpu_count=8)
+    assert settings.max_bitrate == 3000
+    assert settings.rate_control_arguments() == ["-crf", "23", "-maxrate", "3000k", "-bufsize", "6000k"]
+
+
+def test_archive_profile_without_platforms_is_uncapped():
+    settings = resolve_encoder_settings("archive", source(size=(2160, 3840)), cpu_count=8)
+    assert settings.max_bitrate is None and settings.scaled_size is None
+    assert settings.rate_control_arguments() == ["-crf", "18"]
+
+
+def test_output_is_scaled_down_to_even_sizes_and_never_up():
+    settings = resolve_encoder_settings("fast-draft", source(size=(1081, 1921)), cpu_count=8)
+    assert settings.scaled_size == (720, 1280)
+    assert resolve_encoder_settings("fast-draft", source(size=(480, 854)), cpu_count=8).scaled_size is None
+    assert resolve_encoder_settings("balanced", output_size=(1440, 2560), cpu_count=8).scaled_size == (1080, 1920)
+
+
+def test_threads_are_shared_by_concurrent_encodes():
+    assert resolve_encoder_settings("balanced", cpu_count=8, concurrent_encodes=3).threads == 2
+    assert resolve_encoder_settings("balanced", cpu_count=2, concurrent_encodes=4).threads == 1
+    assert resolve_encoder_settings("fast-draft", cpu_count=64).threads == PROFILES["fast-draft"].max_threads
+
+
+def test_compatible_audio_is_copied():
+    assert resolve_encoder_settings(source=source(audio_codec="aac")).audio_arguments() == ["-c:a", "copy"]
+    assert resolve_encoder_settings(source=source(audio_codec="opus")).audio_arguments() == ["-c:a", "aac", "-b:a", "128k"]
+    assert resolve_encoder_settings().audio_codec == "aac"
+
+
+def test_unknown_profiles_and_platforms_are_rejected():
+    with pytest.raises(ValueError):
+        resolve_encoder_settings("lossless")
+    with pytest.raises(ValueError):
+        resolve_encoder_settings("balanced", platforms=["vimeo"])
+
+
+def test_only_platforms_allowing_a_better_video_get_their_own_encode():
+    platforms = ["tiktok", "youtube"]
+    assert separate_encode_platforms("balanced", platforms, source()) == ["youtube"]
+    # The profile or the source leave no room above TikTok's limits.
+    assert separate_encode_platforms("fast-draft", platforms, source()) == []
+    assert separate_encode_platforms("balanced", platforms, source(bitrate=4000)) == []
+    assert separate_encode_platforms("balanced", ["tiktok"], source()) == []
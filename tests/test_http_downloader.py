@@ -0,0 +1,94 @@
+import json
+
+import requests
+
+from downloader.http_downloader import PART_SUFFIX, PROGRESS_SUFFIX, HttpDownloader
+
+URL = "https://example.com/video.mp4"
+DATA = bytes(range(256)) * 40
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+
+class FakeSession:
+    """
+    Serves DATA, answering range requests like a server that supports them.
+    """
+
+    def __init__(self, announce_size=True):
+        self.announce_size = announce_size
+
+    def head(self, url, **kwargs):
+        headers = {"Accept-Ranges": "bytes"}
+        if self.announce_size:
+            headers["Content-Length"] = str(len(DATA))
+        return FakeResponse(200, headers=headers)
+
+    def get(self, url, headers=None, **kwargs):
+        byte_range = (headers or {}).get("Range")
+        if byte_range is None:
+            return FakeResponse(200, DATA)
+        start, _, end = byte_range.removeprefix("bytes=").partition("-")
+        if int(start) >= len(DATA):
+            return FakeResponse(416)
+        return FakeResponse(206, DATA[int(start):int(end) + 1 if end else None])
+
+
+def downloader_for(session, **kwargs) -> HttpDownloader:
+    downloader = HttpDownloader(chunk_size=1000, **kwargs)
+    downloader.session = session
+    return downloader
+
+
+def test_part_files_longer_than_the_remote_file_are_downloaded_again(tmp_path):
+    destination = str(tmp_path / "video.mp4")
+    with open(destination + PART_SUFFIX, "wb") as f:
+        f.write(b"x" * (len(DATA) + 10))
+
+    downloader_for(FakeSession()).download(URL, destination)
+    with open(destination, "rb") as f:
+        assert f.read() == DATA
+
+
+def test_unsatisfiable_ranges_restart_the_download(tmp_path):
+    destination = str(tmp_path / "video.mp4")
+    with open(destination + PART_SUFFIX, "wb") as f:
+        f.write(b"x" * (len(DATA) + 10))
+
+    downloader_for(FakeSession(announce_size=False)).download(URL, destination)
+    with open(destination, "rb") as f:
+        assert f.read() == DATA
+
+
+def test_parallel_progress_of_another_file_size_is_ignored(tmp_path):
+    destination = str(tmp_path / "video.mp4")
+    with open(destination + PART_SUFFIX, "wb") as f:
+        f.write(b"x" * (len(DATA) * 2))
+    with open(destination + PROGRESS_SUFFIX, "w", encoding="utf-8") as f:
+        json.dump({"size": len(DATA) * 2, "ranges": {"0": len(DATA) * 2}}, f)
+
+    downloader_for(FakeSession(), connections=4, parallel_threshold=1).download(URL, destination)
+    with open(destination, "rb") as f:
+        assert f.read() == DATA
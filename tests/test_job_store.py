@@ -0,0 +1,182 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from editor.video_fingerprint import MAX_VIDEO_DISTANCE, SEGMENTS, VideoFingerprint
+from pipeline.batch_pipeline import VideoJob
+from pipeline.job_store import BAND_STARTS, DONE, FAILED, FINGERPRINT_BANDS, JobStore, UploadSession, _hash_bands
+
+URL = "https://www.tiktok.com/@user/video/7234567890123456789"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    yield store
+    store.close()
+
+
+def fingerprint(video_hash, duration=20.0) -> VideoFingerprint:
+    return VideoFingerprint(video_hash, np.full(SEGMENTS, video_hash, dtype=np.uint64), duration, None)
+
+
+def flip_bits(video_hash, bits) -> int:
+    for bit in bits:
+        video_hash ^= 1 << bit
+    return video_hash
+
+
+def finished_job(store, url) -> int:
+    job_id = store.add_job(url, "description", "top")
+    for stage in ["download", "fingerprint", "edit", "tiktok", "youtube"]:
+        store.update_stage(job_id, stage, DONE, 1)
+    return job_id
+
+
+def test_add_job_returns_the_existing_job_of_the_same_video(store):
+    job_id = store.add_job(URL, "description", "top")
+    assert store.add_job(URL + "?is_from_webapp=1", "other description", "bottom") == job_id
+    assert len(store.all_jobs()) == 1
+
+
+def test_job_is_done_once_every_stage_is_done(store):
+    job_id = store.add_job(URL, "description", "top")
+    store.update_stage(job_id, "download", DONE, "video.mp4")
+    store.update_stage(job_id, "fingerprint", FAILED, error="broken")
+    assert store.get_job(job_id)["status"] == "pending"
+    assert store.get_job(job_id)["attempts"] == 1
+    assert [row["job_id"] for row in store.pending_jobs("download")] == []
+    assert [row["job_id"] for row in store.pending_jobs("fingerprint")] == [job_id]
+
+    for stage in ["fingerprint", "edit", "tiktok", "youtube"]:
+        store.update_stage(job_id, stage, DONE, 1)
+    assert store.get_job(job_id)["status"] == DONE
+    assert store.pending_jobs() == []
+
+
+def test_update_stage_rejects_unknown_stages(store):
+    job_id = store.add_job(URL, "description", "top")
+    with pytest.raises(ValueError):
+        store.update_stage(job_id, "publish", DONE)
+
+
+def test_save_job_finishes_the_job_once_every_stage_has_a_result(store):
+    job = VideoJob(URL, "description", downloaded_tiktok="video.mp4", edited_video="edited.mp4", tiktok_is_uploaded=True,
+                   youtube_video_id="abc")
+    job_id = store.save_job(job)
+    assert store.get_job(job_id)["fingerprint_status"] == "pending"
+
+    job.fingerprint_id = 1
+    store.save_job(job)
+    assert store.get_job(job_id)["status"] == DONE
+
+
+def test_save_job_marks_the_failed_stage(store):
+    job = VideoJob(URL, "description", downloaded_tiktok="video.mp4", error="tiktok upload: the session expired")
+    job_id = store.save_job(job)
+    row = store.get_job(job_id)
+    assert row["download_status"] == DONE
+    assert row["tiktok_status"] == FAILED
+    assert row["attempts"] == 1
+    assert row["last_error"] == "tiktok upload: the session expired"
+
+
+def test_video_info_rows_are_merged_into_one_job_per_video(tmp_path):
+    db_path = str(tmp_path / "video_info.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute('''CREATE TABLE video_info
+                    (tiktok_url TEXT, video_description TEXT, watermark_position TEXT,
+                     downloaded_tiktok TEXT, edited_video TEXT, tiktok_is_uploaded TEXT, youtube_video_id TEXT)''')
+    conn.executemany("INSERT INTO video_info VALUES (?, ?, ?, ?, ?, ?, ?)", [
+        # Two attempts at the same video: the second one finished the uploads.
+        (URL, "first", "top", "video.mp4", "edited.mp4", None, None),
+        (URL + "?lang=en", "second", "top", None, None, "1", "abc"),
+        ("https://www.tiktok.com/@user/video/1", "other", "bottom", "other.mp4", None, None, None),
+    ])
+    conn.commit()
+    conn.close()
+
+    store = JobStore(db_path)
+    try:
+        jobs = {row["video_description"]: row for row in store.all_jobs()}
+        assert len(jobs) == 2
+        merged = jobs["first"]
+        assert (merged["downloaded_tiktok"], merged["edited_video"], merged["youtube_video_id"]) == ("video.mp4", "edited.mp4", "abc")
+        assert merged["status"] == DONE
+        assert merged["fingerprint_status"] == "skipped"
+        other = jobs["other"]
+        assert (other["download_status"], other["edit_status"], other["status"]) == (DONE, "pending", "pending")
+
+        tables = {row[0] for row in store.connection.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        assert "video_info" not in tables and "video_info_migrated" in tables
+    finally:
+        store.close()
+
+
+def test_hash_bands_cover_every_bit_once():
+    assert BAND_STARTS[0] == 0 and BAND_STARTS[-1] == 64
+    assert len(BAND_STARTS) == FINGERPRINT_BANDS + 1
+    video_hash = 0x0123456789ABCDEF
+    bands = _hash_bands(video_hash)
+    assert sum(band << start for band, start in zip(bands, BAND_STARTS)) == video_hash
+    assert _hash_bands((1 << 64) - 1) == [(1 << (end - start)) - 1 for start, end in zip(BAND_STARTS, BAND_STARTS[1:])]
+
+
+def test_find_duplicate_finds_every_hash_within_the_maximum_distance(store):
+    video_hash = 0xF0E1D2C3B4A59687
+    job_id = finished_job(store, URL)
+    store.add_fingerprint(job_id, fingerprint(video_hash))
+
+    # The flipped bits fall into as many different bands as possible, the hardest case for the index.
+    bits = [start for start in BAND_STARTS[:-1]]
+    close = flip_bits(video_hash, bits[:MAX_VIDEO_DISTANCE])
+    duplicate = store.find_duplicate(fingerprint(close))
+    assert duplicate is not None and duplicate["job_id"] == job_id and duplicate["job_status"] == DONE
+
+    assert store.find_duplicate(fingerprint(flip_bits(video_hash, bits[:MAX_VIDEO_DISTANCE + 1]))) is None
+    assert store.find_duplicate(fingerprint(video_hash, duration=40.0)) is None
+    assert store.find_duplicate(fingerprint(video_hash), exclude_job_id=job_id) is None
+
+
+def test_find_duplicate_ignores_jobs_with_a_failed_stage(store):
+    job_id = store.add_job(URL, "description", "top")
+    store.add_fingerprint(job_id, fingerprint(1234))
+    assert store.find_duplicate(fingerprint(1234))["job_status"] == "pending"
+
+    store.update_stage(job_id, "edit", FAILED, error="broken")
+    assert store.find_duplicate(fingerprint(1234)) is None
+
+
+def test_find_duplicate_handles_hashes_with_the_top_bit_set(store):
+    job_id = finished_job(store, URL)
+    video_hash = (1 << 63) | 42
+    store.add_fingerprint(job_id, fingerprint(video_hash))
+    assert store.find_duplicate(fingerprint(video_hash ^ 1))["job_id"] == job_id
+
+
+def test_mark_duplicate_skips_the_unfinished_stages(store):
+    original = finished_job(store, URL)
+    job_id = store.add_job("https://www.tiktok.com/@other/video/1", "copy", "top")
+    store.update_stage(job_id, "download", DONE, "copy.mp4")
+    store.mark_duplicate(job_id, original)
+    row = store.get_job(job_id)
+    assert (row["download_status"], row["edit_status"], row["status"]) == (DONE, "skipped", DONE)
+    assert row["duplicate_of"] == original
+
+
+def test_unfinished_downloads_lists_only_unfinished_jobs(store):
+    finished_job(store, URL)
+    job_id = store.add_job("https://www.tiktok.com/@other/video/1", "description", "top")
+    store.update_stage(job_id, "download", DONE, "waiting.mp4")
+    assert store.unfinished_downloads() == ["waiting.mp4"]
+
+
+def test_upload_session_round_trip(store):
+    job_id = store.add_job(URL, "description", "top")
+    session = UploadSession(store, job_id)
+    assert session.load() is None
+    session.save("https://upload/session", 1024, "/videos/edited.mp4", 4096)
+    assert session.load() == ("https://upload/session", 1024, "/videos/edited.mp4", 4096)
+    session.clear()
+    assert session.load() is None
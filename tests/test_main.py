@@ -0,0 +1,39 @@
+import pytest
+
+import main
+from pipeline.batch_pipeline import VideoJob
+from pipeline.job_store import DONE, JobStore
+
+URL = "https://www.tiktok.com/@user/video/7234567890123456789"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(main, "job_store", store)
+    yield store
+    store.close()
+
+
+def test_submit_jobs_skips_videos_that_are_already_done(store):
+    job_id = store.add_job(URL, "description", "top")
+    for stage in ["download", "fingerprint", "edit", "tiktok", "youtube"]:
+        store.update_stage(job_id, stage, DONE, 1)
+    assert main.submit_jobs([VideoJob(URL, "description", "top")]) == []
+
+
+def test_submit_jobs_keeps_unfinished_jobs_with_the_same_settings(store):
+    job_id = store.add_job(URL, "description", "top")
+    submitted = main.submit_jobs([VideoJob(URL, "description", "top")])
+    assert [job.job_id for job in submitted] == [job_id]
+
+
+def test_submit_jobs_rejects_other_settings_for_an_unfinished_job(store):
+    job_id = store.add_job(URL, "description", "top")
+    assert main.submit_jobs([VideoJob(URL, "other description", "bottom")]) == []
+    assert store.get_job(job_id)["video_description"] == "description"
+
+
+def test_submit_jobs_adds_a_video_listed_twice_once(store):
+    submitted = main.submit_jobs([VideoJob(URL, "description", "top"), VideoJob(URL, "description", "top")])
+    assert len(submitted) == 1
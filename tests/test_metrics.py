@@ -0,0 +1,23 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from pipeline.batch_pipeline import VideoJob
+from pipeline.metrics import instrument
+
+URL = "https://www.tiktok.com/@user/video/7234567890123456789"
+
+
+def edit(job) -> VideoJob:
+    return job
+
+
+def run_stage(job) -> list:
+    return instrument("edit", edit, enabled=True)(job).metrics
+
+
+def test_peak_rss_is_only_recorded_in_process_pool_workers():
+    [record] = run_stage(VideoJob(URL, "description", "top"))
+    assert record.peak_rss_bytes is None
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        [record] = executor.submit(run_stage, VideoJob(URL, "description", "top")).result()
+    assert record.peak_rss_bytes > 0
@@ -0,0 +1,51 @@
+import pytest
+
+from pipeline import retry_scheduler
+from pipeline.retry_scheduler import TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(retry_scheduler.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_try_acquire_takes_a_token_without_waiting(clock):
+    bucket = TokenBucket(rate=2)
+    assert bucket.try_acquire() == 0
+
+
+def test_try_acquire_returns_the_wait_for_the_next_token(clock):
+    bucket = TokenBucket(rate=2)
+    bucket.try_acquire()
+    assert bucket.try_acquire() == pytest.approx(0.5)
+
+    clock[0] += 0.2
+    assert bucket.try_acquire() == pytest.approx(0.3)
+    clock[0] += 0.3
+    assert bucket.try_acquire() == 0
+
+
+def test_capacity_allows_bursts_but_does_not_accumulate_beyond_it(clock):
+    bucket = TokenBucket(rate=1, capacity=3)
+    assert [bucket.try_acquire() for _ in range(3)] == [0, 0, 0]
+    assert bucket.try_acquire() > 0
+
+    clock[0] += 60
+    assert [bucket.try_acquire() for _ in range(3)] == [0, 0, 0]
+    assert bucket.try_acquire() == pytest.approx(1.0)
+
+
+def test_acquire_sleeps_until_a_token_is_available(clock, monkeypatch):
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(retry_scheduler.time, "sleep", sleep)
+    bucket = TokenBucket(rate=4)
+    bucket.acquire()
+    bucket.acquire()
+    assert sleeps == [pytest.approx(0.25)]
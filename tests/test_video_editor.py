@@ -0,0 +1,25 @@
+from moviepy.editor import ColorClip
+
+import editor.video_editor as video_editor
+from editor.video_editor import add_watermark_for_platforms, platform_video, platform_video_path
+
+
+def test_platform_videos_of_an_earlier_edit_are_not_uploaded(tmp_path, monkeypatch):
+    input_video = str(tmp_path / "input.mp4")
+    ColorClip((64, 36), color=(200, 30, 30), duration=1).write_videofile(input_video, fps=10, logger=None)
+    output_video = str(tmp_path / "output.mp4")
+    with open(platform_video_path(output_video, "youtube"), "wb") as f:
+        f.write(b"an earlier edit")
+
+    calls = []
+
+    def add_watermark_to_video(input_video, output_video, *args, **kwargs):
+        calls.append(kwargs)
+        return output_video
+
+    monkeypatch.setattr(video_editor, "add_watermark_to_video", add_watermark_to_video)
+    edited_video = add_watermark_for_platforms(input_video, output_video, aspect_ratio="9:16", platforms=["tiktok", "youtube"])
+
+    assert edited_video == output_video
+    assert platform_video(edited_video, "youtube") == output_video
+    assert calls[0]["aspect_ratio"] == "9:16"
@@ -16,31 +16,62 @@ def upload_tiktok(video_path, description, cookies=None) -> bool | None:
     Returns:
         bool | None: True if the video is uploaded successfully, None if an exception occurs.
     """
+    return upload_tiktok_batch([(video_path, description)], cookies)[0]
+
+def upload_tiktok_batch(videos, cookies=None) -> list[bool | None]:
+    """
+    Uploads several TikTok videos to the user's account in one browser session.
+
+    The browser is launched and logged in with the cookies once for the whole batch instead of once per video.
+
+    Args:
+        videos (list[tuple[str, str]]): The (video path, description) pairs to upload.
+        cookies (str, optional): The path to the cookies file. If not provided, the default cookies file path will be used.
+
+    Returns:
+        list[bool | None]: For each video, in the same order, True if it was uploaded successfully and None otherwise.
+    """
+    results = [None] * len(videos)
+
+    # A missing file would make the uploader reject the whole batch, so it is only reported as a failure of that video.
+    batch = []
+    for index, (video_path, description) in enumerate(videos):
+        if os.path.isfile(video_path):
+            batch.append(index)
+        else:
+            print(f"Video file not found: {video_path}")
+    if len(batch) == 0:
+        return results
+
     try:
         if cookies is None:
             cookies = BASE_DIR + r"\cookies.txt"
 
-        videos = [
+        upload_list = [
             {
-                "path": video_path,
-                "description": description
+                "path": videos[index][0],
+                "description": videos[index][1]
             }
+            for index in batch
         ]
 
         auth = AuthBackend(cookies=cookies)
 
-        failed_list = upload_videos(videos=videos, auth=auth)
+        failed_list = upload_videos(videos=upload_list, auth=auth)
     except FailedToUpload as e:
         print(e)
-        return None
+        return results
     except Exception as e:
         print(e)
-        return None
-    else:
-        if len(failed_list) == 0 or not failed_list:
-            return True
+        return results
+
+    failed_paths = [video.get("path") for video in failed_list or []]
+    for index in batch:
+        if videos[index][0] in failed_paths:
+            print(f"Failed to upload {videos[index][0]} to TikTok.")
         else:
-            return None
+            results[index] = True
+    return results
 
 if __name__ == "__main__":
     video_path = input("Enter the path to your video file (e.g., path_to_your_video_file.mp4): ").strip('"')
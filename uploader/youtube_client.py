@@ -0,0 +1,139 @@
+import datetime
+import json
+import os
+import pickle
+import tempfile
+import threading
+
+import google.auth.exceptions
+import google.auth.transport.requests
+import google_auth_oauthlib.flow
+import googleapiclient.discovery
+import requests
+from googleapiclient.discovery_cache import get_static_doc
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+API_SERVICE_NAME = "youtube"
+API_VERSION = "v3"
+SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/{api}/{version}/rest"
+
+
+class YouTubeClientFactory:
+    def __init__(self, client_secrets_file=os.path.join(BASE_DIR, "client_secrets.json"),
+                 credentials_file=os.path.join(BASE_DIR, "youtube_credentials.pkl"),
+                 discovery_cache_dir=os.path.join(BASE_DIR, "Discovery-Cache"), refresh_margin=300, credentials=None):
+        """
+        Hands out authenticated YouTube API clients that share one set of credentials.
+
+        The discovery document is parsed once per process. It is read from the on-disk cache, or from the copy bundled with google-api-python-client, and only downloaded if neither exists, so building a client does not need the network. Every thread gets its own client, because the underlying HTTP connections are not thread-safe. The credentials are refreshed before they expire and saved to a temporary file that then replaces the credentials file, so a crash never leaves a truncated file behind.
+
+        Parameters:
+            client_secrets_file (str): The OAuth client secrets, used when there are no saved credentials.
+            credentials_file (str): Where the credentials are pickled.
+            discovery_cache_dir (str): Where downloaded discovery documents are kept.
+            refresh_margin (float): How many seconds before they expire the credentials are refreshed.
+            credentials (optional): Credentials to use instead of loading them from `credentials_file`.
+        """
+        self.client_secrets_file = client_secrets_file
+        self.credentials_file = credentials_file
+        self.discovery_cache_dir = discovery_cache_dir
+        self.refresh_margin = refresh_margin
+        self._credentials = credentials
+        self._document = None
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+    def client(self):
+        """
+        Returns the calling thread's YouTube API client, building it on first use and refreshing the credentials if they are about to expire.
+        """
+        credentials = self.credentials()
+        youtube = getattr(self._local, "youtube", None)
+        if youtube is None or self._local.credentials is not credentials:
+            youtube = googleapiclient.discovery.build_from_document(self.discovery_document(), credentials=credentials)
+            self._local.youtube = youtube
+            self._local.credentials = credentials
+        return youtube
+
+    def credentials(self):
+        """
+        Returns valid credentials, loading, refreshing or requesting them as needed.
+        """
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = self.load_credentials()
+            if self._credentials is None:
+                flow = google_auth_oauthlib.flow.InstalledAppFlow.from_client_secrets_file(self.client_secrets_file, SCOPES)
+                self._credentials = flow.run_local_server(port=0)
+                self.save_credentials(self._credentials)
+            elif self.needs_refresh(self._credentials):
+                try:
+                    # Refreshing in place also updates the clients already handed out.
+                    self._credentials.refresh(google.auth.transport.requests.Request())
+                except google.auth.exceptions.GoogleAuthError as e:
+                    print(f"The YouTube credentials could not be refreshed: {e}")
+                else:
+                    self.save_credentials(self._credentials)
+            return self._credentials
+
+    def needs_refresh(self, credentials) -> bool:
+        """
+        Returns whether the credentials expire within the refresh margin and can be refreshed.
+        """
+        if not getattr(credentials, "refresh_token", None):
+            return False
+        if credentials.expiry is None:
+            return not credentials.token
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return credentials.expiry - now < datetime.timedelta(seconds=self.refresh_margin)
+
+    def save_credentials(self, credentials):
+        """
+        Atomically replaces the credentials file with the given credentials.
+        """
+        directory = os.path.dirname(os.path.abspath(self.credentials_file))
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".youtube_credentials-")
+        try:
+            with os.fdopen(file_descriptor, "wb") as token:
+                pickle.dump(credentials, token)
+            os.replace(temp_path, self.credentials_file)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def load_credentials(self):
+        """
+        Returns the saved credentials, or None if there are none.
+        """
+        if os.path.exists(self.credentials_file):
+            with open(self.credentials_file, "rb") as token:
+                return pickle.load(token)
+        return None
+
+    def discovery_document(self) -> dict:
+        """
+        Returns the parsed YouTube discovery document.
+        """
+        with self._lock:
+            if self._document is None:
+                cache_path = os.path.join(self.discovery_cache_dir, f"{API_SERVICE_NAME}.{API_VERSION}.json")
+                if os.path.exists(cache_path):
+                    with open(cache_path, encoding="utf-8") as f:
+                        content = f.read()
+                else:
+                    content = get_static_doc(API_SERVICE_NAME, API_VERSION)
+                    if content is None:
+                        response = requests.get(DISCOVERY_URL.format(api=API_SERVICE_NAME, version=API_VERSION), timeout=30)
+                        response.raise_for_status()
+                        content = response.text
+                        os.makedirs(self.discovery_cache_dir, exist_ok=True)
+                        with open(cache_path, "w", encoding="utf-8") as f:
+                            f.write(content)
+                self._document = json.loads(content)
+            return self._document
+
+
+# Shared by every YouTube uploader in this process.
+youtube_clients = YouTubeClientFactory()
@@ -1,40 +1,57 @@
+import http.client
 import os
-import pickle
-import google_auth_oauthlib.flow
-import googleapiclient.discovery
+import random
+import time
 import googleapiclient.errors
+import httplib2
+from googleapiclient.http import MediaFileUpload
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+from uploader.youtube_client import API_SERVICE_NAME, API_VERSION, SCOPES, YouTubeClientFactory, youtube_clients
+
+# Resumable upload chunks must be a multiple of 256 KiB.
+DEFAULT_CHUNK_SIZE = 32 * 256 * 1024
+RETRIABLE_STATUS_CODES = [500, 502, 503, 504]
+RETRIABLE_EXCEPTIONS = (OSError, httplib2.HttpLib2Error, http.client.HTTPException)
 
 class YouTubeUploader:
-    def __init__(self, client_secrets_file=BASE_DIR + r"\client_secrets.json"):
+    def __init__(self, client_secrets_file=None, youtube=None, clients=None):
         """
         Initializes the class with the given client secrets file.
 
+        The YouTube client comes from a process-wide factory, so only the first uploader reads the credentials and the discovery document, and later uploaders in the same thread reuse its client. The client is taken from the factory again for every upload, so a long-lived uploader has its credentials refreshed before they expire.
+
         Parameters:
-            client_secrets_file (str): The file containing client secrets.
+            client_secrets_file (str): The file containing client secrets. Defaults to the shared factory's "client_secrets.json".
+            youtube (optional): An already built YouTube API service to use instead of authenticating.
+            clients (YouTubeClientFactory, optional): The factory the client is taken from. Defaults to the process-wide factory.
 
         Returns:
             None
         """
-        self.client_secrets_file = client_secrets_file
-        self.scopes = ["https://www.googleapis.com/auth/youtube.upload"]
-        self.api_service_name = 'youtube'
-        self.api_version = 'v3'
-        self.youtube = self.get_authenticated_service()
+        if clients is None:
+            clients = youtube_clients if client_secrets_file is None else YouTubeClientFactory(client_secrets_file)
+        self.clients = clients
+        self.client_secrets_file = clients.client_secrets_file
+        self.scopes = SCOPES
+        self.api_service_name = API_SERVICE_NAME
+        self.api_version = API_VERSION
+        self._youtube = youtube
+        if youtube is None:
+            # Authenticate up front, so a missing login is asked for before the first upload.
+            self.get_authenticated_service()
+
+    @property
+    def youtube(self):
+        """
+        The YouTube API service used for uploads.
+        """
+        return self._youtube if self._youtube is not None else self.get_authenticated_service()
 
     def get_authenticated_service(self):
         """
-        Returns an authenticated Google API service using the provided client secrets file, scopes, service name, and version.
+        Returns an authenticated Google API service for the calling thread, refreshing the credentials if they are about to expire.
         """
-        credentials = self.load_credentials()
-        if credentials is None:
-            flow = google_auth_oauthlib.flow.InstalledAppFlow.from_client_secrets_file(
-                self.client_secrets_file, self.scopes)
-            credentials = flow.run_local_server(port=0)
-            self.save_credentials(credentials)
-        return googleapiclient.discovery.build(
-            self.api_service_name, self.api_version, credentials=credentials)
+        return self.clients.client()
 
     def save_credentials(self, credentials):
         """
@@ -46,28 +63,31 @@ class YouTubeUploader:
         Returns:
             None
         """
-        with open(BASE_DIR + r"\youtube_credentials.pkl", "wb") as token:
-            pickle.dump(credentials, token)
+        self.clients.save_credentials(credentials)
 
     def load_credentials(self):
         """
         A function to load credentials. Checks if the credentials file exists, then loads and returns the credentials.
         Returns None if the file does not exist.
         """
-        if os.path.exists(BASE_DIR + r"\youtube_credentials.pkl"):
-            with open(BASE_DIR + r"\youtube_credentials.pkl", "rb") as token:
-                return pickle.load(token)
-        return None
+        return self.clients.load_credentials()
 
-    def upload_video(self, video_path, title, description, tags=None):
+    def upload_video(self, video_path, title, description, tags=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                     progress_callback=None, upload_session=None, max_retries=8):
         """
         Uploads a video to YouTube using the provided video path, title, description, and optional tags.
+
+        The video is sent with a resumable upload in chunks of `chunk_size` bytes. Failed chunks are retried with exponential backoff. If an `upload_session` is given, the upload's session URI and the number of bytes the server has acknowledged are saved after every chunk, together with the path and size of the video, so that a restarted process continues from the last acknowledged byte instead of sending the whole file again. A session saved for another file, or for the same file at another size, is not resumed.
         
         Parameters:
             video_path (str): The path to the video file.
             title (str): The title of the video.
             description (str): The description of the video.
             tags (list): Optional list of tags for the video. Default is an empty list.
+            chunk_size (int): The number of bytes sent per request. Must be a multiple of 256 KiB.
+            progress_callback (callable): Optional function called as progress_callback(uploaded_bytes, total_bytes) after every chunk. By default the progress is printed.
+            upload_session: Optional object with load() returning a (session_uri, offset, video_path, video_size) tuple or None, save(session_uri, offset, video_path, video_size) and clear() methods, used to persist the upload session.
+            max_retries (int): The number of times a failing chunk is retried before giving up.
         
         Returns:
             str: The video ID of the uploaded video if successful, None otherwise.
@@ -83,12 +103,70 @@ class YouTubeUploader:
             }
         }
 
+        if progress_callback is None:
+            progress_callback = print_upload_progress
+
         try:
-            response = self.youtube.videos().insert(
+            media = MediaFileUpload(video_path, mimetype="video/mp4", chunksize=chunk_size, resumable=True)
+            request = self.youtube.videos().insert(
                 part="snippet,status",
                 body=request_body,
-                media_body=video_path
-            ).execute()
+                media_body=media
+            )
+
+            video_file = os.path.abspath(video_path)
+            video_size = os.path.getsize(video_path)
+            saved_session = upload_session.load() if upload_session is not None else None
+            if saved_session is not None and tuple(saved_session[2:]) != (video_file, video_size):
+                print("The saved upload session belongs to another version of the video. Restarting the upload.")
+                saved_session = None
+            if saved_session is not None:
+                request.resumable_uri = saved_session[0]
+            # Ask the server how much of a saved session it has received before sending more data.
+            needs_offset = saved_session is not None
+
+            response = None
+            retries = 0
+            while response is None:
+                try:
+                    if needs_offset:
+                        request.resumable_progress, response = self._acknowledged_offset(request, video_size)
+                        needs_offset = False
+                        print(f"Resuming upload at byte {request.resumable_progress}.")
+                        continue
+                    status, response = request.next_chunk()
+                except googleapiclient.errors.HttpError as e:
+                    if saved_session is not None and e.resp.status in [404, 410]:
+                        # The saved session has expired, so start a new one.
+                        print("The saved upload session has expired. Restarting the upload.")
+                        request.resumable_uri, request.resumable_progress = None, 0
+                        needs_offset = False
+                        saved_session = None
+                        continue
+                    if e.resp.status not in RETRIABLE_STATUS_CODES:
+                        raise
+                    error = e
+                except RETRIABLE_EXCEPTIONS as e:
+                    error = e
+                else:
+                    error = None
+                    retries = 0
+                    if request.resumable_uri is not None and upload_session is not None:
+                        upload_session.save(request.resumable_uri, request.resumable_progress, video_file, video_size)
+                    if status is not None:
+                        progress_callback(status.resumable_progress, status.total_size)
+
+                if error is not None:
+                    retries += 1
+                    if retries > max_retries:
+                        raise error
+                    delay = random.uniform(0, min(64, 2 ** retries))
+                    # After a failed chunk, next_chunk starts by asking the server for the acknowledged offset.
+                    print(f"Upload interrupted ({error}). Retrying in {delay:.1f} seconds.")
+                    time.sleep(delay)
+
+            if upload_session is not None:
+                upload_session.clear()
 
             video_id = response["id"]
             print(f"Video uploaded successfully. Video ID: {video_id}")
@@ -97,6 +175,41 @@ class YouTubeUploader:
         except googleapiclient.errors.HttpError as e:
             print(f"An error occurred: {e}")
             return None
+        except RETRIABLE_EXCEPTIONS as e:
+            print(f"An error occurred: {e}")
+            return None
+
+    @staticmethod
+    def _acknowledged_offset(request, video_size):
+        """
+        Asks YouTube how many bytes of a resumable upload session it has received.
+
+        Parameters:
+            request: The upload request, with the session URI set.
+            video_size (int): The size of the video in bytes.
+
+        Returns:
+            tuple: The number of bytes received, and the uploaded video's resource if the upload had already completed, otherwise None.
+
+        Raises:
+            googleapiclient.errors.HttpError: If the session has expired or the server could not answer.
+        """
+        response, content = request.http.request(request.resumable_uri, "PUT",
+                                                 headers={"Content-Range": f"bytes */{video_size}", "Content-Length": "0"})
+        if response.status in [200, 201]:
+            return video_size, request.postproc(response, content)
+        if response.status != 308:
+            raise googleapiclient.errors.HttpError(response, content, uri=request.resumable_uri)
+        # The Range header ("bytes=0-<last byte>") is missing if no byte has been received yet.
+        received = response.get("range")
+        return (int(received.rsplit("-", 1)[1]) + 1 if received else 0), None
+
+
+def print_upload_progress(uploaded_bytes, total_bytes):
+    """
+    Prints the progress of an upload.
+    """
+    print(f"Uploaded {uploaded_bytes / total_bytes:.0%} ({uploaded_bytes} of {total_bytes} bytes).")
 
 
 if __name__ == '__main__':